@@ -0,0 +1,24 @@
+"""
+This folder is not part of the add-on. It contains benchmarks for the add-on's
+hot paths, which run outside of Anki by replacing aqt and anki with stubs (see
+stubs.py). Run each benchmark from the root of the repo, for example:
+
+    python -m bench.bench_matcher            Prints results
+    python -m bench.bench_matcher --save     Saves results as the new baseline
+    python -m bench.bench_matcher --check    Fails if slower than the baseline
+
+Baselines are stored as JSON in bench/baselines. Timings depend on the
+machine, so baselines should be regenerated with --save when the machine
+changes.
+
+bench_replacer_js and check_conformance run the Javascript in src under 
+Node, using a handwritten DOM shim in bench/js. check_conformance checks that
+the Python and Javascript matchers agree on a shared corpus of cases.
+
+bench_session drives insert_symbols.py through a simulated Anki session with
+fake editors, reviewer and browsers, and fails if any Anki event runs the
+add-on's handler more than once or replacer.js is injected into a page twice.
+
+bench_window runs the options window with PyQt6 under the offscreen Qt
+platform, so it requires PyQt6 (pip install PyQt6), unlike the others.
+"""
@@ -0,0 +1,103 @@
+"""
+Benchmarks for the symbol list and matching code that runs while typing or
+whenever the symbol list changes: BrowserReplacer._matches_keyword(),
+SymbolManager.get_match_list(), get_JSON(), check_format() and
+check_for_duplicates(), plus SymbolMatcher, which converts existing notes.
+
+Usage: python -m bench.bench_matcher [--save] [--check] [--filter TEXT]
+"""
+
+from . import harness, stubs
+
+stubs.install()
+
+from src.browser_replacer import BrowserReplacer
+from src.matcher import SymbolMatcher
+from src.symbol_manager import SymbolManager
+
+SUITE = 'matcher'
+
+# Lengths of text typed into the search bar or a field:
+TEXT_LENGTHS = (80, 5000)
+
+
+def _make_manager(size):
+    manager = SymbolManager(None, None)
+    manager._symbols = harness.make_symbols(size)
+    return manager
+
+
+""" SymbolManager """
+
+def bench_get_match_list(size):
+    manager = _make_manager(size)
+    return manager.get_match_list
+
+def bench_get_JSON(size):
+    manager = _make_manager(size)
+    return manager.get_JSON
+
+def bench_check_format(size):
+    symbols = harness.make_symbols(size)
+    return lambda: SymbolManager.check_format(symbols)
+
+def bench_check_for_duplicates(size):
+    symbols = harness.make_symbols(size)
+    return lambda: SymbolManager.check_for_duplicates(symbols)
+
+
+""" Matching """
+
+def bench_matches_keyword_miss(size, text_len):
+    """ Worst case while typing: no key matches, so every key is checked. """
+    replacer = BrowserReplacer(_make_manager(size).get_match_list())
+    text = harness.make_text(text_len) + ' '
+    cursor = len(text)
+    return lambda: replacer._matches_keyword(text, cursor, True, False)
+
+def bench_matches_keyword_hit(size, text_len):
+    """ A colon-delimited key has just been typed at the end of the text. """
+    match_list = _make_manager(size).get_match_list()
+    key = [item['key'] for item in match_list if item['f'] == 1][-1]
+    replacer = BrowserReplacer(match_list)
+    text = harness.make_text(text_len - len(key)) + key
+    cursor = len(text)
+    return lambda: replacer._matches_keyword(text, cursor, False, False)
+
+def bench_symbol_matcher_build(size):
+    match_list = _make_manager(size).get_match_list()
+    return lambda: SymbolMatcher(match_list)
+
+def bench_symbol_matcher_scan(size, text_len):
+    matcher = SymbolMatcher(_make_manager(size).get_match_list())
+    text = harness.make_text(text_len)
+    return lambda: matcher.find_replacements(text)
+
+
+def get_benchmarks():
+    for size in harness.LIST_SIZES:
+        yield ('get_match_list[%d]' % size,
+            lambda size=size: bench_get_match_list(size))
+        yield ('get_JSON[%d]' % size,
+            lambda size=size: bench_get_JSON(size))
+        yield ('check_format[%d]' % size,
+            lambda size=size: bench_check_format(size))
+        yield ('check_for_duplicates[%d]' % size,
+            lambda size=size: bench_check_for_duplicates(size))
+        yield ('symbol_matcher_build[%d]' % size,
+            lambda size=size: bench_symbol_matcher_build(size))
+
+        for text_len in TEXT_LENGTHS:
+            yield ('matches_keyword_miss[%d,%d]' % (size, text_len),
+                lambda size=size, text_len=text_len:
+                bench_matches_keyword_miss(size, text_len))
+            yield ('matches_keyword_hit[%d,%d]' % (size, text_len),
+                lambda size=size, text_len=text_len:
+                bench_matches_keyword_hit(size, text_len))
+            yield ('symbol_matcher_scan[%d,%d]' % (size, text_len),
+                lambda size=size, text_len=text_len:
+                bench_symbol_matcher_scan(size, text_len))
+
+
+if __name__ == '__main__':
+    harness.run(SUITE, get_benchmarks(), __doc__.strip().splitlines()[0])
@@ -0,0 +1,84 @@
+"""
+Benchmarks for replacer.js and replacer_pre-2.1.41.js under Node, using the
+harness in bench/js. For each symbol list size, text is typed into a field
+one character at a time (up to 2000 characters, fewer for large lists) and
+the mean and 95th percentile latency of each keystroke (keydown, keyup and
+the following animation frame) is recorded, along with the time to paste the
+same text. For replacer.js, the mean time of an autocomplete lookup is also
+recorded.
+
+Usage: python -m bench.bench_replacer_js [--save] [--check] [--filter TEXT]
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+from . import harness, stubs
+
+stubs.install()
+
+from src.symbol_manager import SymbolManager
+
+SUITE = 'replacer_js'
+
+TEXT_LENGTH = 2000
+
+# Typing is slow with large lists, so fewer keystrokes are timed. This limits
+# the number of keystrokes times the list size:
+KEYSTROKE_BUDGET = 2000000
+
+# Fraction of words in the typed text that are keys:
+KEY_RATIO = 0.1
+
+STATS = ('keystroke_mean', 'keystroke_p95', 'paste', 'complete')
+
+
+def make_match_list(size):
+    manager = SymbolManager(None, None)
+    manager._symbols = harness.make_symbols(size)
+    return manager.get_match_list()
+
+def make_typed_text(match_list, length, seed=0):
+    """ Generates text where some of the words are keys. """
+    rng = random.Random(seed)
+    words = harness.make_text(length, seed).split(' ')
+    keys = [item['key'] for item in match_list]
+    for i in range(len(words)):
+        if rng.random() < KEY_RATIO:
+            words[i] = rng.choice(keys)
+    return ' '.join(words)[:length]
+
+def main(argv=None):
+    args = harness.parse_args(__doc__.strip().splitlines()[0], argv)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in harness.LIST_SIZES:
+            match_list = make_match_list(size)
+            list_path = harness.write_json(temp_dir, 'match_list.json',
+                match_list)
+            text_len = max(100, min(TEXT_LENGTH, KEYSTROKE_BUDGET // size))
+            text_path = harness.write_json(temp_dir, 'text.json',
+                make_typed_text(match_list, text_len))
+
+            for js_file in harness.JS_FILES:
+                prefix = os.path.splitext(js_file)[0]
+                if not any(args.filter in '%s.%s[%d]' % (prefix, stat, size)
+                    for stat in STATS):
+                    continue
+
+                timings = harness.run_node('bench',
+                    os.path.join(harness.SRC_DIR, js_file), list_path,
+                    text_path)
+                for stat, seconds in timings.items():
+                    name = '%s.%s[%d]' % (prefix, stat, size)
+                    if args.filter in name:
+                        results[name] = seconds
+
+    return harness.report(SUITE, results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,399 @@
+"""
+End-to-end load test of insert_symbols.py, which drives the add-on's hook
+functions through a simulated Anki session: opening a profile, opening editors
+and loading thousands of notes into them, reinitializing the reviewer, opening
+browsers, saving the symbol list from the options window, and switching
+profiles. Each round of the session is run once per profile.
+
+For each phase, the wall time is timed, and the number of Javascript
+evaluations and bytes evaluated are printed. The session also checks that
+each Anki event runs the add-on's handler exactly once, and that replacer.js
+is injected at most once per page. Breaking either rule (eg. by registering
+hooks again on every profile switch) makes the run fail.
+
+Usage: python -m bench.bench_session [--save] [--check] [--filter TEXT]
+"""
+
+import sqlite3
+import sys
+import time
+
+from . import harness, stubs
+
+stubs.install()
+
+from anki.hooks import runHook
+from aqt import gui_hooks
+
+SUITE = 'session'
+
+ROUNDS = 4
+EDITOR_COUNT = 50
+NOTE_LOADS = 5000
+REVIEWER_INITS = 100
+BROWSER_COUNT = 10
+OPTION_SAVES = 20
+SAVED_LIST_SIZE = 1000
+
+MAX_REPORTED = 20
+
+# A page has replacer.js if this was evaluated in it:
+SCRIPT_MARKER = 'var insert_symbols = new function'
+CHECK_SCRIPT = ("typeof insert_symbols == 'undefined' ? 'undefined' "
+    ": (insert_symbols.onNoteLoaded(), typeof insert_symbols)")
+
+
+""" Fake Anki Objects """
+
+class Recorder(object):
+    """ Counts the Javascript evaluated in every WebView. """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.evals = 0
+        self.bytes = 0
+        self.checks = 0
+        self.injections = 0
+        self.reinjections = 0
+        self.list_updates = 0
+
+recorder = Recorder()
+
+class WebView(object):
+    """
+    Stands in for EditorWebView and the reviewer's WebView. Loading a page
+    clears the scripts that were evaluated in it.
+    """
+
+    def __init__(self):
+        self.load_page()
+
+    def load_page(self):
+        self.has_script = False
+
+    def eval(self, js):
+        recorder.evals += 1
+        recorder.bytes += len(js.encode('utf-8'))
+        if SCRIPT_MARKER in js:
+            recorder.injections += 1
+            if self.has_script:
+                recorder.reinjections += 1
+            self.has_script = True
+        elif 'insert_symbols.setMatchList(' in js:
+            recorder.list_updates += 1
+
+    def evalWithCallback(self, js, callback):
+        self.eval(js)
+        result = None
+        if js == CHECK_SCRIPT:
+            recorder.checks += 1
+            result = 'object' if self.has_script else 'undefined'
+        callback(result)
+
+class Signal(object):
+
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+class LineEdit(object):
+
+    def __init__(self):
+        self.textEdited = Signal()
+        self.returnPressed = Signal()
+
+class ComboBox(object):
+
+    def __init__(self):
+        self._line_edit = LineEdit()
+
+    def lineEdit(self):
+        return self._line_edit
+
+class Menu(object):
+
+    def __init__(self):
+        self.actions = []
+
+    def addAction(self, action):
+        self.actions.append(action)
+
+    def addMenu(self, menu):
+        self.actions.append(menu)
+
+class Form(object):
+
+    def __init__(self):
+        self.menuTools = Menu()
+        self.menu_Notes = Menu()
+        self.searchEdit = ComboBox()
+
+class Database(object):
+    """ Stands in for mw.col.db, using an in-memory SQLite database. """
+
+    def __init__(self):
+        self._conn = sqlite3.connect(':memory:')
+
+    def first(self, sql, *args):
+        return self._conn.execute(sql, args).fetchone()
+
+    def all(self, sql, *args):
+        return self._conn.execute(sql, args).fetchall()
+
+    def execute(self, sql, *args):
+        self._conn.execute(sql, args)
+
+    def executemany(self, sql, rows):
+        self._conn.executemany(sql, rows)
+
+    def commit(self):
+        self._conn.commit()
+
+class Collection(object):
+
+    def __init__(self):
+        self.db = Database()
+
+class ProfileManager(object):
+
+    def __init__(self):
+        self.name = None
+
+class MainWindow(object):
+
+    def __init__(self):
+        self.form = Form()
+        self.col = None
+        self.pm = ProfileManager()
+
+class Editor(object):
+    """ The parts of aqt.editor.Editor that run the add-on's hooks. """
+
+    def __init__(self, mw, widget, parentWindow, addMode=False):
+        self.mw = mw
+        self.widget = widget
+        self.note = None
+        self.currentField = None
+        self.web = WebView()
+
+        self.buttons = []
+        gui_hooks.editor_did_init_buttons(self.buttons, self)
+        self.shortcuts = []
+        gui_hooks.editor_did_init_shortcuts(self.shortcuts, self)
+
+    def addButton(self, icon, cmd, func, **kwargs):
+        return cmd
+
+    def setNote(self, note, hide=True, focusTo=None):
+        self.note = note
+        self.loadNote(focusTo=focusTo)
+
+    def loadNote(self, focusTo=None):
+        gui_hooks.editor_did_load_note(self)
+
+    def cleanup(self):
+        self.web = None
+
+class Reviewer(object):
+    """ The parts of aqt.reviewer.Reviewer that run the add-on's hooks. """
+
+    def __init__(self, mw):
+        self.mw = mw
+        self.web = WebView()
+
+    def _initWeb(self):
+        self.web.load_page()
+
+    def cleanup(self):
+        gui_hooks.reviewer_will_end()
+
+class Browser(object):
+    """ The parts of aqt.browser.Browser that run the add-on's hooks. """
+
+    def __init__(self, mw, card=None, search=None):
+        self.mw = mw
+        self.form = Form()
+        gui_hooks.browser_menus_did_init(self)
+
+class SymbolWindow(object):
+    """ The options window is not opened in the session. """
+
+    def __init__(self, mw, manager, usage_stats=None):
+        pass
+
+def load_addon(mw):
+    """ Imports insert_symbols.py with the fake Anki objects above. """
+    import aqt
+    import src
+
+    aqt.mw = mw
+    stubs.provide('aqt.editor', Editor=Editor, EditorWebView=WebView)
+    stubs.provide('aqt.reviewer', Reviewer=Reviewer)
+    stubs.provide('aqt.browser', Browser=Browser)
+    stubs.provide('src.symbol_window', SymbolWindow=SymbolWindow)
+
+    from src import insert_symbols
+    return insert_symbols
+
+
+""" Session """
+
+class Session(object):
+    """
+    Runs each phase of a round, keeping the time and Javascript counts of
+    each phase, and any broken invariants.
+    """
+
+    def __init__(self):
+        self.mw = MainWindow()
+        self.addon = load_addon(self.mw)
+        self.menu_size = len(self.mw.form.menuTools.actions)
+        self.editors = []
+        self.reviewer = Reviewer(self.mw)
+        self.saved_lists = [harness.make_symbols(SAVED_LIST_SIZE, seed=i)
+            for i in range(OPTION_SAVES)]
+        self.times = {}
+        self.counts = []
+        self.failures = []
+
+    def _run_phase(self, round_num, name, func):
+        recorder.reset()
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+
+        self.times[name] = min(seconds, self.times.get(name, seconds))
+        self.counts.append((round_num, name, recorder.evals, recorder.bytes,
+            recorder.injections))
+        if recorder.reinjections:
+            self._fail(round_num, name, 'replacer.js injected %d time(s) '
+                'into a page that already had it' % recorder.reinjections)
+
+    def _fail(self, round_num, name, message):
+        self.failures.append('round %d, %s: %s' % (round_num, name, message))
+
+    def _expect(self, round_num, name, what, actual, expected):
+        if actual != expected:
+            self._fail(round_num, name, '%s %d times, expected %d'
+                % (what, actual, expected))
+
+    def open_profile(self, round_num):
+        self.mw.pm.name = 'profile%d' % round_num
+        self.mw.col = Collection()
+        gui_hooks.profile_did_open()
+        runHook('profileLoaded')
+
+    def open_editors(self, round_num):
+        self.editors = [Editor(self.mw, None, None)
+            for _ in range(EDITOR_COUNT)]
+        for editor in self.editors:
+            editor.setNote(object())
+
+        phase = 'open_editors'
+        for editor in self.editors:
+            self._expect(round_num, phase, 'button added',
+                len(editor.buttons), 1)
+            self._expect(round_num, phase, 'shortcut added',
+                len(editor.shortcuts), 1)
+        self._expect(round_num, phase, 'script checked', recorder.checks,
+            EDITOR_COUNT)
+        self._expect(round_num, phase, 'script injected',
+            recorder.injections, EDITOR_COUNT)
+
+    def load_notes(self, round_num):
+        for i in range(NOTE_LOADS):
+            self.editors[i % EDITOR_COUNT].loadNote()
+
+        phase = 'load_notes'
+        self._expect(round_num, phase, 'script checked', recorder.checks,
+            NOTE_LOADS)
+        self._expect(round_num, phase, 'script injected',
+            recorder.injections, 0)
+
+    def init_reviewer(self, round_num):
+        for _ in range(REVIEWER_INITS):
+            self.reviewer._initWeb()
+
+        phase = 'init_reviewer'
+        self._expect(round_num, phase, 'script injected',
+            recorder.injections, REVIEWER_INITS)
+
+    def open_browsers(self, round_num):
+        browsers = [Browser(self.mw) for _ in range(BROWSER_COUNT)]
+
+        phase = 'open_browsers'
+        for browser in browsers:
+            search_box = browser.form.searchEdit.lineEdit()
+            self._expect(round_num, phase, 'search box connected',
+                len(search_box.textEdited.slots), 1)
+            self._expect(round_num, phase, 'Notes menu action added',
+                len(browser.form.menu_Notes.actions), 1)
+
+    def save_options(self, round_num):
+        for symbols in self.saved_lists:
+            errors = self.addon.ins_sym_manager.update_and_save_symbol_list(
+                symbols)
+            if errors:
+                self._fail(round_num, 'save_options', 'invalid list')
+                return
+
+        self._expect(round_num, 'save_options', 'symbol list sent',
+            recorder.list_updates, OPTION_SAVES * (EDITOR_COUNT + 1))
+
+    def close_windows(self, round_num):
+        for editor in self.editors:
+            editor.cleanup()
+        self.editors = []
+        self.reviewer.cleanup()
+
+        owners = self.addon.ins_sym_webview_owners
+        self._expect(round_num, 'close_windows', 'editor left open',
+            len(owners['editors']), 0)
+        if owners['reviewer'] is not None:
+            self._fail(round_num, 'close_windows', 'reviewer left open')
+
+    def run_round(self, round_num):
+        for name in ('open_profile', 'open_editors', 'load_notes',
+            'init_reviewer', 'open_browsers', 'save_options',
+            'close_windows'):
+            self._run_phase(round_num, name, lambda: getattr(self, name)(
+                round_num))
+
+        self._expect(round_num, 'open_profile', 'Tools menu item added',
+            len(self.mw.form.menuTools.actions), self.menu_size)
+
+    def print_counts(self):
+        print('%-5s  %-14s  %8s  %12s  %10s' % ('Round', 'Phase', 'Evals',
+            'Bytes', 'Injections'))
+        print('-' * 55)
+        for round_num, name, evals, num_bytes, injections in self.counts:
+            print('%-5d  %-14s  %8d  %12d  %10d' % (round_num, name, evals,
+                num_bytes, injections))
+        print('')
+
+def main(argv=None):
+    args = harness.parse_args(__doc__.strip().splitlines()[0], argv)
+
+    session = Session()
+    for round_num in range(1, ROUNDS + 1):
+        session.run_round(round_num)
+    session.print_counts()
+
+    results = dict((name, seconds) for name, seconds in session.times.items()
+        if args.filter in name)
+    code = harness.report(SUITE, results, args)
+
+    if session.failures:
+        print('\n%d broken invariant(s):' % len(session.failures))
+        for failure in session.failures[:MAX_REPORTED]:
+            print('  %s' % failure)
+        return 1
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Benchmarks for the options window, which runs SymbolWindow with PyQt6 under
+the offscreen Qt platform and a stub SymbolManager. For each list size, this
+times open() and _reload_view(), typing a key that is in the list
+(on_key_text_changed()), adding and deleting one entry in the middle of the
+list, and importing and exporting the list as CSV and as a symbol pack.
+
+File dialogs and the worker thread are skipped: imports time the reader plus
+_on_import_finished(), and exports time the writer, which is what
+export_list() runs on the worker thread.
+
+Usage: python -m bench.bench_window [--save] [--check] [--filter TEXT]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from . import harness, stubs
+
+stubs.install(pyqt=True)
+
+# Errors that SymbolWindow would show in a message box:
+messages = []
+stubs.provide('aqt.utils', showInfo=messages.append)
+
+from PyQt6.QtWidgets import QApplication
+
+from src.list_io import read_symbol_csv, write_symbol_csv
+from src.symbol_pack import read_symbol_pack, write_symbol_pack
+from src.symbol_window import SymbolWindow
+
+SUITE = 'window'
+
+# Each edit and import is timed this many times, and the fastest is kept:
+EDIT_REPEAT = 5
+
+FORMATS = (
+    ('csv', '.csv', read_symbol_csv, write_symbol_csv),
+    ('pack', '.sympack', read_symbol_pack, write_symbol_pack),
+)
+
+BENCHMARKS = ['open', 'reload_view', 'key_text_changed', 'add_pair',
+    'delete_pair'] + ['%s_%s' % (op, name) for name, _, _, _ in FORMATS
+    for op in ('export', 'import')]
+
+
+class StubSymbolManager(object):
+    """ The parts of SymbolManager that SymbolWindow uses. """
+
+    def __init__(self, symbols):
+        self._symbols = symbols
+
+    def get_list(self):
+        return list(self._symbols)
+
+    def get_default_list(self):
+        return list(self._symbols)
+
+    def update_and_save_symbol_list(self, new_list):
+        self._symbols = list(new_list)
+        return None
+
+
+def _time_once(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+def _type_key(window, key, value=''):
+    window.ui.keyLineEdit.setText(key)
+    window.ui.valueLineEdit.setText(value)
+    window.on_key_text_changed(key)
+
+def time_edits(window):
+    """
+    Adds a new key in the middle of the list, then deletes it again.
+
+    @return: The fastest (add, delete) times in seconds.
+    """
+    key = window._working_list[len(window._working_list) // 2][0] + '0'
+    add_times = []
+    delete_times = []
+    for _ in range(EDIT_REPEAT):
+        _type_key(window, key, 'x')
+        add_times.append(_time_once(window.add_pair_to_list))
+        _type_key(window, key)
+        delete_times.append(_time_once(window.delete_pair_from_list))
+    return min(add_times), min(delete_times)
+
+def time_import(window, reader, fname):
+    """ Imports FNAME in place of the working list, then undoes it. """
+    def import_file():
+        window._on_import_finished(reader(fname))
+
+    times = []
+    for _ in range(EDIT_REPEAT):
+        window._is_merge_import = False
+        times.append(_time_once(import_file))
+        window.undo()
+    return min(times)
+
+def run_size(size, temp_dir, args):
+    """ Runs each benchmark for one list size. """
+    results = {}
+    def add(name, func):
+        full_name = '%s[%d]' % (name, size)
+        if args.filter in full_name:
+            results[full_name] = func()
+            sys.stderr.write('%s: %s\n' % (full_name,
+                harness.format_time(results[full_name])))
+
+    symbols = harness.make_symbols(size)
+    window = SymbolWindow(None, StubSymbolManager(symbols))
+    window.open()
+
+    add('open', lambda: harness.time_call(window.open))
+    add('reload_view', lambda: harness.time_call(window._reload_view))
+    middle_key = symbols[size // 2][0]
+    add('key_text_changed', lambda: harness.time_call(
+        lambda: window.on_key_text_changed(middle_key)))
+
+    if any(args.filter in '%s[%d]' % (name, size)
+        for name in ('add_pair', 'delete_pair')):
+        add_time, delete_time = time_edits(window)
+        add('add_pair', lambda: add_time)
+        add('delete_pair', lambda: delete_time)
+
+    # Imports replace the list with a different one of the same size:
+    imported = harness.make_symbols(size, seed=1)
+    for name, extension, reader, writer in FORMATS:
+        fname = os.path.join(temp_dir, 'symbols%s' % extension)
+        add('export_%s' % name, lambda: harness.time_call(
+            lambda: writer(fname, symbols)))
+
+        import_fname = os.path.join(temp_dir, 'imported%s' % extension)
+        writer(import_fname, imported)
+        add('import_%s' % name, lambda: time_import(window, reader,
+            import_fname))
+
+    window.done(0)
+    window.deleteLater()
+    return results
+
+def main(argv=None):
+    args = harness.parse_args(__doc__.strip().splitlines()[0], argv)
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in harness.LIST_SIZES:
+            if not any(args.filter in '%s[%d]' % (name, size)
+                for name in BENCHMARKS):
+                continue
+            results.update(run_size(size, temp_dir, args))
+            app.processEvents()
+
+    code = harness.report(SUITE, results, args)
+    if messages:
+        print('\nSymbolWindow showed %d error(s), the first being:\n%s'
+            % (len(messages), messages[0]))
+        return 1
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
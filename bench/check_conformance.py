@@ -0,0 +1,128 @@
+"""
+Checks that the Javascript matchers in replacer.js and replacer_pre-2.1.41.js
+give the same results as SymbolMatcher in matcher.py. Each case in the corpus
+is typed one character at a time into an empty field, and separately pasted,
+using the Node harness in bench/js. Both must give the same text as
+SymbolMatcher.convert().
+
+The corpus is stored in bench/js/corpus.json so that the same cases are
+checked each time. Run with --regenerate to build a new corpus.
+
+Usage: python -m bench.check_conformance [--regenerate] [--count N]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+from . import harness, stubs
+
+stubs.install()
+
+from src.default_symbols import DEFAULT_MATCHES
+from src.matcher import SymbolMatcher
+from src.symbol_manager import SymbolManager
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'js', 'corpus.json')
+
+# HTML keys are added since the default list has none:
+EXTRA_SYMBOLS = [('::hr::', '<hr>'), ('::sep::', '<span>|</span>')]
+
+# Characters that text between keys is made of, which includes characters
+# found in keys so that partial keys are common:
+FILLER_CHARS = 'abcxyz  \n:-<>=|.\\'
+
+MAX_REPORTED = 10
+
+
+def make_match_list():
+    manager = SymbolManager(None, None)
+    manager._symbols = list(DEFAULT_MATCHES) + EXTRA_SYMBOLS
+    return manager.get_match_list()
+
+def make_corpus(count, seed=0):
+    """ Generates COUNT cases from a mix of keys and filler characters. """
+    rng = random.Random(seed)
+    match_list = make_match_list()
+    keys = [item['key'] for item in match_list]
+
+    cases = []
+    for _ in range(count):
+        pieces = []
+        for _ in range(rng.randint(1, 12)):
+            if rng.random() < 0.4:
+                pieces.append(rng.choice(keys))
+            else:
+                pieces.append(''.join(rng.choice(FILLER_CHARS)
+                    for _ in range(rng.randint(1, 4))))
+        cases.append(''.join(pieces))
+    return {'match_list': match_list, 'cases': cases}
+
+def load_corpus():
+    with open(CORPUS_PATH, 'r', encoding='utf-8') as corpus_file:
+        return json.load(corpus_file)
+
+def save_corpus(corpus):
+    with open(CORPUS_PATH, 'w', encoding='utf-8') as corpus_file:
+        json.dump(corpus, corpus_file, indent=0, ensure_ascii=False)
+        corpus_file.write('\n')
+
+def check(corpus):
+    """
+    Runs the corpus through each Javascript file and prints any cases that
+    differ from SymbolMatcher.
+
+    @return: The number of mismatches.
+    """
+    matcher = SymbolMatcher(corpus['match_list'])
+
+    # Pasted text keeps runs of spaces with &nbsp;, which looks the same:
+    normalize = lambda text: text.replace('\xa0', ' ')
+    expected = [matcher.convert(text, at_block_end=False)
+        for text in corpus['cases']]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus_path = harness.write_json(temp_dir, 'corpus.json', corpus)
+        mismatches = 0
+        for js_file in harness.JS_FILES:
+            result = harness.run_node('conform',
+                os.path.join(harness.SRC_DIR, js_file), corpus_path)
+
+            for mode in ('typed', 'pasted'):
+                for i, actual in enumerate(result[mode]):
+                    if normalize(actual) == expected[i]:
+                        continue
+                    mismatches += 1
+                    if mismatches <= MAX_REPORTED:
+                        print('%s (%s): %r\n  expected %r\n  actual   %r' % (
+                            js_file, mode, corpus['cases'][i], expected[i],
+                            actual))
+
+            print('%s: checked %d cases' % (js_file, len(expected)))
+    return mismatches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip()
+        .splitlines()[0])
+    parser.add_argument('--regenerate', action='store_true',
+        help='build a new corpus and save it to %s' % CORPUS_PATH)
+    parser.add_argument('--count', type=int, default=1000,
+        help='number of cases when regenerating (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if args.regenerate or not os.path.exists(CORPUS_PATH):
+        save_corpus(make_corpus(args.count))
+    mismatches = check(load_corpus())
+
+    if mismatches:
+        print('%d mismatch(es) between Python and Javascript.' % mismatches)
+        return 1
+    print('Python and Javascript matchers agree.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+This file contains helpers shared by the benchmarks: synthetic symbol lists
+and text, timing, and saving or checking JSON baselines.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import subprocess
+import sys
+import timeit
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src')
+
+# Scripts that are loaded into Anki's WebViews:
+JS_FILES = ('replacer.js', 'replacer_pre-2.1.41.js')
+NODE_RUNNER = os.path.join(os.path.dirname(__file__), 'js', 'run.js')
+
+# Symbol list sizes used by the benchmarks:
+LIST_SIZES = (100, 1000, 10000, 100000)
+
+# A benchmark fails --check if it is this many times slower than its baseline:
+DEFAULT_THRESHOLD = 1.5
+
+REPEAT = 3
+
+
+""" Synthetic Data """
+
+def _make_word(rng, min_len=2, max_len=8):
+    return ''.join(rng.choice(string.ascii_lowercase)
+        for _ in range(rng.randint(min_len, max_len)))
+
+def make_symbols(count, seed=0):
+    """
+    Generates a valid symbol list with a mix of key types: 60% normal keys
+    (eg. "abc"), 30% colon-delimited keys (eg. ":abc:"), and 10% HTML keys
+    (eg. "::abc::").
+
+    @return: A list of (key, value) tuples sorted by key.
+    """
+    rng = random.Random(seed)
+    symbols = {}
+    while len(symbols) < count:
+        word = _make_word(rng)
+        kind = rng.random()
+        if kind < 0.6:
+            key = word
+        elif kind < 0.9:
+            key = ':%s:' % word
+        else:
+            key = '::%s::' % word
+        symbols[key] = chr(0x2100 + len(symbols) % 0x1000)
+    return sorted(symbols.items())
+
+def make_text(length, seed=0):
+    """ Generates LENGTH characters of space-separated words. """
+    rng = random.Random(seed)
+    words = []
+    total = 0
+    while total < length:
+        word = _make_word(rng, 1, 10)
+        words.append(word)
+        total += len(word) + 1
+    return ' '.join(words)[:length]
+
+
+""" Timing """
+
+def time_call(func, repeat=REPEAT):
+    """
+    Times FUNC, which takes no arguments. The number of calls per run is
+    chosen by timeit so that each run takes at least 0.2 seconds.
+
+    @return: The fastest time per call in seconds.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+def format_time(seconds):
+    if seconds is None:
+        return '-'
+    if seconds < 1e-3:
+        return '%.2f us' % (seconds * 1e6)
+    if seconds < 1:
+        return '%.2f ms' % (seconds * 1e3)
+    return '%.2f s' % seconds
+
+
+""" Javascript """
+
+def run_node(*args):
+    """
+    Runs bench/js/run.js with the given arguments under Node.
+
+    @return: The JSON output of run.js.
+    """
+    node = shutil.which('node')
+    if node is None:
+        sys.exit('Node.js is required to run the Javascript harness.')
+    output = subprocess.check_output([node, NODE_RUNNER] + list(args))
+    return json.loads(output.decode('utf-8'))
+
+def write_json(directory, name, data):
+    """ Writes DATA to a JSON file in DIRECTORY and returns its path. """
+    path = os.path.join(directory, name)
+    with open(path, 'w', encoding='utf-8') as json_file:
+        json.dump(data, json_file)
+    return path
+
+
+""" Baselines """
+
+def get_baseline_path(suite):
+    return os.path.join(BASELINE_DIR, '%s.json' % suite)
+
+def load_baseline(suite):
+    """ Returns a dict of benchmark name to seconds, or {} if not saved. """
+    try:
+        with open(get_baseline_path(suite), 'r') as baseline_file:
+            return json.load(baseline_file)['results']
+    except (IOError, ValueError, KeyError):
+        return {}
+
+def save_baseline(suite, results):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    data = {
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'results': results
+    }
+    with open(get_baseline_path(suite), 'w') as baseline_file:
+        json.dump(data, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+
+""" Running Benchmarks """
+
+def parse_args(description, argv=None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--save', action='store_true',
+        help='save the results as the new baseline')
+    parser.add_argument('--check', action='store_true',
+        help='exit with an error if any result is slower than its baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='slowdown that counts as a regression (default: %(default)s)')
+    parser.add_argument('--filter', default='',
+        help='only run benchmarks whose name contains this text')
+    return parser.parse_args(argv)
+
+def report(suite, results, args):
+    """
+    Prints RESULTS as a table alongside the saved baseline, then saves or
+    checks the baseline as requested by ARGS.
+
+    @param results: A dict of benchmark name to seconds per call.
+    @return: The exit code, which is 1 if --check found a regression.
+    """
+    baseline = load_baseline(suite)
+    regressions = []
+
+    name_width = max([len(name) for name in results] + [9])
+    print('%-*s  %12s  %12s  %7s' % (name_width, 'Benchmark', 'Time',
+        'Baseline', 'Ratio'))
+    print('-' * (name_width + 37))
+
+    for name in sorted(results):
+        seconds = results[name]
+        base = baseline.get(name)
+        ratio = seconds / base if base else None
+        flag = ''
+        if ratio is not None and ratio > args.threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+
+        print('%-*s  %12s  %12s  %7s%s' % (name_width, name,
+            format_time(seconds), format_time(base),
+            '%.2fx' % ratio if ratio is not None else '-', flag))
+
+    if args.save:
+        # Keep baselines for benchmarks that were filtered out:
+        baseline.update(results)
+        save_baseline(suite, baseline)
+        print('\nSaved baseline to %s' % get_baseline_path(suite))
+
+    if regressions:
+        print('\n%d benchmark(s) slower than %.2fx the baseline.'
+            % (len(regressions), args.threshold))
+        if args.check:
+            return 1
+    return 0
+
+def run(suite, benchmarks, description, argv=None):
+    """
+    Runs a benchmark suite from the command line.
+
+    @param benchmarks: An iterable of (name, setup) pairs. SETUP is called
+      once to build the benchmark's data and returns the function to time,
+      so that large inputs are only built for benchmarks that are run.
+    """
+    args = parse_args(description, argv)
+    results = {}
+    for name, setup in benchmarks:
+        if args.filter not in name:
+            continue
+        results[name] = time_call(setup())
+        sys.stderr.write('%s: %s\n' % (name, format_time(results[name])))
+    sys.exit(report(suite, results, args))
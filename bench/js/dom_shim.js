@@ -0,0 +1,314 @@
+/*
+ * A minimal, handwritten DOM that provides just enough for replacer.js and
+ * replacer_pre-2.1.41.js to run under plain Node: text and element nodes, a
+ * document with capture-phase listeners, a selection, and the insertText /
+ * insertHTML editing commands. There is no layout, no shadow DOM (every
+ * node's root is the document) and no HTML parser beyond <br> and entities.
+ */
+
+"use strict";
+
+const ELEMENT_NODE = 1;
+const TEXT_NODE = 3;
+const DOCUMENT_NODE = 9;
+
+class Node {
+    constructor(nodeType, nodeName) {
+        this.nodeType = nodeType;
+        this.nodeName = nodeName;
+        this.parentNode = null;
+        this.childNodes = [];
+    }
+
+    get previousSibling() {
+        if (this.parentNode === null) {
+            return null;
+        }
+        const siblings = this.parentNode.childNodes;
+        const i = siblings.indexOf(this);
+        return i > 0 ? siblings[i - 1] : null;
+    }
+
+    get nextSibling() {
+        if (this.parentNode === null) {
+            return null;
+        }
+        const siblings = this.parentNode.childNodes;
+        const i = siblings.indexOf(this);
+        return i < siblings.length - 1 ? siblings[i + 1] : null;
+    }
+
+    get firstChild() {
+        return this.childNodes.length > 0 ? this.childNodes[0] : null;
+    }
+
+    get lastChild() {
+        const n = this.childNodes.length;
+        return n > 0 ? this.childNodes[n - 1] : null;
+    }
+
+    get textContent() {
+        return this.childNodes.map((child) => child.textContent).join("");
+    }
+
+    appendChild(child) {
+        if (child.parentNode !== null) {
+            child.parentNode.removeChild(child);
+        }
+        child.parentNode = this;
+        this.childNodes.push(child);
+        return child;
+    }
+
+    insertBefore(child, ref) {
+        if (ref === null) {
+            return this.appendChild(child);
+        }
+        if (child.parentNode !== null) {
+            child.parentNode.removeChild(child);
+        }
+        child.parentNode = this;
+        this.childNodes.splice(this.childNodes.indexOf(ref), 0, child);
+        return child;
+    }
+
+    removeChild(child) {
+        this.childNodes.splice(this.childNodes.indexOf(child), 1);
+        child.parentNode = null;
+        return child;
+    }
+
+    getRootNode() {
+        let node = this;
+        while (node.parentNode !== null) {
+            node = node.parentNode;
+        }
+        return node;
+    }
+}
+
+class Text extends Node {
+    constructor(data) {
+        super(TEXT_NODE, "#text");
+        this.data = data;
+    }
+
+    get length() {
+        return this.data.length;
+    }
+
+    get textContent() {
+        return this.data;
+    }
+}
+
+class Element extends Node {
+    constructor(tagName, attributes) {
+        super(ELEMENT_NODE, tagName.toUpperCase());
+        this.attributes = Object.assign({}, attributes);
+        this.style = {};
+    }
+
+    hasAttribute(name) {
+        return Object.prototype.hasOwnProperty.call(this.attributes, name);
+    }
+
+    get isContentEditable() {
+        let node = this;
+        while (node !== null && node.nodeType == ELEMENT_NODE) {
+            if (node.hasAttribute("contenteditable")) {
+                return node.attributes["contenteditable"] != "false";
+            }
+            node = node.parentNode;
+        }
+        return false;
+    }
+}
+
+/**
+ * Returns the text nodes under ROOT in document order.
+ */
+function getTextNodes(root) {
+    const nodes = [];
+    const visit = (node) => {
+        if (node.nodeType == TEXT_NODE) {
+            nodes.push(node);
+        }
+        node.childNodes.forEach(visit);
+    };
+    visit(root);
+    return nodes;
+}
+
+function decodeHTML(html) {
+    return html.replace(/<br\s*\/?>/gi, "\n").replace(/&nbsp;/g, "\u00a0")
+        .replace(/&lt;/g, "<").replace(/&gt;/g, ">").replace(/&amp;/g, "&");
+}
+
+class Selection {
+    constructor() {
+        this.anchorNode = null;
+        this.anchorOffset = 0;
+        this.focusNode = null;
+        this.focusOffset = 0;
+    }
+
+    get isCollapsed() {
+        return this.anchorNode === this.focusNode
+            && this.anchorOffset == this.focusOffset;
+    }
+
+    get rangeCount() {
+        return this.focusNode === null ? 0 : 1;
+    }
+
+    getRangeAt(index) {
+        return {
+            startContainer: this.anchorNode, startOffset: this.anchorOffset,
+            endContainer: this.focusNode, endOffset: this.focusOffset,
+            getBoundingClientRect: () => ({ left: 0, top: 0, bottom: 0 })
+        };
+    }
+
+    setBaseAndExtent(anchorNode, anchorOffset, focusNode, focusOffset) {
+        this.anchorNode = anchorNode;
+        this.anchorOffset = anchorOffset;
+        this.focusNode = focusNode;
+        this.focusOffset = focusOffset;
+    }
+
+    collapse(node, offset) {
+        this.setBaseAndExtent(node, offset, node, offset);
+    }
+
+    removeAllRanges() {
+        this.setBaseAndExtent(null, 0, null, 0);
+    }
+
+    /**
+     * Replaces the selected text with TEXT and collapses the selection after
+     * it. Both ends of the selection must be in text nodes, with the anchor
+     * first.
+     */
+    replaceWith(text) {
+        const start = this.anchorNode;
+        const end = this.focusNode;
+        if (start === end) {
+            start.data = start.data.substring(0, this.anchorOffset) + text
+                + start.data.substring(this.focusOffset);
+        } else {
+            const nodes = getTextNodes(start.getRootNode());
+            const first = nodes.indexOf(start);
+            const last = nodes.indexOf(end);
+            start.data = start.data.substring(0, this.anchorOffset) + text;
+            for (let i = first + 1; i < last; i++) {
+                nodes[i].data = "";
+            }
+            end.data = end.data.substring(this.focusOffset);
+        }
+        this.collapse(start, this.anchorOffset + text.length);
+    }
+}
+
+/**
+ * Creates a fresh window/document pair. The returned object is used as the
+ * global object of the context that the replacer script runs in.
+ */
+function createEnvironment() {
+    const document = new Node(DOCUMENT_NODE, "#document");
+    const selection = new Selection();
+    const listeners = {};
+    const frames = new Map();
+    let nextFrame = 1;
+
+    // The body is kept apart from the document, so that popups added to it
+    // are not part of the editable text:
+    document.body = new Element("body");
+    document.createElement = (tagName) => new Element(tagName);
+    document.createTextNode = (data) => new Text(data);
+    document.getSelection = () => selection;
+    document.commandCount = 0;
+
+    document.addEventListener = (type, listener, capture) => {
+        (listeners[type] = listeners[type] || []).push(listener);
+    };
+    document.removeEventListener = (type, listener, capture) => {
+        const list = listeners[type] || [];
+        const i = list.indexOf(listener);
+        if (i >= 0) {
+            list.splice(i, 1);
+        }
+    };
+    document.countListeners = () => Object.values(listeners)
+        .reduce((total, list) => total + list.length, 0);
+
+    document.execCommand = (command, showUI, value) => {
+        document.commandCount++;
+        if (command == "insertText") {
+            selection.replaceWith(value);
+        } else if (command == "insertHTML") {
+            selection.replaceWith(decodeHTML(value));
+        } else {
+            throw new Error("Unsupported command: " + command);
+        }
+        return true;
+    };
+
+    /**
+     * Dispatches EVT to the document's listeners, which are all registered
+     * in the capture phase. Returns false if the default was prevented.
+     */
+    document.dispatchEvent = (evt) => {
+        let prevented = false;
+        evt.preventDefault = () => { prevented = true; };
+        evt.stopPropagation = () => {};
+        evt.composedPath = () => {
+            const path = [];
+            for (let node = evt.target; node !== null; node = node.parentNode) {
+                path.push(node);
+            }
+            return path;
+        };
+        (listeners[evt.type] || []).slice().forEach((listener) => {
+            listener(evt);
+        });
+        return !prevented;
+    };
+
+    const window = {
+        document: document,
+        Node: { ELEMENT_NODE: ELEMENT_NODE, TEXT_NODE: TEXT_NODE },
+        getSelection: () => selection,
+        innerHeight: 768,
+        requestAnimationFrame: (callback) => {
+            frames.set(nextFrame, callback);
+            return nextFrame++;
+        },
+        cancelAnimationFrame: (id) => {
+            frames.delete(id);
+        },
+        /** Runs the callbacks of the pending animation frame. */
+        flushFrames: () => {
+            const callbacks = Array.from(frames.values());
+            frames.clear();
+            callbacks.forEach((callback) => callback(0));
+        },
+        console: console,
+        // Timers do not keep Node running, since replacer.js only uses them
+        // to send messages, which are recorded in pycmdMessages:
+        setTimeout: (callback, delay) => setTimeout(callback, delay).unref(),
+        clearTimeout: clearTimeout,
+        pycmdMessages: [],
+        pycmd: (message) => window.pycmdMessages.push(message),
+        JSON: JSON
+    };
+    window.window = window;
+    return window;
+}
+
+module.exports = {
+    createEnvironment: createEnvironment,
+    Element: Element,
+    Text: Text,
+    getTextNodes: getTextNodes
+};
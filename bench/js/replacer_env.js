@@ -0,0 +1,111 @@
+/*
+ * Loads a replacer script into a fresh DOM shim (see dom_shim.js) with a
+ * single editable field, and simulates typing and pasting into that field.
+ */
+
+"use strict";
+
+const fs = require("fs");
+const vm = require("vm");
+
+const { createEnvironment, Element, Text } = require("./dom_shim");
+
+const KEY_SPACE = 32;
+const KEY_ENTER = 13;
+
+class ReplacerEnv {
+    /**
+     * @param scriptPath Path to replacer.js or replacer_pre-2.1.41.js.
+     * @param matchList A match list, as returned by
+     *   SymbolManager.get_match_list().
+     */
+    constructor(scriptPath, matchList) {
+        this.window = createEnvironment();
+        this.document = this.window.document;
+        this.context = vm.createContext(this.window);
+        this.script = new vm.Script(fs.readFileSync(scriptPath, "utf8"),
+            { filename: scriptPath });
+
+        this.editable = new Element("div", { "contenteditable": "true" });
+        this.document.appendChild(this.editable);
+        this.load(matchList);
+        this.setText("");
+    }
+
+    /**
+     * Evaluates the script and sets its match list, which is what
+     * insert_symbols.py does when a page that does not have the script yet
+     * loads a note.
+     */
+    load(matchList) {
+        this.script.runInContext(this.context);
+        this.context.insert_symbols.setMatchList(JSON.stringify(matchList));
+    }
+
+    /** Replaces the field's content with TEXT and puts the caret at the end. */
+    setText(text) {
+        while (this.editable.firstChild !== null) {
+            this.editable.removeChild(this.editable.firstChild);
+        }
+        const node = this.editable.appendChild(new Text(text));
+        this.document.getSelection().collapse(node, text.length);
+    }
+
+    getText() {
+        return this.editable.textContent;
+    }
+
+    _dispatch(type, props) {
+        return this.document.dispatchEvent(Object.assign({
+            type: type,
+            target: this.editable,
+            ctrlKey: false,
+            isComposing: false
+        }, props));
+    }
+
+    /**
+     * Types one character: keydown, then the character is inserted unless
+     * the default was prevented, then keyup, then an animation frame.
+     */
+    typeChar(c) {
+        const which = (c == " ") ? KEY_SPACE : (c == "\n") ? KEY_ENTER
+            : c.toUpperCase().charCodeAt(0);
+        if (this._dispatch("keydown", { which: which })) {
+            this.document.getSelection().replaceWith(c);
+        }
+        this._dispatch("keyup", { which: which });
+        this.window.flushFrames();
+    }
+
+    /**
+     * Presses a key that does not insert text, such as Tab or an arrow key.
+     *
+     * @return Whether the default was prevented.
+     */
+    pressKey(which) {
+        const prevented = !this._dispatch("keydown", { which: which });
+        this._dispatch("keyup", { which: which });
+        this.window.flushFrames();
+        return prevented;
+    }
+
+    typeText(text) {
+        for (const c of text) {
+            this.typeChar(c);
+        }
+    }
+
+    /** Pastes plain TEXT, which is inserted as-is if the script ignores it. */
+    paste(text) {
+        const clipboardData = {
+            types: ["text/plain"],
+            getData: (type) => (type == "text/plain") ? text : ""
+        };
+        if (this._dispatch("paste", { clipboardData: clipboardData })) {
+            this.document.getSelection().replaceWith(text);
+        }
+    }
+}
+
+module.exports = { ReplacerEnv: ReplacerEnv };
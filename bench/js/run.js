@@ -0,0 +1,116 @@
+/*
+ * Command line entry point for the Javascript harness, which is driven by
+ * bench/bench_replacer_js.py and bench/check_conformance.py. Results are
+ * written to stdout as JSON.
+ *
+ *   node run.js conform SCRIPT CORPUS_JSON
+ *     Types and pastes each case in the corpus into an empty field, and
+ *     outputs {"typed": [...], "pasted": [...]} with the resulting text.
+ *
+ *   node run.js bench SCRIPT MATCH_LIST_JSON TEXT_JSON
+ *     Types the text one character at a time and outputs the mean and 95th
+ *     percentile latency per keystroke, plus the time to paste the text, in
+ *     seconds. For scripts with autocomplete, also outputs the mean time to
+ *     look up the completions of a prefix.
+ */
+
+"use strict";
+
+const fs = require("fs");
+
+const { ReplacerEnv } = require("./replacer_env");
+
+function readJSON(path) {
+    return JSON.parse(fs.readFileSync(path, "utf8"));
+}
+
+function now() {
+    return Number(process.hrtime.bigint()) / 1e9;
+}
+
+function conform(scriptPath, corpus) {
+    const env = new ReplacerEnv(scriptPath, corpus.match_list);
+    const typed = [];
+    const pasted = [];
+
+    for (const text of corpus.cases) {
+        env.setText("");
+        env.typeText(text);
+        typed.push(env.getText());
+
+        env.setText("");
+        env.paste(text);
+        pasted.push(env.getText());
+    }
+    return { "typed": typed, "pasted": pasted };
+}
+
+// Number of autocomplete lookups that are timed:
+const COMPLETION_LOOKUPS = 10000;
+
+/**
+ * Times findCompletions() for the first four characters of each of the
+ * list's colon-delimited keys, after one lookup has built the index.
+ */
+function benchCompletions(env, matchList) {
+    const prefixes = matchList.filter((item) => item.key[0] == ":")
+        .map((item) => item.key.substring(0, 4));
+    if (prefixes.length == 0) {
+        return null;
+    }
+
+    const insertSymbols = env.context.insert_symbols;
+    insertSymbols.findCompletions(prefixes[0]);
+    const start = now();
+    for (let i = 0; i < COMPLETION_LOOKUPS; i++) {
+        insertSymbols.findCompletions(prefixes[i % prefixes.length]);
+    }
+    return (now() - start) / COMPLETION_LOOKUPS;
+}
+
+function bench(scriptPath, matchList, text) {
+    const env = new ReplacerEnv(scriptPath, matchList);
+
+    // Warm up so that the JIT has compiled the hot paths:
+    env.typeText(text.substring(0, 50));
+    env.setText("");
+
+    const times = [];
+    for (const c of text) {
+        const start = now();
+        env.typeChar(c);
+        times.push(now() - start);
+    }
+    times.sort((a, b) => a - b);
+
+    env.setText("");
+    const pasteStart = now();
+    env.paste(text);
+    const pasteTime = now() - pasteStart;
+
+    const result = {
+        "keystroke_mean": times.reduce((a, b) => a + b, 0) / times.length,
+        "keystroke_p95": times[Math.floor(times.length * 0.95)],
+        "paste": pasteTime
+    };
+    if (env.context.insert_symbols.findCompletions) {
+        result["complete"] = benchCompletions(env, matchList);
+    }
+    return result;
+}
+
+function main(argv) {
+    const command = argv[0];
+    let result;
+    if (command == "conform") {
+        result = conform(argv[1], readJSON(argv[2]));
+    } else if (command == "bench") {
+        result = bench(argv[1], readJSON(argv[2]), readJSON(argv[3]));
+    } else {
+        process.stderr.write("Usage: node run.js conform|bench ...\n");
+        process.exit(2);
+    }
+    process.stdout.write(JSON.stringify(result));
+}
+
+main(process.argv.slice(2));
@@ -0,0 +1,162 @@
+"""
+This file replaces the aqt and anki packages with empty stub modules so that
+the add-on's modules can be imported outside of Anki. Stubs only provide the
+names that are used when the add-on's modules are imported, plus Anki's hook
+functions; benchmarks that call into Anki provide their own fake objects with
+provide().
+
+install() must be called before any module in src is imported. With
+pyqt=True, aqt.qt exports the real PyQt6 instead of stubs, as Anki does.
+"""
+
+import os
+import re
+import sys
+import types
+
+# Anki version reported by anki.utils.pointVersion():
+POINT_VERSION = 231000
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src')
+
+
+""" Stub Objects """
+
+class _StubMeta(type):
+    """ Any attribute of a stub class, such as a Qt enum, is a stub class. """
+
+    def __getattr__(cls, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Stub
+
+    def __or__(cls, other):
+        return cls
+
+    __ror__ = __or__
+
+class Stub(object, metaclass=_StubMeta):
+    """ 
+    Stands in for any Qt or Anki class or function that a benchmark does not
+    call into. It can be subclassed, and instances accept any method call.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Stub
+
+def _find_qt_names():
+    """ Returns the Qt names used in src, which aqt.qt exports with *. """
+    names = set()
+    for file_name in os.listdir(SRC_DIR):
+        if file_name.endswith('.py'):
+            path = os.path.join(SRC_DIR, file_name)
+            with open(path, 'r', encoding='utf-8') as src_file:
+                names.update(re.findall(r'\b(?:Q[A-Z]\w*|Qt|pyqt\w+)\b', 
+                    src_file.read()))
+    return sorted(names)
+
+
+""" Hooks """
+
+# Legacy hooks added with anki.hooks.addHook():
+_legacy_hooks = {}
+
+def _add_hook(name, func):
+    _legacy_hooks.setdefault(name, []).append(func)
+
+def _run_hook(name, *args):
+    for func in list(_legacy_hooks.get(name, [])):
+        func(*args)
+
+def _wrap(old, new, pos='after'):
+    """ Same as anki.hooks.wrap(). """
+    def repl(*args, **kwargs):
+        if pos == 'after':
+            old(*args, **kwargs)
+            return new(*args, **kwargs)
+        elif pos == 'before':
+            new(*args, **kwargs)
+            return old(*args, **kwargs)
+        else:
+            return new(_old=old, *args, **kwargs)
+    return repl
+
+class _Hook(list):
+    """ A hook in aqt.gui_hooks, which runs each function appended to it. """
+
+    def __call__(self, *args):
+        for func in list(self):
+            func(*args)
+
+class _GuiHooks(object):
+    """ aqt.gui_hooks, where each hook is created when it is first used. """
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        hook = _Hook()
+        setattr(self, name, hook)
+        return hook
+
+
+""" Modules """
+
+
+def _add_module(name, **attrs):
+    module = sys.modules.get(name)
+    if module is None:
+        module = types.ModuleType(name)
+        sys.modules[name] = module
+
+        parent, _, child = name.rpartition('.')
+        if parent:
+            setattr(sys.modules[parent], child, module)
+
+    for attr, value in attrs.items():
+        setattr(module, attr, value)
+    return module
+
+def provide(name, **attrs):
+    """ 
+    Adds fake objects to a stub module, creating the module if needed. This
+    is used by benchmarks that call into Anki.
+    """
+    return _add_module(name, **attrs)
+
+def _install_pyqt():
+    """ Makes aqt.qt export everything in PyQt6's core, GUI and widgets. """
+    from PyQt6 import QtCore, QtGui, QtWidgets
+
+    names = {}
+    for module in (QtCore, QtGui, QtWidgets):
+        names.update((name, getattr(module, name)) for name in dir(module) 
+            if not name.startswith('_'))
+    _add_module('aqt.qt', __all__=sorted(names), **names)
+
+def install(pyqt=False):
+    """ Installs the stub modules, unless the real ones are already loaded. """
+    if 'aqt' in sys.modules and not getattr(sys.modules['aqt'], 'is_stub',
+        False):
+        return
+
+    _add_module('anki', version='23.10')
+    _add_module('anki.collection', OpChangesWithCount=Stub)
+    _add_module('anki.hooks', addHook=_add_hook, runHook=_run_hook, 
+        wrap=_wrap)
+    _add_module('anki.utils', pointVersion=lambda: POINT_VERSION, 
+        ids2str=lambda ids: '(%s)' % ','.join(str(i) for i in ids))
+
+    _add_module('aqt', is_stub=True, mw=None, gui_hooks=_GuiHooks())
+    _add_module('aqt.operations', CollectionOp=Stub, QueryOp=Stub)
+    _add_module('aqt.operations.note', update_note=Stub)
+    if pyqt:
+        _install_pyqt()
+    else:
+        _add_module('aqt.qt', __all__=_find_qt_names(), 
+            __getattr__=lambda name: Stub)
+    _add_module('aqt.utils')
@@ -0,0 +1,170 @@
+"""
+Command line tools for symbol lists, which run without Anki. Run them from 
+the root of this repo, since the built add-on's __init__.py loads Anki:
+
+    python -m src lint LIST
+        Checks a list for format errors, duplicate keys, keys that contain
+        whitespace, and keys that can never be typed because a shorter
+        immediate key inside them is replaced first.
+
+    python -m src compile LIST OUTPUT [--format json|pack]
+        Writes the match list as JSON, as sent to replacer.js, or as a
+        symbol pack.
+
+    python -m src bench LIST CORPUS [--repeat N]
+        Times building the matcher for a list, and converting a text file
+        with it.
+
+LIST is a .csv, .csv.gz or .sympack file, in the same format as the options
+window's import and export.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from .list_io import read_symbol_csv
+from .matcher import SymbolMatcher
+from .symbol_manager import SymbolManager
+from .symbol_pack import (read_symbol_pack, write_symbol_pack,
+    PACK_EXTENSION, SymbolPackError)
+
+# Number of problems of each kind that lint prints:
+MAX_REPORTED = 20
+
+
+def read_list(fname):
+    """ Reads a symbol list in any format that the options window imports. """
+    if fname.endswith(PACK_EXTENSION):
+        return read_symbol_pack(fname)
+    return read_symbol_csv(fname)
+
+def find_shadowed_keys(symbols):
+    """
+    Finds keys that cannot be typed in full, because an immediate or HTML key
+    ends before their last character and is replaced as soon as it is typed.
+
+    @return: A list of (key, shadowing_key).
+    """
+    matcher = SymbolMatcher(SymbolManager.make_match_list(symbols))
+    shadowed = []
+    for key, _ in symbols:
+        matches = matcher.find_replacements(key[:-1], at_block_end=False)
+        if matches:
+            shadowed.append((key, matcher.entries[matches[0][2]][0]))
+    return shadowed
+
+def _print_problems(title, problems):
+    if not problems:
+        return
+    print('%s (%d):' % (title, len(problems)))
+    for problem in problems[:MAX_REPORTED]:
+        print('  %s' % problem)
+    if len(problems) > MAX_REPORTED:
+        print('  ...')
+
+
+""" Commands """
+
+def lint(args):
+    result = read_list(args.list)
+    _print_problems('Format errors', ['line %d: %s' % (line, text)
+        for line, text in result.format_errors])
+    _print_problems('Duplicate keys', sorted(result.duplicates))
+    if result.has_errors():
+        return 1
+
+    whitespace_keys = [repr(key) for key, _ in result.symbols
+        if not SymbolManager.check_if_key_valid(key)]
+    _print_problems('Keys containing whitespace', whitespace_keys)
+
+    shadowed = ['%s (by %s)' % pair
+        for pair in find_shadowed_keys(result.symbols)]
+    _print_problems('Shadowed keys', shadowed)
+
+    if whitespace_keys or shadowed:
+        return 1
+    print('%d symbols, no problems found.' % len(result.symbols))
+    return 0
+
+def compile_list(args):
+    result = read_list(args.list)
+    if result.has_errors():
+        print('%s has errors, run lint for details.' % args.list)
+        return 1
+
+    if args.format == 'pack':
+        write_symbol_pack(args.output, result.symbols)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as out_file:
+            json.dump(SymbolManager.make_match_list(result.symbols), out_file,
+                ensure_ascii=False)
+    print('Wrote %d symbols to %s' % (len(result.symbols), args.output))
+    return 0
+
+def bench(args):
+    result = read_list(args.list)
+    if result.has_errors():
+        print('%s has errors, run lint for details.' % args.list)
+        return 1
+    with open(args.corpus, 'r', encoding='utf-8') as corpus_file:
+        text = corpus_file.read()
+
+    match_list = SymbolManager.make_match_list(result.symbols)
+    build_times = []
+    convert_times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        matcher = SymbolMatcher(match_list)
+        build_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        matches = matcher.find_replacements(text)
+        convert_times.append(time.perf_counter() - start)
+
+    convert_time = min(convert_times)
+    print('Symbols:       %d' % len(match_list))
+    print('Corpus:        %d characters' % len(text))
+    print('Replacements:  %d' % len(matches))
+    print('Build:         %.2f ms' % (min(build_times) * 1000))
+    print('Convert:       %.2f ms (%.1f MB/s)' % (convert_time * 1000,
+        len(text) / max(convert_time, 1e-9) / 1e6))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src',
+        description='Command line tools for Insert Symbols lists.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    lint_parser = commands.add_parser('lint',
+        help='check a list for problems')
+    lint_parser.add_argument('list')
+    lint_parser.set_defaults(func=lint)
+
+    compile_parser = commands.add_parser('compile',
+        help='write the match list as JSON or a symbol pack')
+    compile_parser.add_argument('list')
+    compile_parser.add_argument('output')
+    compile_parser.add_argument('--format', choices=('json', 'pack'),
+        default='json')
+    compile_parser.set_defaults(func=compile_list)
+
+    bench_parser = commands.add_parser('bench',
+        help='time matching a list against a text file')
+    bench_parser.add_argument('list')
+    bench_parser.add_argument('corpus')
+    bench_parser.add_argument('--repeat', type=int, default=5)
+    bench_parser.set_defaults(func=bench)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (IOError, SymbolPackError) as e:
+        print('Error: %s' % e)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
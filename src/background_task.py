@@ -0,0 +1,68 @@
+"""
+This file contains BackgroundTask, which runs long operations such as importing
+or exporting symbol lists on a worker thread while a progress dialog is shown.
+"""
+
+from aqt.qt import *
+
+
+class BackgroundTask(QThread):
+    """
+    Runs FUNC(*args, progress_callback=..., is_cancelled=...) on a worker 
+    thread. FUNC must not touch the GUI. Progress and results are delivered 
+    back to the GUI thread through Qt signals.
+    """
+
+    progress_changed = pyqtSignal(int)
+    task_succeeded = pyqtSignal(object)
+    task_failed = pyqtSignal(str)
+
+    def __init__(self, parent, func, *args):
+        super(BackgroundTask, self).__init__(parent)
+        self._func = func
+        self._args = args
+        self._is_cancelled = False
+
+    def cancel(self):
+        self._is_cancelled = True
+
+    def is_cancelled(self):
+        return self._is_cancelled
+
+    def run(self):
+        try:
+            result = self._func(*self._args, 
+                progress_callback=self.progress_changed.emit, 
+                is_cancelled=self.is_cancelled)
+        except Exception as e:
+            self.task_failed.emit(str(e))
+        else:
+            self.task_succeeded.emit(result)
+
+
+def start_background_task(parent, label, on_success, on_failure, func, *args):
+    """
+    Creates a BackgroundTask along with a cancellable progress dialog, then 
+    starts the task. ON_SUCCESS is called with the return value of FUNC, and 
+    ON_FAILURE is called with an error string. The caller must keep a 
+    reference to the returned task until it is finished. The task and its 
+    dialog are then deleted, so the task must not be used after ON_SUCCESS or
+    ON_FAILURE has been called.
+    """
+    task = BackgroundTask(parent, func, *args)
+
+    dialog = QProgressDialog(label, "Cancel", 0, 100, parent)
+    dialog.setMinimumDuration(300)
+    dialog.setAutoClose(True)
+    dialog.setValue(0)
+
+    dialog.canceled.connect(task.cancel)
+    task.progress_changed.connect(dialog.setValue)
+    task.task_succeeded.connect(on_success)
+    task.task_failed.connect(on_failure)
+    task.finished.connect(dialog.reset)
+    task.finished.connect(dialog.deleteLater)
+    task.finished.connect(task.deleteLater)
+
+    task.start()
+    return task
@@ -6,10 +6,18 @@ replacer.js for the Browser search bar.
 
 from aqt.qt import *
 
+from .perf_stats import timed
+from .profiler import profiled
+
 class BrowserReplacer(object):
 
-    def __init__(self, match_list):
+    def __init__(self, match_list, on_key_used=None):
+        """
+        @param on_key_used: An optional function that is called with each key
+          that is replaced (see UsageStats).
+        """
         self._match_list = match_list
+        self._on_key_used = on_key_used
 
     def on_browser_init(self, browser):
         """ Set up hooks to the search box. """
@@ -34,12 +42,14 @@ class BrowserReplacer(object):
 
     """ Event Handling """
 
+    @profiled
     def on_return_pressed(self):
         search_box = self.get_search_box()
         if search_box:
             current_text = search_box.text()
             self._check_for_replacement(current_text, True)
 
+    @profiled
     def on_text_edited(self, current_text):
         self._check_for_replacement(current_text, False)
 
@@ -52,6 +62,7 @@ class BrowserReplacer(object):
             return False
         return string[i].isspace()
 
+    @timed('BrowserReplacer._check_for_replacement')
     def _check_for_replacement(self, text, is_enter_pressed):
         """ 
         Port of code in replacer.js. The major difference is that this function
@@ -72,6 +83,8 @@ class BrowserReplacer(object):
             is_whitespace_pressed, is_enter_pressed)
         if match:
             self._perform_replacement(text, match[0], match[1], match[2])
+            if self._on_key_used:
+                self._on_key_used(text[match[1] : match[2]])
 
     def _matches_keyword(self, text, cursor_pos, is_whitespace_pressed, 
         is_enter_pressed):
@@ -0,0 +1,240 @@
+"""
+This file contains functions that convert symbol keys in notes that already 
+exist, either for the notes selected in the Browser or for the notes matching a
+search. Notes are processed in chunks on a background thread, so memory use 
+does not depend on the size of the collection.
+
+Before any notes are changed, a dry run (see note_scanner.py) shows which keys
+would be replaced so that the user can confirm the conversion. Each conversion
+is recorded in a journal (see conversion_journal.py) so that the last 
+conversion can be reverted.
+
+These functions use collection operations, which require Anki 23.10 or later.
+"""
+
+import os
+
+import aqt
+from anki.collection import OpChangesWithCount
+from anki.utils import ids2str
+from aqt.operations import CollectionOp, QueryOp
+from aqt.qt import *
+
+from .conversion_journal import (JournalWriter, read_journal, 
+    make_field_edits, revert_fields)
+from .matcher import SymbolMatcher
+from .note_converter import find_field_edits, apply_edits, FIELD_SEPARATOR
+from .note_scanner import scan_chunks
+from .scan_report_window import ScanReportWindow
+
+# Number of notes that are read and written at a time:
+CHUNK_SIZE = 500
+
+
+def _update_progress(action, done, total):
+    label = "%s: %d of %d notes checked" % (action, done, total)
+    aqt.mw.taskman.run_on_main(
+        lambda: aqt.mw.progress.update(label=label, value=done, max=total))
+
+def _iter_note_rows(col, note_ids):
+    """ Yields chunks of (note_id, flds) rows read from the notes table. """
+    for start in range(0, len(note_ids), CHUNK_SIZE):
+        chunk = note_ids[start:start + CHUNK_SIZE]
+        yield col.db.all("select id, flds from notes where id in %s" 
+            % ids2str(chunk))
+
+def get_journal_path():
+    """ Each profile has its own journal in the add-on's user_files folder. """
+    return os.path.join(os.path.dirname(__file__), 'user_files', 
+        'conversion_%s.journal' % aqt.mw.pm.name)
+
+def convert_fields(flds, matcher):
+    """ 
+    Converts a note's fields, as stored in the notes table. Returns a tuple 
+    (new_fields, journal_edits), or None if nothing changed.
+    """
+    new_fields = []
+    journal_edits = []
+    for i, field_html in enumerate(flds.split(FIELD_SEPARATOR)):
+        edits = find_field_edits(field_html, matcher)
+        if edits:
+            journal_edits.extend(make_field_edits(i, field_html, edits))
+            field_html = apply_edits(field_html, edits)
+        new_fields.append(field_html)
+    return (new_fields, journal_edits) if journal_edits else None
+
+def convert_notes(col, note_ids, matcher, journal_path):
+    """
+    Converts the given notes one chunk at a time. Raw fields are read in bulk,
+    and only notes that change are loaded and written back. Runs on a 
+    background thread.
+
+    Changes are written to the journal before the notes are updated, so the
+    journal always covers every converted note. Unlike Anki's undo, the 
+    journal survives a restart and stores only the replaced text.
+
+    @return: An OpChangesWithCount with the number of notes changed.
+    """
+    count = 0
+    changes = None
+    journal = JournalWriter(journal_path)
+
+    try:
+        for i, rows in enumerate(_iter_note_rows(col, note_ids)):
+            if aqt.mw.progress.want_cancel():
+                break
+            _update_progress("Converting symbols", i * CHUNK_SIZE, 
+                len(note_ids))
+
+            notes = []
+            for nid, flds in rows:
+                converted = convert_fields(flds, matcher)
+                if converted is not None:
+                    journal.add_note(nid, converted[1])
+                    note = col.get_note(nid)
+                    note.fields = converted[0]
+                    notes.append(note)
+
+            if notes:
+                journal.flush()
+                changes = col.update_notes(notes)
+                count += len(notes)
+    finally:
+        journal.close()
+
+    return OpChangesWithCount(count=count, changes=changes)
+
+def _revert_chunk(col, records, stats):
+    """ Reverts a chunk of (note_id, edits) journal records. """
+    rows = col.db.all("select id, flds from notes where id in %s" 
+        % ids2str([nid for nid, _ in records]))
+    fields_by_id = dict(rows)
+
+    notes = []
+    for nid, edits in records:
+        flds = fields_by_id.get(nid)
+        fields = None
+        if flds is not None:
+            fields = revert_fields(flds.split(FIELD_SEPARATOR), edits)
+
+        if fields is None:
+            stats['skipped'] += 1
+        else:
+            note = col.get_note(nid)
+            note.fields = fields
+            notes.append(note)
+
+    if notes:
+        stats['changes'] = col.update_notes(notes)
+        stats['count'] += len(notes)
+
+def revert_notes(col, journal_path, stats):
+    """
+    Reverts the notes in a journal, one chunk at a time. Notes that were 
+    edited or deleted after the conversion are skipped. The journal is 
+    deleted afterwards. Runs on a background thread.
+    """
+    total = sum(1 for _ in read_journal(journal_path))
+    records = []
+    for record in read_journal(journal_path):
+        records.append(record)
+        if len(records) >= CHUNK_SIZE:
+            _revert_chunk(col, records, stats)
+            _update_progress("Reverting conversion", 
+                stats['count'] + stats['skipped'], total)
+            records = []
+    if records:
+        _revert_chunk(col, records, stats)
+
+    os.remove(journal_path)
+    return OpChangesWithCount(count=stats['count'], changes=stats['changes'])
+
+def _run_conversion(parent, match_list, note_ids):
+    """ Runs a conversion as a collection operation. """
+    matcher = SymbolMatcher(match_list)
+    journal_path = get_journal_path()
+    op = CollectionOp(parent, 
+        lambda col: convert_notes(col, note_ids, matcher, journal_path))
+    op.success(lambda out: aqt.utils.tooltip(
+        "Converted symbols in %d notes." % out.count, parent=parent))
+    op.run_in_background()
+
+def _scan_notes(col, match_list, get_note_ids):
+    """ Performs a dry run on a background thread. """
+    note_ids = get_note_ids(col)
+    return scan_chunks(match_list, _iter_note_rows(col, note_ids),
+        on_progress=lambda done: _update_progress("Scanning notes", done, 
+            len(note_ids)), 
+        should_cancel=aqt.mw.progress.want_cancel)
+
+def _on_scan_finished(parent, match_list, scan_result):
+    """ A cancelled scan is not offered for conversion, since it is partial. """
+    if scan_result.is_cancelled:
+        aqt.utils.tooltip("Scan cancelled. No notes were changed.", 
+            parent=parent)
+        return
+    if not scan_result.notes_affected:
+        aqt.utils.showInfo("No symbol keys were found in %d notes." 
+            % scan_result.notes_scanned, parent=parent)
+        return
+
+    values = dict((item['key'], item['val']) for item in match_list)
+    report_window = ScanReportWindow(parent, scan_result, values)
+    if report_window.exec():
+        _run_conversion(parent, match_list, scan_result.affected_ids)
+
+def _preview_conversion(parent, match_list, get_note_ids):
+    """ 
+    Performs a dry run and shows its results, then converts the affected 
+    notes if the user confirms. GET_NOTE_IDS is called on the background 
+    thread with the collection.
+    """
+    if not match_list:
+        aqt.utils.showInfo("The symbol list is empty.", parent=parent)
+        return
+
+    op = QueryOp(parent=parent, 
+        op=lambda col: _scan_notes(col, match_list, get_note_ids),
+        success=lambda result: _on_scan_finished(parent, match_list, result))
+    op.with_progress("Scanning notes...").run_in_background()
+
+
+""" Menu Actions """
+
+def convert_selected_notes(browser, match_list):
+    """ Converts symbols in the notes selected in the Browser. """
+    note_ids = browser.selected_notes()
+    if not note_ids:
+        aqt.utils.showInfo("No notes are selected.", parent=browser)
+        return
+
+    _preview_conversion(browser, match_list, lambda col: list(note_ids))
+
+def convert_notes_from_search(parent, match_list):
+    """ Asks for a search query, then converts symbols in matching notes. """
+    query, ok = QInputDialog.getText(parent, "Convert Symbols in Notes", 
+        "Convert symbol keys in notes matching this search:\n"
+        "(Leave empty to convert every note in the collection.)")
+    if not ok:
+        return
+    _preview_conversion(parent, match_list, 
+        lambda col: list(col.find_notes(query)))
+
+def revert_last_conversion(parent):
+    """ Reverts the notes changed by the last conversion in this profile. """
+    journal_path = get_journal_path()
+    if not os.path.exists(journal_path):
+        aqt.utils.showInfo("There is no conversion to revert.", parent=parent)
+        return
+
+    if not aqt.utils.askUser("Revert the last symbol conversion? Notes that "
+        "have been edited since then will be skipped.", parent=parent):
+        return
+
+    stats = {'count': 0, 'skipped': 0, 'changes': None}
+    op = CollectionOp(parent, 
+        lambda col: revert_notes(col, journal_path, stats))
+    op.success(lambda out: aqt.utils.tooltip(
+        "Reverted %d notes (%d skipped)." % (stats['count'], 
+        stats['skipped']), parent=parent))
+    op.run_in_background()
@@ -0,0 +1,78 @@
+"""
+This file contains bulk edit operations on symbol lists. Each operation makes
+a single pass over the list and returns a new list instead of modifying the 
+list in place, so that the caller can apply the result in one update.
+"""
+
+import re
+
+from .symbol_manager import SymbolManager
+
+
+class BulkEditError(Exception):
+    pass
+
+
+def delete_rows(symbols, rows):
+    """ Returns a copy of SYMBOLS without the entries at the given indices. """
+    rows = set(rows)
+    return [x for i, x in enumerate(symbols) if i not in rows]
+
+def _make_replacer(find, replace, use_regex):
+    if not find:
+        raise BulkEditError("The text to find cannot be empty.")
+    if not use_regex:
+        return lambda text: text.replace(find, replace)
+
+    try:
+        pattern = re.compile(find)
+    except re.error as e:
+        raise BulkEditError("Invalid regular expression: %s" % e)
+
+    # The replacement template is parsed before any text is searched, so a
+    # trial run checks its group references once for the whole list. An 
+    # unknown group name raises IndexError rather than re.error:
+    try:
+        pattern.sub(replace, '')
+    except (re.error, IndexError) as e:
+        raise BulkEditError("Invalid replacement: %s" % e)
+    return lambda text: pattern.sub(replace, text)
+
+def replace_text(symbols, rows, find, replace, in_keys=False, 
+    use_regex=False):
+    """
+    Replaces FIND with REPLACE in either the keys or the values of SYMBOLS.
+    If keys are changed, the output is sorted again.
+
+    @param rows: Indices of the entries to edit, or None to edit all entries.
+    @return: A tuple (new_list, change_count).
+    @raise BulkEditError: If FIND is invalid or the result would contain 
+      invalid or duplicate keys.
+    """
+    replacer = _make_replacer(find, replace, use_regex)
+    rows = None if rows is None else set(rows)
+
+    output = []
+    change_count = 0
+    for i, (k, v) in enumerate(symbols):
+        if rows is None or i in rows:
+            if in_keys:
+                new_k, new_v = replacer(k), v
+            else:
+                new_k, new_v = k, replacer(v)
+
+            if (new_k, new_v) != (k, v):
+                change_count += 1
+                k, v = new_k, new_v
+                if not k or not v or not SymbolManager.check_if_key_valid(k):
+                    raise BulkEditError("Replacing would create an invalid "
+                        "entry: '%s' '%s'" % (k, v))
+        output.append((k, v))
+
+    if in_keys and change_count:
+        duplicates = SymbolManager.check_for_duplicates(output)
+        if duplicates:
+            raise BulkEditError("Replacing would create duplicate keys: %s" 
+                % ', '.join(sorted(duplicates)))
+        output.sort(key=lambda x: x[0])
+    return (output, change_count)
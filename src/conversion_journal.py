@@ -0,0 +1,155 @@
+"""
+This file contains the journal used to revert note conversions. Instead of 
+copies of each field, the journal stores only the ranges that were replaced 
+along with their original text, so its size is proportional to the amount of 
+text replaced.
+
+A journal is an append-only binary file that starts with MAGIC and VERSION, 
+followed by one record per converted note:
+
+    note_id (int64), edit_count (varint), edit_count edits
+
+Each edit is:
+
+    field_index (varint), start (varint), old_text, new_text
+
+where START is the character offset of NEW_TEXT in the converted field, and 
+each text is stored as a varint byte length followed by UTF-8 bytes.
+"""
+
+import io
+import os
+import struct
+
+MAGIC = b'ISYJ'
+VERSION = 1
+
+_NOTE_ID = struct.Struct('<q')
+
+
+class JournalError(Exception):
+    pass
+
+
+""" Encoding """
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _write_text(out, text):
+    data = text.encode('utf8')
+    _write_varint(out, len(data))
+    out.extend(data)
+
+def _read_varint(file):
+    value = 0
+    shift = 0
+    while True:
+        byte = file.read(1)
+        if not byte:
+            raise JournalError("Unexpected end of journal.")
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+def _read_text(file):
+    size = _read_varint(file)
+    data = file.read(size)
+    if len(data) != size:
+        raise JournalError("Unexpected end of journal.")
+    return data.decode('utf8')
+
+
+""" Creating Edits """
+
+def make_field_edits(field_idx, field_html, edits):
+    """
+    Converts edits from note_converter.find_field_edits(), which are relative
+    to the original field, into journal edits, which are relative to the 
+    converted field.
+
+    @return: A list of (field_idx, start, old_text, new_text).
+    """
+    output = []
+    delta = 0
+    for start, end, new in edits:
+        output.append((field_idx, start + delta, field_html[start:end], new))
+        delta += len(new) - (end - start)
+    return output
+
+def revert_fields(fields, edits):
+    """
+    Reverts journal edits on a note's fields. Returns the reverted fields, or
+    None if the note has been changed since it was converted.
+    """
+    fields = list(fields)
+    for field_idx, start, old, new in reversed(edits):
+        if field_idx >= len(fields):
+            return None
+        field = fields[field_idx]
+        if field[start:start + len(new)] != new:
+            return None
+        fields[field_idx] = field[:start] + old + field[start + len(new):]
+    return fields
+
+
+""" Reading & Writing """
+
+class JournalWriter(object):
+    """ Appends note records to a new journal, replacing any old journal. """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._file = io.open(path, 'wb')
+        self._file.write(MAGIC + bytes(bytearray([VERSION])))
+
+    def add_note(self, note_id, edits):
+        out = bytearray(_NOTE_ID.pack(note_id))
+        _write_varint(out, len(edits))
+        for field_idx, start, old, new in edits:
+            _write_varint(out, field_idx)
+            _write_varint(out, start)
+            _write_text(out, old)
+            _write_text(out, new)
+        self._file.write(out)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_journal(path):
+    """ 
+    Yields (note_id, edits) for each note in a journal, one record at a time.
+    A record that was only partly written (eg. if Anki closed during a 
+    conversion) ends the journal.
+    """
+    with io.open(path, 'rb') as file:
+        if file.read(len(MAGIC) + 1) != MAGIC + bytes(bytearray([VERSION])):
+            raise JournalError("%s is not a conversion journal." % path)
+
+        while True:
+            header = file.read(_NOTE_ID.size)
+            if len(header) < _NOTE_ID.size:
+                return
+            (note_id,) = _NOTE_ID.unpack(header)
+
+            try:
+                edits = []
+                for i in range(_read_varint(file)):
+                    field_idx = _read_varint(file)
+                    start = _read_varint(file)
+                    old = _read_text(file)
+                    new = _read_text(file)
+                    edits.append((field_idx, start, old, new))
+            except (JournalError, UnicodeDecodeError):
+                return
+            yield (note_id, edits)
@@ -202,3 +202,13 @@ _SYMBOL_DICT = OrderedDict([
 ])
 
 DEFAULT_MATCHES = list(itertools.chain.from_iterable(_SYMBOL_DICT.values()))
+
+""" Categories """
+
+CUSTOM_CATEGORY = "Custom"
+
+# Maps each default key to the title of its section in _SYMBOL_DICT:
+DEFAULT_CATEGORIES = dict((key, title) 
+    for title, symbol_list in _SYMBOL_DICT.items() for key, _ in symbol_list)
+
+CATEGORY_TITLES = list(_SYMBOL_DICT.keys()) + [CUSTOM_CATEGORY]
@@ -0,0 +1,59 @@
+""" 
+This file contains FindReplaceWindow, a dialog that asks for the options of a 
+bulk find & replace over the working list.
+"""
+
+from aqt.qt import *
+
+
+class FindReplaceWindow(QDialog):
+    """
+    Lets the user choose the text to find and replace, whether keys or 
+    values are edited, whether FIND is a regular expression, and whether 
+    only the selected rows are edited.
+    """
+
+    TARGET_VALUES = "Values"
+    TARGET_KEYS = "Keys"
+
+    def __init__(self, parent_widget, has_selection):
+        super(FindReplaceWindow, self).__init__(parent_widget)
+        self.setWindowTitle("Find and Replace")
+        layout = QFormLayout(self)
+
+        self.findLineEdit = QLineEdit(self)
+        self.replaceLineEdit = QLineEdit(self)
+        self.targetComboBox = QComboBox(self)
+        self.targetComboBox.addItems([self.TARGET_VALUES, self.TARGET_KEYS])
+        self.regexCheckBox = QCheckBox("Use regular expressions", self)
+        self.selectionCheckBox = QCheckBox("Selected rows only", self)
+        self.selectionCheckBox.setEnabled(has_selection)
+        self.selectionCheckBox.setChecked(has_selection)
+
+        layout.addRow("Find:", self.findLineEdit)
+        layout.addRow("Replace with:", self.replaceLineEdit)
+        layout.addRow("In:", self.targetComboBox)
+        layout.addRow(self.regexCheckBox)
+        layout.addRow(self.selectionCheckBox)
+
+        button_box = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | 
+            QDialogButtonBox.StandardButton.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addRow(button_box)
+
+    def get_find_text(self):
+        return self.findLineEdit.text()
+
+    def get_replace_text(self):
+        return self.replaceLineEdit.text()
+
+    def is_key_target(self):
+        return self.targetComboBox.currentText() == self.TARGET_KEYS
+
+    def is_regex(self):
+        return self.regexCheckBox.isChecked()
+
+    def is_selection_only(self):
+        return self.selectionCheckBox.isChecked()
@@ -5,7 +5,8 @@ Parses Anki's version. Uncommment and run this directly to evaluate test cases.
 import re
 import pkgutil
 
-import anki
+# anki is imported by the functions that need it, so that the rest of the 
+# add-on can be used from the command line (see __main__.py) without Anki.
 
 """ Constants """
 
@@ -25,6 +26,7 @@ def _parse_anki_version_new():
     pointVersion() is added in Anki 2.1.20 so if this gets called, by default 
     Anki is 2.1.20 or higher.
     """
+    import anki.utils
     point_version = anki.utils.pointVersion()
     if point_version < 41:
         return ANKI_VER_PRE_2_1_41
@@ -37,6 +39,7 @@ def _parse_anki_version_old():
     """
     This will only get called if Anki is between 2.0 and 2.1.19
     """
+    import anki
     try:
         version = anki.version
         v = tuple(map(int, re.match("(\d+)\.(\d+)\.(\d+)", version).groups()))
@@ -51,6 +54,7 @@ def _parse_anki_version_old():
         return ANKI_VER_PRE_2_1_41
 
 def get_anki_version():
+    import anki.utils
     has_point_version = getattr(anki.utils, 'pointVersion', None)
     if has_point_version:
         return _parse_anki_version_new()
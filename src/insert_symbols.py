@@ -4,6 +4,7 @@ up the plugin, open the symbol list editor, and broadcast symbol list updates
 to editor windows that are open. 
 """
 
+import json
 import os
 import sys
 
@@ -15,8 +16,13 @@ from aqt.browser import Browser
 
 from .browser_replacer import BrowserReplacer
 from .get_version import *
+from .matcher import SymbolMatcher
+from .note_converter import convert_field
+from .perf_stats import perf_stats, timed
+from .profiler import profiler, profiled
 from .symbol_manager import SymbolManager
 from .symbol_window import SymbolWindow
+from .usage_stats import UsageStats
 
 """ 
 Anki Version-specific Code 
@@ -34,6 +40,10 @@ else:
 # Load new hooks if supported
 if ANKI_VER > ANKI_VER_PRE_23_10:
     from aqt import gui_hooks
+    from aqt.operations.note import update_note
+    from . import bulk_converter
+    from .perf_stats_window import PerfStatsWindow
+    perf_stats.metadata['anki_version'] = getattr(aqt, 'appVersion', None)
 
 # Webview requires different JS between Anki 2.1.40 and Anki 2.1.41
 if ANKI_VER <= ANKI_VER_PRE_2_1_41:
@@ -42,6 +52,20 @@ else:
     JS_FILE = "replacer.js"
 
 
+# Evaluated by _load_JS() to check whether a page has the script. If it does,
+# the script is told that a note was loaded, so that it can hide an open
+# autocomplete popup, without a second call into the page:
+CHECK_JS = ("typeof insert_symbols == 'undefined' ? 'undefined' "
+    ": (insert_symbols.onNoteLoaded(), typeof insert_symbols)")
+
+# Usage counts are saved this many milliseconds after the first unsaved count:
+USAGE_FLUSH_DELAY = 60 * 1000
+
+# Editor shortcuts for converting every key in the current field or note:
+REPLACE_FIELD_SHORTCUT = "Ctrl+Shift+Y"
+REPLACE_NOTE_SHORTCUT = "Ctrl+Alt+Shift+Y"
+
+
 """ 
 Variable declarations
 """
@@ -49,44 +73,81 @@ Variable declarations
 ins_sym_manager = None
 ins_sym_window = None
 ins_sym_replacer = None
+ins_sym_usage = None
 
 ins_sym_webview_owners = {
     'editors': [],
     'reviewer': None
 }
 
+# Contents of JS_FILE, which is read the first time it is needed:
+ins_sym_js = None
+
 
 """
 Javascript Loading & Updating
 """
 
-def _update_JS(webview: EditorWebView):
+@timed('_update_JS')
+def _update_JS(webview: EditorWebView, json):
     """ Updates the symbol list in the Javascript file. """
-    json = ins_sym_manager.get_JSON()
     webview.eval("insert_symbols.setMatchList(%s)" % json)
 
+def _get_JS():
+    """ The Javascript file is only read once since it never changes. """
+    global ins_sym_js
+    if ins_sym_js is None:
+        js_path = os.path.join(ADDON_PATH, JS_FILE)
+        with open(js_path, 'r') as js_file:
+            ins_sym_js = js_file.read()
+    return ins_sym_js
+
+def _inject_JS(webview: EditorWebView):
+    """ Evaluates the Javascript file and sets its symbol list in one call. """
+    json = ins_sym_manager.get_JSON()
+    js = "%s\ninsert_symbols.setMatchList(%s)" % (_get_JS(), json)
+    if perf_stats.enabled:
+        js += "\ninsert_symbols.setTracing(true)"
+    if ins_sym_usage:
+        js += "\ninsert_symbols.setUsageCounting(true)"
+    webview.eval(js)
+
+@timed('_load_JS')
 def _load_JS(webview: EditorWebView):
     """ 
     Loads replacer.js, the Javascript file which performs symbol replacement, 
     into the given WebView.
+
+    Newer versions of Anki keep the editor's page between notes, so the script
+    is only injected if the page does not have it yet. A page that has it is
+    already up to date, since update_symbols() sends every list change to each
+    WebView, and the same call that checks for it hides its autocomplete popup
+    (see CHECK_JS). Anki 2.0 cannot return values from Javascript, so the 
+    script is always injected.
     """
-    js_path = os.path.join(ADDON_PATH, JS_FILE)
-    with open(js_path, 'r') as js_file:
-        js = js_file.read()
-        webview.eval(js)
-        _update_JS(webview)
+    if ANKI_VER == ANKI_VER_PRE_2_1_0:
+        _inject_JS(webview)
+        return
+
+    def on_checked(result):
+        if result == 'undefined':
+            _inject_JS(webview)
+    webview.evalWithCallback(CHECK_JS, on_checked)
 
+@timed('update_symbols')
 def update_symbols():
     """
     This function is called by SymbolManager whenever the symbol list is 
-    updated. It updates the symbolList for every editor that is open.
+    updated. It updates the symbolList for every editor that is open. The list
+    is only converted to JSON once, since every WebView gets the same list.
     """
+    json = ins_sym_manager.get_JSON()
 
     for editor in ins_sym_webview_owners['editors']:
-        _update_JS(editor.web)
+        _update_JS(editor.web, json)
 
     if ins_sym_webview_owners['reviewer']:
-        _update_JS(ins_sym_webview_owners['reviewer'].web)
+        _update_JS(ins_sym_webview_owners['reviewer'].web, json)
 
     ins_sym_replacer.update_list(ins_sym_manager.get_match_list())
 
@@ -99,12 +160,14 @@ These actions occur when an instance of the card editor defined in Anki's
 aqt/editor.py (ie. Add Card window, Card Browser, or Reviewer) is opened.
 """
 
+@profiled
 def on_editor_load_note(editor: Editor, focusTo=None):
     """ 
     Anki calls Editor.loadNote() to refresh the editor's WebView, which occurs 
     after setNote(), onHtmlEdit(), and bridge() / onBridgeCmd() in Editor is 
-    called. Editor.loadNote() resets Javascript code, so we must re-add our JS
-    after every loadNote(). 
+    called. In Anki 2.1 the page, and with it our script, persists between 
+    loadNote() calls, so _load_JS() only re-injects the script when the page
+    has actually been reset (eg. when the editor is first opened).
 
     FYI: In Anki 2.1, the focusTo=None argument is new.
     """
@@ -120,11 +183,14 @@ def on_editor_cleanup(editor: Editor):
     """
     if editor in ins_sym_webview_owners['editors']:
         ins_sym_webview_owners['editors'].remove(editor)
+        if ins_sym_usage:
+            _flush_JS_usage(editor.web)
 
 def on_browser_init(browser: Browser, main_window = None, card = None, 
     search = None):
     ins_sym_replacer.on_browser_init(browser)
 
+@profiled
 def on_reviewer_initweb(reviewer: Reviewer):
     """
     Anki calls Reviewer._initWeb() to update the WebView, which occurs when the
@@ -134,26 +200,167 @@ def on_reviewer_initweb(reviewer: Reviewer):
     _load_JS(reviewer.web)
     # aqt.utils.showInfo("on_reviewer_start() called")
 
-def on_reviewer_show_qa(card=None):
+def on_reviewer_cleanup():
+    """ This event is triggered when the Reviewer is about to be closed. """
+    if ins_sym_usage and ins_sym_webview_owners['reviewer']:
+        _flush_JS_usage(ins_sym_webview_owners['reviewer'].web)
+    ins_sym_webview_owners['reviewer'] = None
+    # aqt.utils.showInfo("on_reviewer_end() called")
+
+
+"""
+Latency Tracing
+
+While performance stats are recorded, replacer.js times each check for a key
+and sends its samples through pycmd() about once per second.
+"""
+
+TRACE_PREFIX = "insert_symbols:trace:"
+
+def on_perf_stats_toggled(enabled):
+    """ Turns tracing on or off in every WebView that has replacer.js. """
+    js = "insert_symbols.setTracing(%s)" % ("true" if enabled else "false")
+    for editor in ins_sym_webview_owners['editors']:
+        editor.web.eval(js)
+
+    if ins_sym_webview_owners['reviewer']:
+        ins_sym_webview_owners['reviewer'].web.eval(js)
+
+def on_js_message(handled, message, context):
+    if message.startswith(TRACE_PREFIX):
+        perf_stats.record_js_batch(type(context).__name__, 
+            message[len(TRACE_PREFIX):])
+    elif message.startswith(USAGE_PREFIX):
+        if ins_sym_usage:
+            _count_usage(json.loads(message[len(USAGE_PREFIX):]))
+    else:
+        return handled
+    return (True, None)
+
+
+"""
+Usage Counting
+
+replacer.js and BrowserReplacer report each key they replace. Counts are kept
+in memory by UsageStats, which is flushed to the database in one batch 
+USAGE_FLUSH_DELAY ms after the first unsaved count, and when the profile is 
+closed.
+"""
+
+USAGE_PREFIX = "insert_symbols:usage:"
+
+def _flush_JS_usage(webview):
+    """ Asks a page to send the counts it has not sent yet. """
+    webview.eval("if (typeof insert_symbols !== 'undefined') "
+        "insert_symbols.flushUsage()")
+
+def _count_usage(counts):
+    if ins_sym_usage.add_counts(counts):
+        aqt.mw.progress.single_shot(USAGE_FLUSH_DELAY, flush_usage_stats)
+
+def on_browser_key_used(key):
+    _count_usage({key: 1})
+
+def flush_usage_stats():
+    if ins_sym_usage:
+        ins_sym_usage.flush()
+
+def on_profile_will_close():
+    flush_usage_stats()
+
+
+"""
+Editor Commands
+
+These commands convert every key in the note that is open in an editor.
+"""
+
+def on_editor_did_init_buttons(buttons, editor: Editor):
+    buttons.append(editor.addButton(None, "insert_symbols_replace_all", 
+        on_replace_all_in_field, label="\u03a3", keys=REPLACE_FIELD_SHORTCUT,
+        tip="Replace Symbols in Field (%s)\nReplace Symbols in Note (%s)" 
+        % (REPLACE_FIELD_SHORTCUT, REPLACE_NOTE_SHORTCUT)))
+
+def on_editor_did_init_shortcuts(shortcuts, editor: Editor):
+    shortcuts.append((REPLACE_NOTE_SHORTCUT, 
+        lambda: on_replace_all_in_note(editor)))
+
+def on_replace_all_in_field(editor: Editor):
+    """ 
+    The focused field is converted in the WebView so that the change is a 
+    single step in the field's own undo history. If no field has focus, the
+    whole note is converted instead.
     """
-    This event is triggered when the Reviewer shows either a question or an
-    answer. Since the Editable Fields plugin makes the fields editable when
-    each card is created, key listeners need to be set up after each time.
+    if editor.currentField is None:
+        on_replace_all_in_note(editor)
+    else:
+        editor.web.eval("insert_symbols.replaceAllInField()")
+
+def on_replace_all_in_note(editor: Editor):
+    editor.call_after_note_saved(lambda: _replace_all_in_note(editor))
 
-    Added null checks to prevent AttributeError when reviewer is not properly initialized.
+def _replace_all_in_note(editor: Editor):
+    """ 
+    Converts every field of the note. A note that has already been added is
+    saved as a single undoable operation (Edit > Undo).
     """
-    reviewer = ins_sym_webview_owners.get('reviewer')
-    if reviewer is None:
+    note = editor.note
+    if note is None:
         return
 
-    webview = getattr(reviewer, 'web', None)
-    if webview:
-        webview.eval("insert_symbols.setupReviewerKeyEvents()")
+    matcher = SymbolMatcher(ins_sym_manager.get_match_list())
+    fields = [convert_field(field, matcher) for field in note.fields]
+    if fields == note.fields:
+        aqt.utils.tooltip("No symbols to replace.", parent=editor.widget)
+        return
 
-def on_reviewer_cleanup():
-    """ This event is triggered when the Reviewer is about to be closed. """
-    ins_sym_webview_owners['reviewer'] = None
-    # aqt.utils.showInfo("on_reviewer_end() called")
+    note.fields = fields
+    if note.id:
+        update_note(parent=editor.widget, note=note).run_in_background()
+    else:
+        editor.loadNote()
+
+
+""" 
+Note Conversion Actions
+
+These actions convert symbol keys in notes that already exist.
+"""
+
+def on_browser_menus_did_init(browser: Browser):
+    action = aqt.qt.QAction("Convert Symbols in Selected Notes...", browser)
+    action.triggered.connect(lambda: bulk_converter.convert_selected_notes(
+        browser, ins_sym_manager.get_match_list()))
+    browser.form.menu_Notes.addAction(action)
+
+def on_convert_symbols_in_notes():
+    bulk_converter.convert_notes_from_search(aqt.mw, 
+        ins_sym_manager.get_match_list())
+
+def on_revert_last_conversion():
+    bulk_converter.revert_last_conversion(aqt.mw)
+
+def on_open_perf_stats():
+    PerfStatsWindow(aqt.mw).exec()
+
+def on_toggle_profiler(checked):
+    """ 
+    Profiles the add-on's hook entry points until unchecked, then saves the
+    results to the add-on's user_files folder.
+    """
+    if checked:
+        profiler.start()
+        aqt.utils.tooltip("Profiling Insert Symbols. Uncheck \"Profile "
+            "Add-on\" to save the results.")
+        return
+
+    out_dir = os.path.join(ADDON_PATH, 'user_files')
+    pstats_path, collapsed_path, call_count = profiler.stop(out_dir)
+    if call_count == 0:
+        aqt.utils.showInfo("No add-on code ran while profiling.")
+    else:
+        aqt.utils.showInfo("Profiled %d calls. The results were saved to:"
+            "\n\n%s\n%s" % (call_count, pstats_path, collapsed_path))
 
 
 """ 
@@ -164,13 +371,19 @@ its own symbol list.
 """
 
 def _setup_modules():
-    global ins_sym_manager, ins_sym_window, ins_sym_replacer
+    global ins_sym_manager, ins_sym_window, ins_sym_replacer, ins_sym_usage
+
+    # Usage counts rely on messages from replacer.js, which use new hooks:
+    if ANKI_VER > ANKI_VER_PRE_23_10:
+        ins_sym_usage = UsageStats(aqt.mw)
+        ins_sym_usage.on_profile_loaded()
 
-    ins_sym_manager = SymbolManager(aqt.mw, update_symbols)
+    ins_sym_manager = SymbolManager(aqt.mw, update_symbols, ins_sym_usage)
     ins_sym_manager.on_profile_loaded()
 
-    ins_sym_window = SymbolWindow(aqt.mw, ins_sym_manager)
-    ins_sym_replacer = BrowserReplacer(ins_sym_manager.get_match_list()) 
+    ins_sym_window = SymbolWindow(aqt.mw, ins_sym_manager, ins_sym_usage)
+    ins_sym_replacer = BrowserReplacer(ins_sym_manager.get_match_list(), 
+        on_browser_key_used if ins_sym_usage else None)
 
 def _setup_hooks():
     """
@@ -186,10 +399,15 @@ def _setup_hooks():
     Browser.__init__ = wrap(Browser.__init__, on_browser_init, 'after')
 
     Reviewer._initWeb = wrap(Reviewer._initWeb, on_reviewer_initweb, 'after')
-    gui_hooks.reviewer_did_show_question.append(on_reviewer_show_qa)
-    gui_hooks.reviewer_did_show_answer.append(on_reviewer_show_qa)
     gui_hooks.reviewer_will_end.append(on_reviewer_cleanup)
 
+    gui_hooks.browser_menus_did_init.append(on_browser_menus_did_init)
+    gui_hooks.editor_did_init_buttons.append(on_editor_did_init_buttons)
+    gui_hooks.editor_did_init_shortcuts.append(on_editor_did_init_shortcuts)
+    gui_hooks.webview_did_receive_js_message.append(on_js_message)
+    gui_hooks.profile_will_close.append(on_profile_will_close)
+    perf_stats.add_enabled_callback(on_perf_stats_toggled)
+
 def _setup_hooks_legacy():
     Editor.loadNote = wrap(Editor.loadNote, on_editor_load_note, 'after')
     Editor.cleanup = wrap(Editor.cleanup, on_editor_cleanup, 'before')
@@ -197,26 +415,41 @@ def _setup_hooks_legacy():
     Browser.__init__ = wrap(Browser.__init__, on_browser_init, 'after')
 
     Reviewer._initWeb = wrap(Reviewer._initWeb, on_reviewer_initweb, 'after')
-    addHook("showQuestion", on_reviewer_show_qa)
-    addHook("showAnswer", on_reviewer_show_qa)
     addHook("reviewCleanup", on_reviewer_cleanup)
 
-# Perform setup when a new profile is loaded
+# Hooks are set up once, while modules are set up again whenever a profile is
+# loaded. Setting up hooks on every profile load would wrap the same methods
+# again, which runs each handler once for every profile opened.
 
 def on_profile_loaded():
     _setup_modules()
-    _setup_hooks()
-
-def on_profile_loaded_legacy():
-    _setup_modules()
-    _setup_hooks_legacy()
 
 if ANKI_VER <= ANKI_VER_PRE_23_10:
-    addHook("profileLoaded", on_profile_loaded_legacy)
+    _setup_hooks_legacy()
+    addHook("profileLoaded", on_profile_loaded)
 else:
+    _setup_hooks()
     gui_hooks.profile_did_open.append(on_profile_loaded)
 
 # Add menu button
 open_action = aqt.qt.QAction("Insert Symbol Options...", aqt.mw, 
     triggered=lambda: ins_sym_window.open())
 aqt.mw.form.menuTools.addAction(open_action)
+
+# Add submenu for actions on notes, which require Anki 23.10 or later
+if ANKI_VER > ANKI_VER_PRE_23_10:
+    ins_sym_tools_menu = aqt.qt.QMenu("Insert Symbols", aqt.mw)
+    convert_action = aqt.qt.QAction("Convert Symbols in Notes...", aqt.mw, 
+        triggered=on_convert_symbols_in_notes)
+    ins_sym_tools_menu.addAction(convert_action)
+    revert_action = aqt.qt.QAction("Revert Last Conversion...", aqt.mw, 
+        triggered=on_revert_last_conversion)
+    ins_sym_tools_menu.addAction(revert_action)
+    ins_sym_tools_menu.addSeparator()
+    perf_stats_action = aqt.qt.QAction("Performance Stats...", aqt.mw, 
+        triggered=on_open_perf_stats)
+    ins_sym_tools_menu.addAction(perf_stats_action)
+    profiler_action = aqt.qt.QAction("Profile Add-on", aqt.mw, 
+        checkable=True, toggled=on_toggle_profiler)
+    ins_sym_tools_menu.addAction(profiler_action)
+    aqt.mw.form.menuTools.addMenu(ins_sym_tools_menu)
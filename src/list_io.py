@@ -0,0 +1,217 @@
+"""
+This file contains functions for reading and writing symbol lists on disk, and
+for merging them into existing lists. They do not touch the GUI, so they can be
+run from a worker thread (see background_task.py) without freezing Anki while
+large files are being processed.
+
+Each long-running function takes in a progress callback and a cancellation 
+check so that the caller can display progress and abort the operation.
+"""
+
+import csv
+import gzip
+import heapq
+import io
+import os
+
+from .symbol_manager import SymbolManager
+
+from .default_symbols import DEFAULT_CATEGORIES, CUSTOM_CATEGORY
+
+# Number of rows that are processed between progress updates:
+CHUNK_SIZE = 2000
+
+GZIP_EXTENSION = '.gz'
+
+
+class ImportResult(object):
+    """
+    Holds the output of read_symbol_csv(). Errors use the same format as 
+    SymbolManager.check_format() and SymbolManager.check_for_duplicates() so 
+    that line numbers in error messages match the lines in the file.
+    """
+
+    def __init__(self):
+        self.symbols = []
+        self.format_errors = []
+        self.duplicates = set()
+        self.is_cancelled = False
+
+    def has_errors(self):
+        return bool(self.format_errors or self.duplicates)
+
+
+def _iter_decoded_lines(file):
+    """ Decodes a binary file line-by-line. """
+    for line in file:
+        yield line.decode('utf8')
+
+def _open_binary(raw_file, fname):
+    """ Files ending in GZIP_EXTENSION are decompressed transparently. """
+    if fname.endswith(GZIP_EXTENSION):
+        return gzip.GzipFile(fileobj=raw_file)
+    return raw_file
+
+def _validate_chunk(chunk, first_line, result, seen_keys):
+    """ 
+    Validates a chunk of rows and adds any errors to the import result. Empty
+    lines are kept in the chunk so that line numbers are accurate.
+    """
+    errors = SymbolManager.check_format(chunk, ignore_empty=True)
+    if errors:
+        result.format_errors.extend(
+            (i + first_line - 1, err_str) for i, err_str in errors)
+
+    duplicates = SymbolManager.check_for_duplicates(chunk, seen_keys)
+    if duplicates:
+        result.duplicates.update(duplicates)
+
+    result.symbols.extend((row[0], row[1]) for row in chunk if len(row) == 2)
+
+def read_symbol_csv(fname, progress_callback=None, is_cancelled=None):
+    """
+    Parses and validates a CSV file (which may be gzip-compressed) of 
+    key-value pairs in chunks of CHUNK_SIZE rows. Empty lines are skipped, and
+    the resulting symbol list is sorted in alphabetical order by key.
+
+    @param progress_callback: Called with a percentage from 0 to 100.
+    @param is_cancelled: Returns True if the import should be aborted.
+    @return: An ImportResult.
+    """
+    result = ImportResult()
+    seen_keys = set()
+    total_bytes = max(os.path.getsize(fname), 1)
+
+    with io.open(fname, 'rb') as raw_file:
+        file = _open_binary(raw_file, fname)
+        reader = csv.reader(_iter_decoded_lines(file))
+        chunk = []
+        first_line = 1
+
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) < CHUNK_SIZE:
+                continue
+
+            _validate_chunk(chunk, first_line, result, seen_keys)
+            first_line += len(chunk)
+            chunk = []
+
+            if is_cancelled and is_cancelled():
+                result.is_cancelled = True
+                return result
+            if progress_callback:
+                progress_callback(min(100 * raw_file.tell() // total_bytes, 99))
+
+        _validate_chunk(chunk, first_line, result, seen_keys)
+
+    if not result.has_errors():
+        result.symbols.sort(key=lambda x: x[0])
+    if progress_callback:
+        progress_callback(100)
+    return result
+
+
+""" Writing """
+
+def get_category(key):
+    """ 
+    Returns the section of the default symbol list that KEY belongs to, or 
+    CUSTOM_CATEGORY for user-defined keys.
+    """
+    return DEFAULT_CATEGORIES.get(key, CUSTOM_CATEGORY)
+
+def filter_symbols(symbols, text=None, category=None):
+    """
+    Returns the subset of SYMBOLS whose key or value contains TEXT, and/or 
+    whose key belongs to CATEGORY. Either filter is skipped if it is None.
+    """
+    return [(k, v) for k, v in symbols 
+        if (text is None or text in k or text in v) 
+        and (category is None or get_category(k) == category)]
+
+def write_symbol_csv(fname, symbols, progress_callback=None, 
+    is_cancelled=None):
+    """
+    Writes SYMBOLS to a CSV file in chunks of CHUNK_SIZE rows. The output is
+    gzip-compressed if FNAME ends in GZIP_EXTENSION. If the export is 
+    cancelled, the partially written file is removed.
+
+    @return: The number of rows written, or None if cancelled.
+    """
+    total = max(len(symbols), 1)
+
+    with io.open(fname, 'wb') as raw_file:
+        if fname.endswith(GZIP_EXTENSION):
+            binary_file = gzip.GzipFile(fileobj=raw_file, mode='wb')
+        else:
+            binary_file = raw_file
+        file = io.TextIOWrapper(binary_file, encoding='utf-8', newline='\n')
+        writer = csv.writer(file)
+
+        for start in range(0, len(symbols), CHUNK_SIZE):
+            if is_cancelled and is_cancelled():
+                break
+            writer.writerows(symbols[start:start + CHUNK_SIZE])
+            if progress_callback:
+                progress_callback(min(100 * (start + CHUNK_SIZE) // total, 99))
+        else:
+            file.close()
+            if progress_callback:
+                progress_callback(100)
+            return len(symbols)
+
+        file.close()
+    os.remove(fname)
+    return None
+
+
+""" Merging """
+
+class MergeResult(object):
+    """
+    Holds the output of join_symbol_lists(). CONFLICTS is a list of tuples of 
+    the format (key, current_value, imported_value).
+    """
+
+    def __init__(self):
+        self.new = []
+        self.identical = []
+        self.conflicts = []
+
+
+def join_symbol_lists(current, imported):
+    """
+    Joins an imported symbol list against the current symbol list by key 
+    using a hash join, which runs in linear time. Each imported entry is
+    classified as either new, identical, or conflicting.
+
+    @return: A MergeResult. Each of its lists is in the order of IMPORTED.
+    """
+    current_values = dict(current)
+    result = MergeResult()
+
+    for key, val in imported:
+        old_val = current_values.get(key)
+        if old_val is None:
+            result.new.append((key, val))
+        elif old_val == val:
+            result.identical.append((key, val))
+        else:
+            result.conflicts.append((key, old_val, val))
+    return result
+
+def apply_merge(current, merge_result, take_theirs):
+    """
+    Returns a new symbol list with the results of a merge applied. CURRENT 
+    must be sorted in alphabetical order by key, and the output will be too.
+
+    @param take_theirs: A set of conflicting keys where the imported value 
+      should replace the current value.
+    """
+    replacements = dict((key, val) for key, _, val in merge_result.conflicts 
+        if key in take_theirs)
+    merged = [(k, replacements.get(k, v)) for k, v in current]
+
+    new = sorted(merge_result.new, key=lambda x: x[0])
+    return list(heapq.merge(merged, new, key=lambda x: x[0]))
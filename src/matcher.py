@@ -0,0 +1,151 @@
+"""
+This file contains SymbolMatcher, which finds every key in a block of text in a
+single left-to-right pass. It is used to convert text that was not typed into
+the editor, such as existing notes. replacer.js contains a Javascript version 
+of this class, which converts pasted text.
+
+Matching follows the same rules as matchesKeyword() in replacer.js, applied as
+though the text were being typed one character at a time:
+ - Immediate (flag 1) and HTML (flag 2) keys are replaced as soon as their 
+   last character is reached. If several keys end there, the longest wins.
+ - Normal (flag 0) keys are only replaced when followed by whitespace (or by 
+   the end of a block, which is treated like pressing enter), and only when 
+   preceded by whitespace or the start of the text.
+ - Text that has been replaced is never matched again.
+
+The keys are compiled into a single Aho-Corasick automaton, so the cost of a 
+pass is linear in the length of the text regardless of the number of keys.
+"""
+
+from collections import deque
+
+FLAG_NORMAL = 0
+
+
+class SymbolMatcher(object):
+    """
+    Compiles a match list (see SymbolManager.get_match_list()) into an 
+    Aho-Corasick automaton. Each state stores the longest immediate key and 
+    all normal keys (longest first) that end at that state, so no output 
+    links need to be followed while scanning.
+    """
+
+    def __init__(self, match_list):
+        self.entries = [(item['key'], item['val'], item['f']) 
+            for item in (match_list or []) if item['key']]
+        self._build()
+
+    def _build(self):
+        goto = [{}]
+        terminal = [None]
+
+        for idx, (key, _, _) in enumerate(self.entries):
+            state = 0
+            for c in key:
+                nxt = goto[state].get(c)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][c] = nxt
+                    goto.append({})
+                    terminal.append(None)
+                state = nxt
+            terminal[state] = idx
+
+        fail = [0] * len(goto)
+        immediate = [None] * len(goto)
+        normal = [()] * len(goto)
+
+        # Breadth-first traversal guarantees that a state's failure link is
+        # complete before the state itself is processed:
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            f = fail[state]
+            immediate[state] = immediate[f]
+            normal[state] = normal[f]
+
+            idx = terminal[state]
+            if idx is not None:
+                if self.entries[idx][2] == FLAG_NORMAL:
+                    normal[state] = (idx,) + normal[f]
+                else:
+                    immediate[state] = idx
+
+            for c, nxt in goto[state].items():
+                queue.append(nxt)
+                g = f
+                while g and c not in goto[g]:
+                    g = fail[g]
+                fail[nxt] = goto[g].get(c, 0)
+
+        self._goto = goto
+        self._fail = fail
+        self._immediate = immediate
+        self._normal = normal
+
+    def is_empty(self):
+        return not self.entries
+
+    def find_replacements(self, text, at_block_end=True):
+        """
+        Finds the keys in TEXT that would be replaced.
+
+        @param at_block_end: Whether the end of TEXT is the end of a block, 
+          which allows a normal key at the very end to be replaced.
+        @return: A list of (start, end, entry_index) in ascending order.
+        """
+        goto, fail = self._goto, self._fail
+        immediate, normal = self._immediate, self._normal
+        entries = self.entries
+
+        matches = []
+        state = 0
+        last_end = 0
+        text_len = len(text)
+
+        for i, c in enumerate(text):
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+            if not state:
+                continue
+            end = i + 1
+
+            idx = immediate[state]
+            if idx is None and normal[state] and (end < text_len 
+                and text[end].isspace() or end == text_len and at_block_end):
+                for candidate in normal[state]:
+                    start = end - len(entries[candidate][0])
+                    if self._is_preceded_by_space(text, start, last_end, 
+                        matches):
+                        idx = candidate
+                        break
+
+            if idx is not None:
+                matches.append((end - len(entries[idx][0]), end, idx))
+                last_end = end
+                state = 0
+        return matches
+
+    def _is_preceded_by_space(self, text, start, last_end, matches):
+        """ 
+        Checks the character before START, which is the end of the previous 
+        replacement's value if START immediately follows a replacement. 
+        """
+        if start == 0:
+            return True
+        if matches and start == last_end:
+            value = self.entries[matches[-1][2]][1]
+            return not value or value[-1].isspace()
+        return text[start - 1].isspace()
+
+    def convert(self, text, at_block_end=True):
+        """ Returns TEXT with every matching key replaced by its value. """
+        pieces = []
+        last_end = 0
+        for start, end, idx in self.find_replacements(text, at_block_end):
+            pieces.append(text[last_end:start])
+            pieces.append(self.entries[idx][1])
+            last_end = end
+        pieces.append(text[last_end:])
+        return ''.join(pieces)
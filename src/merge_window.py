@@ -0,0 +1,133 @@
+""" 
+This file contains MergeWindow, a dialog that lets users review the result of 
+merging an imported symbol list into the working list before it is applied.
+"""
+
+from aqt.qt import *
+
+from .get_version import *
+
+PYQT_VER = get_pyqt_version()
+
+
+class MergeWindow(QDialog):
+    """
+    Displays new and conflicting entries from a MergeResult. For each 
+    conflict, the user can either keep the current value ("mine") or take the
+    imported value ("theirs"). Identical entries are only counted.
+    """
+
+    COL_TAKE_THEIRS = 0
+    COL_KEY = 1
+    COL_MINE = 2
+    COL_THEIRS = 3
+
+    def __init__(self, parent_widget, merge_result):
+        super(MergeWindow, self).__init__(parent_widget)
+        self._merge_result = merge_result
+
+        self.setWindowTitle("Merge Imported Symbols")
+        self.resize(600, 450)
+        layout = QVBoxLayout(self)
+
+        summary = ("%d new, %d identical, and %d conflicting entries were "
+            "found.") % (len(merge_result.new), len(merge_result.identical),
+            len(merge_result.conflicts))
+        layout.addWidget(QLabel(summary))
+
+        tabs = QTabWidget(self)
+        tabs.addTab(self._make_conflict_tab(), 
+            "Conflicts (%d)" % len(merge_result.conflicts))
+        tabs.addTab(self._make_new_tab(), "New (%d)" % len(merge_result.new))
+        layout.addWidget(tabs)
+
+        button_box = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | 
+            QDialogButtonBox.StandardButton.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def _make_table(self, headers, row_count):
+        table = QTableWidget(row_count, len(headers), self)
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+
+        h_header = table.horizontalHeader()
+        for col in range(1, len(headers)):
+            if PYQT_VER == PYQT_VER_4:
+                h_header.setResizeMode(col, QHeaderView.ResizeMode.Stretch)
+            else:
+                h_header.setSectionResizeMode(col, 
+                    QHeaderView.ResizeMode.Stretch)
+        return table
+
+    def _make_conflict_tab(self):
+        widget = QWidget(self)
+        layout = QVBoxLayout(widget)
+
+        conflicts = self._merge_result.conflicts
+        self._conflict_table = self._make_table(
+            ["Take theirs", "Key", "Mine", "Theirs"], len(conflicts))
+        self._conflict_table.setUpdatesEnabled(False)
+
+        for row, (key, mine, theirs) in enumerate(conflicts):
+            check_item = QTableWidgetItem()
+            check_item.setFlags(Qt.ItemFlag.ItemIsUserCheckable | 
+                Qt.ItemFlag.ItemIsEnabled)
+            check_item.setCheckState(Qt.CheckState.Unchecked)
+
+            self._conflict_table.setItem(row, self.COL_TAKE_THEIRS, check_item)
+            self._conflict_table.setItem(row, self.COL_KEY, 
+                QTableWidgetItem(key))
+            self._conflict_table.setItem(row, self.COL_MINE, 
+                QTableWidgetItem(mine))
+            self._conflict_table.setItem(row, self.COL_THEIRS, 
+                QTableWidgetItem(theirs))
+
+        self._conflict_table.setUpdatesEnabled(True)
+        layout.addWidget(self._conflict_table)
+
+        button_layout = QHBoxLayout()
+        keep_button = QPushButton("Keep All Mine", widget)
+        keep_button.clicked.connect(
+            lambda: self._set_all_checked(Qt.CheckState.Unchecked))
+        take_button = QPushButton("Take All Theirs", widget)
+        take_button.clicked.connect(
+            lambda: self._set_all_checked(Qt.CheckState.Checked))
+
+        button_layout.addWidget(keep_button)
+        button_layout.addWidget(take_button)
+        button_layout.addStretch()
+        layout.addLayout(button_layout)
+        return widget
+
+    def _make_new_tab(self):
+        new = self._merge_result.new
+        table = self._make_table(["", "Key", "Value"], len(new))
+        table.setColumnHidden(0, True)
+        table.setUpdatesEnabled(False)
+
+        for row, (key, val) in enumerate(new):
+            table.setItem(row, 1, QTableWidgetItem(key))
+            table.setItem(row, 2, QTableWidgetItem(val))
+
+        table.setUpdatesEnabled(True)
+        return table
+
+    def _set_all_checked(self, check_state):
+        self._conflict_table.setUpdatesEnabled(False)
+        for row in range(self._conflict_table.rowCount()):
+            self._conflict_table.item(row, self.COL_TAKE_THEIRS).setCheckState(
+                check_state)
+        self._conflict_table.setUpdatesEnabled(True)
+
+    def get_take_theirs(self):
+        """ Returns the set of conflicting keys where "theirs" was chosen. """
+        keys = set()
+        for row in range(self._conflict_table.rowCount()):
+            item = self._conflict_table.item(row, self.COL_TAKE_THEIRS)
+            if item.checkState() == Qt.CheckState.Checked:
+                keys.add(self._conflict_table.item(row, self.COL_KEY).text())
+        return keys
@@ -0,0 +1,111 @@
+"""
+This file contains functions that convert symbol keys in note fields, which 
+are stored as HTML. Only text between tags is converted, and each run of text 
+is matched separately, in the same way as replacer.js converts a field with 
+"Replace All" or a paste (see convertTextNodes()).
+
+This differs from typing: while typing, replacer.js also looks back across 
+neighbouring inline elements (see getTextBefore()), so a key that is split by
+inline tags, such as "<b>-</b>>", is replaced when its last character is typed
+but is left as-is by bulk and Browser conversion.
+"""
+
+import html
+import re
+
+FIELD_SEPARATOR = '\x1f'
+
+FLAG_HTML = 2
+
+_TAG_RE = re.compile(r'<!--.*?-->|<[^>]*>', re.DOTALL)
+_TAG_NAME_RE = re.compile(r'</?\s*([a-zA-Z0-9]+)')
+
+# Tags that end a line in the editor. Text before them is matched as though 
+# enter had been pressed after it:
+_BLOCK_TAGS = frozenset(['br', 'div', 'p', 'li', 'ul', 'ol', 'table', 'tr', 
+    'td', 'th', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'hr'])
+
+
+def _escape(text):
+    return html.escape(text, quote=False).replace('\xa0', '&nbsp;')
+
+def _is_block_tag(tag):
+    match = _TAG_NAME_RE.match(tag)
+    return bool(match) and match.group(1).lower() in _BLOCK_TAGS
+
+def _render_value(matcher, idx):
+    """ HTML values are inserted as-is. Other values are inserted as text. """
+    _, val, flag = matcher.entries[idx]
+    return val if flag == FLAG_HTML else _escape(val)
+
+def _find_replacements(text, matcher, at_block_end, hits):
+    matches = matcher.find_replacements(text, at_block_end)
+    if hits is not None:
+        for _, _, idx in matches:
+            hits[idx] += 1
+    return matches
+
+def _convert_text(text, matcher, at_block_end, hits):
+    """
+    Converts a run of HTML text between two tags. 
+
+    @return: A list of (start, end, new_html) edits relative to TEXT.
+    """
+    if '&' not in text:
+        return [(start, end, _render_value(matcher, idx)) for start, end, idx 
+            in _find_replacements(text, matcher, at_block_end, hits)]
+
+    # Entities must be decoded before matching, so the whole run is replaced:
+    plain = html.unescape(text)
+    matches = _find_replacements(plain, matcher, at_block_end, hits)
+    if not matches:
+        return []
+
+    pieces = []
+    last_end = 0
+    for start, end, idx in matches:
+        pieces.append(_escape(plain[last_end:start]))
+        pieces.append(_render_value(matcher, idx))
+        last_end = end
+    pieces.append(_escape(plain[last_end:]))
+    return [(0, len(text), ''.join(pieces))]
+
+def find_field_edits(field_html, matcher, hits=None):
+    """
+    Finds the edits needed to convert every symbol key in a field.
+
+    @param hits: An optional Counter, which is incremented for the index of 
+      each matcher entry that is replaced.
+    @return: A list of (start, end, new_html) in ascending order, where 
+      field_html[start:end] is replaced by NEW_HTML.
+    """
+    edits = []
+    pos = 0
+    for tag in _TAG_RE.finditer(field_html):
+        if tag.start() > pos:
+            at_block_end = _is_block_tag(tag.group())
+            edits.extend((pos + s, pos + e, new) for s, e, new in 
+                _convert_text(field_html[pos:tag.start()], matcher, 
+                at_block_end, hits))
+        pos = tag.end()
+
+    if pos < len(field_html):
+        edits.extend((pos + s, pos + e, new) for s, e, new in 
+            _convert_text(field_html[pos:], matcher, True, hits))
+    return edits
+
+def apply_edits(text, edits):
+    """ Applies a list of (start, end, new_text) edits in ascending order. """
+    pieces = []
+    last_end = 0
+    for start, end, new in edits:
+        pieces.append(text[last_end:start])
+        pieces.append(new)
+        last_end = end
+    pieces.append(text[last_end:])
+    return ''.join(pieces)
+
+def convert_field(field_html, matcher):
+    """ Returns FIELD_HTML with every symbol key converted. """
+    edits = find_field_edits(field_html, matcher)
+    return apply_edits(field_html, edits) if edits else field_html
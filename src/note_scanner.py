@@ -0,0 +1,108 @@
+"""
+This file contains the scanner for dry runs of note conversion. It reports how
+many times each key would be replaced and shows samples of the changes, 
+without modifying any notes.
+
+Note fields are scanned in chunks on the background thread that runs the dry
+run. The match list is compiled into a SymbolMatcher once, which scans each
+field in a single pass. Worker processes are not used, since forking Anki's
+multithreaded process can deadlock, and spawning would start the Anki binary
+rather than Python in packaged builds.
+"""
+
+from collections import Counter
+
+from .matcher import SymbolMatcher
+from .note_converter import find_field_edits, apply_edits, FIELD_SEPARATOR
+
+MAX_SAMPLES = 20
+SNIPPET_CONTEXT = 40
+
+
+class ScanResult(object):
+    """
+    Holds statistics from a dry run. HITS and NOTE_HITS map keys to the 
+    number of replacements and the number of notes with replacements. 
+    AFFECTED_IDS lists the notes that would change, and SAMPLES is a list of 
+    (note_id, before, after) snippets. IS_CANCELLED is whether the scan was
+    stopped early, in which case the statistics only cover some notes.
+    """
+
+    def __init__(self):
+        self.is_cancelled = False
+        self.notes_scanned = 0
+        self.notes_affected = 0
+        self.affected_ids = []
+        self.hits = Counter()
+        self.note_hits = Counter()
+        self.samples = []
+
+    def update(self, other):
+        """ Adds the statistics from another ScanResult. """
+        self.notes_scanned += other.notes_scanned
+        self.notes_affected += other.notes_affected
+        self.affected_ids.extend(other.affected_ids)
+        self.hits.update(other.hits)
+        self.note_hits.update(other.note_hits)
+        self.samples.extend(other.samples[:MAX_SAMPLES - len(self.samples)])
+
+
+def _make_snippet(field_html, edits):
+    """ Returns before/after snippets around the first edit in a field. """
+    start = max(edits[0][0] - SNIPPET_CONTEXT, 0)
+    end = min(edits[0][1] + SNIPPET_CONTEXT, len(field_html))
+    window_edits = [(s - start, e - start, new) for s, e, new in edits 
+        if s >= start and e <= end]
+
+    before = field_html[start:end]
+    return (before, apply_edits(before, window_edits))
+
+def scan_rows(matcher, rows):
+    """
+    Scans rows of (note_id, flds) from the notes table.
+
+    @return: A ScanResult.
+    """
+    result = ScanResult()
+    for nid, flds in rows:
+        result.notes_scanned += 1
+        hits = Counter()
+        sample = None
+
+        for field_html in flds.split(FIELD_SEPARATOR):
+            edits = find_field_edits(field_html, matcher, hits)
+            if edits and sample is None:
+                sample = _make_snippet(field_html, edits)
+
+        if hits:
+            result.notes_affected += 1
+            result.affected_ids.append(nid)
+            for idx, count in hits.items():
+                key = matcher.entries[idx][0]
+                result.hits[key] += count
+                result.note_hits[key] += 1
+            if len(result.samples) < MAX_SAMPLES:
+                result.samples.append((nid,) + sample)
+    return result
+
+
+def scan_chunks(match_list, chunks, on_progress=None, should_cancel=None):
+    """
+    Scans chunks of rows, where each chunk is a list of (note_id, flds). 
+    CHUNKS is read lazily so that only one chunk is held in memory at a 
+    time.
+
+    @param on_progress: Called with the number of notes scanned so far.
+    @param should_cancel: Returns True if the scan should stop early.
+    @return: A ScanResult.
+    """
+    result = ScanResult()
+    matcher = SymbolMatcher(match_list)
+    for rows in chunks:
+        if should_cancel and should_cancel():
+            result.is_cancelled = True
+            break
+        result.update(scan_rows(matcher, rows))
+        if on_progress:
+            on_progress(result.notes_scanned)
+    return result
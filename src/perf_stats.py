@@ -0,0 +1,210 @@
+"""
+This file contains PerfStats, which records how long the add-on's hot paths
+take so that reports of lag can be diagnosed without a profiler. Timing is off
+by default, and can be turned on from Tools > Insert Symbols > Performance
+Stats... (see perf_stats_window.py).
+
+Functions are timed by decorating them with @timed(name). While timing is off,
+a decorated function only costs one extra attribute lookup per call. While it
+is on, replacer.js also times each check for a key in the editor, and sends 
+its samples in batches (see record_js_batch()).
+
+Every sample is also kept as a trace event, so that a session can be saved in
+Chrome's trace event format and opened in chrome://tracing or Perfetto.
+"""
+
+import functools
+import json
+import time
+from collections import deque
+
+# Percentiles are computed from this many of the most recent samples:
+MAX_SAMPLES = 1000
+
+# Only this many of the most recent trace events are kept:
+MAX_TRACE_EVENTS = 100000
+
+# Source of samples from Python, as opposed to a WebView:
+PYTHON_SOURCE = 'Python'
+
+
+class OperationStats(object):
+    """
+    Timings for a single operation. The count, total and max cover every
+    call, whereas percentiles only cover the most recent MAX_SAMPLES calls.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def get_percentile(self, percent):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100.0))
+        return ordered[index]
+
+    def to_dict(self):
+        """ Returns a dict of the stats, with times in seconds. """
+        return {
+            'count': self.count,
+            'total': self.total,
+            'p50': self.get_percentile(50),
+            'p95': self.get_percentile(95),
+            'max': self.max
+        }
+
+
+class PerfStats(object):
+    """ Keeps an OperationStats for each timed operation, by name. """
+
+    def __init__(self):
+        self.enabled = False
+        self.metadata = {}
+        self.dropped_js_samples = 0
+        self._operations = {}
+        self._trace_events = deque(maxlen=MAX_TRACE_EVENTS)
+        self._enabled_callbacks = []
+
+    def add_enabled_callback(self, callback):
+        """ CALLBACK is called with the new state whenever it changes. """
+        self._enabled_callbacks.append(callback)
+
+    def set_enabled(self, enabled):
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        for callback in self._enabled_callbacks:
+            callback(enabled)
+
+    def clear(self):
+        self.dropped_js_samples = 0
+        self._operations = {}
+        self._trace_events.clear()
+
+    def record(self, name, seconds, start_time=None, source=PYTHON_SOURCE,
+        args=None):
+        """
+        @param start_time: When the operation started, in seconds since the 
+          epoch. If given, the sample is also kept as a trace event.
+        @param source: Where the operation ran, which is shown as a thread in
+          the trace.
+        """
+        stats = self._operations.get(name)
+        if stats is None:
+            stats = self._operations[name] = OperationStats()
+        stats.add(seconds)
+
+        if start_time is not None:
+            self._trace_events.append((source, name, start_time, seconds, 
+                args))
+
+    def record_js_batch(self, source, payload):
+        """
+        Records a batch of samples sent by replacer.js. Operations are named
+        'js.' followed by the Javascript function's name.
+
+        @param source: The kind of WebView that sent the batch (eg. 'Editor').
+        @param payload: A JSON object where SAMPLES is a list of [name, start,
+          duration], with times in milliseconds relative to ORIGIN (which is
+          milliseconds since the epoch). LISTSIZE is the size of the page's 
+          match list, and DROPPED the number of samples that did not fit in 
+          the page's buffer.
+        """
+        if not self.enabled:
+            return
+
+        batch = json.loads(payload)
+        origin = batch['origin']
+        args = {'list_size': batch['listSize']}
+        for name, start, duration in batch['samples']:
+            self.record('js.' + name, duration / 1000.0, 
+                (origin + start) / 1000.0, source, args)
+        self.dropped_js_samples += batch['dropped']
+
+    def get_summary(self):
+        """
+        @return: A dict mapping each operation's name to its stats (see
+          OperationStats.to_dict()).
+        """
+        return dict((name, stats.to_dict())
+            for name, stats in self._operations.items())
+
+    def dump(self, fname):
+        """ Writes the summary to a JSON file. """
+        data = {
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'metadata': self.metadata,
+            'dropped_js_samples': self.dropped_js_samples,
+            'operations': self.get_summary()
+        }
+        with open(fname, 'w') as json_file:
+            json.dump(data, json_file, indent=2, sort_keys=True)
+
+    def get_trace(self):
+        """ 
+        Returns the trace events in Chrome's trace event format, where each
+        source is shown as a thread and times are in microseconds.
+        """
+        thread_ids = {}
+        events = []
+        for source, name, start_time, seconds, args in self._trace_events:
+            tid = thread_ids.setdefault(source, len(thread_ids) + 1)
+            event = {
+                'name': name,
+                'cat': 'python' if source == PYTHON_SOURCE else 'js',
+                'ph': 'X',
+                'ts': start_time * 1e6,
+                'dur': seconds * 1e6,
+                'pid': 1,
+                'tid': tid
+            }
+            if args:
+                event['args'] = args
+            events.append(event)
+
+        for source, tid in thread_ids.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 
+                'tid': tid, 'args': {'name': source}})
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': self.metadata
+        }
+
+    def dump_trace(self, fname):
+        """ Writes the trace events to a JSON file (see get_trace()). """
+        with open(fname, 'w') as json_file:
+            json.dump(self.get_trace(), json_file)
+
+
+# Stats shared by the whole add-on:
+perf_stats = PerfStats()
+
+
+def timed(name):
+    """ Decorator that records each call's duration under NAME if enabled. """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not perf_stats.enabled:
+                return func(*args, **kwargs)
+
+            start_time = time.time()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                perf_stats.record(name, time.perf_counter() - start, 
+                    start_time)
+        return wrapper
+    return decorator
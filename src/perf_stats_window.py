@@ -0,0 +1,122 @@
+"""
+This file contains PerfStatsWindow, which shows the timings recorded by
+PerfStats and lets them be saved as JSON.
+"""
+
+import os
+
+import aqt
+from aqt.qt import *
+
+from .get_version import *
+from .perf_stats import perf_stats
+
+PYQT_VER = get_pyqt_version()
+
+COLUMNS = ["Operation", "Count", "p50", "p95", "Max", "Total"]
+
+
+def get_default_dump_path(name):
+    return os.path.join(os.path.dirname(__file__), 'user_files', name)
+
+def format_ms(seconds):
+    return "%.2f ms" % (seconds * 1000)
+
+
+class PerfStatsWindow(QDialog):
+    """
+    Displays the count, median, 95th percentile, max and total time of each
+    timed operation. Timing can be turned on or off, and the stats cleared.
+    Operations timed in the editor's Javascript start with 'js.'.
+    """
+
+    def __init__(self, parent_widget):
+        super(PerfStatsWindow, self).__init__(parent_widget)
+        self.setWindowTitle("Insert Symbols Performance Stats")
+        self.resize(600, 400)
+        layout = QVBoxLayout(self)
+
+        self.enabledCheckBox = QCheckBox("Record timings", self)
+        self.enabledCheckBox.setChecked(perf_stats.enabled)
+        self.enabledCheckBox.toggled.connect(perf_stats.set_enabled)
+        layout.addWidget(self.enabledCheckBox)
+
+        self.table = QTableWidget(0, len(COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setEditTriggers(
+            QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        h_header = self.table.horizontalHeader()
+        if PYQT_VER == PYQT_VER_4:
+            h_header.setResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        else:
+            h_header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+
+        self.droppedLabel = QLabel(self)
+        layout.addWidget(self.droppedLabel)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        refresh_button = button_box.addButton("Refresh",
+            QDialogButtonBox.ButtonRole.ActionRole)
+        refresh_button.clicked.connect(self.refresh)
+        clear_button = button_box.addButton("Clear",
+            QDialogButtonBox.ButtonRole.ActionRole)
+        clear_button.clicked.connect(self.clear)
+        save_button = button_box.addButton("Save as JSON...",
+            QDialogButtonBox.ButtonRole.ActionRole)
+        save_button.clicked.connect(self.save_json)
+        trace_button = button_box.addButton("Save Chrome Trace...",
+            QDialogButtonBox.ButtonRole.ActionRole)
+        trace_button.clicked.connect(self.save_trace)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+        self.refresh()
+
+    def refresh(self):
+        summary = perf_stats.get_summary()
+        self.table.setRowCount(len(summary))
+        for row, name in enumerate(sorted(summary)):
+            stats = summary[name]
+            cells = [name, str(stats['count']), format_ms(stats['p50']),
+                format_ms(stats['p95']), format_ms(stats['max']),
+                format_ms(stats['total'])]
+            for col, text in enumerate(cells):
+                self.table.setItem(row, col, QTableWidgetItem(text))
+
+        self.droppedLabel.setText("Javascript samples dropped: %d" 
+            % perf_stats.dropped_js_samples)
+
+    def clear(self):
+        perf_stats.clear()
+        self.refresh()
+
+    def _ask_save_path(self, default_name):
+        default_path = get_default_dump_path(default_name)
+        os.makedirs(os.path.dirname(default_path), exist_ok=True)
+        if PYQT_VER == PYQT_VER_4:
+            fname = QFileDialog.getSaveFileName(self, 'Save file',
+                default_path, "JSON (*.json)")
+        else:
+            fname, _ = QFileDialog.getSaveFileName(self, 'Save file',
+                default_path, "JSON (*.json)")
+        return fname
+
+    def save_json(self):
+        fname = self._ask_save_path('perf_stats.json')
+        if not fname:
+            return
+
+        perf_stats.dump(fname)
+        aqt.utils.tooltip("Performance stats saved to: %s" % fname,
+            parent=self)
+
+    def save_trace(self):
+        """ The trace can be opened in chrome://tracing or Perfetto. """
+        fname = self._ask_save_path('perf_trace.json')
+        if not fname:
+            return
+
+        perf_stats.dump_trace(fname)
+        aqt.utils.tooltip("Trace saved to: %s" % fname, parent=self)
@@ -0,0 +1,145 @@
+"""
+This file contains AddonProfiler, which profiles the add-on with cProfile so
+that users who find Anki slow with the add-on enabled can collect evidence in
+one click (Tools > Insert Symbols > Profile Add-on).
+
+Only the add-on's hook entry points, which are decorated with @profiled, are
+profiled, so time spent in Anki itself is left out. Stopping a session writes
+a .pstats file, which can be read with the pstats module or snakeviz, and a
+collapsed-stack text file, which can be turned into a flame graph with
+flamegraph.pl or speedscope.
+"""
+
+import cProfile
+import functools
+import os
+import pstats
+import time
+
+# Stacks deeper than this are cut off in the collapsed-stack file:
+MAX_STACK_DEPTH = 64
+
+# Collapsed stacks are written in this unit of time, per second:
+UNITS_PER_SECOND = 1000000
+
+# Calls that take less than this many seconds along a stack are left out:
+MIN_STACK_TIME = 1e-6
+
+
+class AddonProfiler(object):
+
+    def __init__(self):
+        self._profile = None
+        self._depth = 0
+        self._call_count = 0
+
+    def is_running(self):
+        return self._profile is not None
+
+    def start(self):
+        self._profile = cProfile.Profile()
+        self._call_count = 0
+
+    def stop(self, out_dir):
+        """
+        Ends the session and writes its results to OUT_DIR.
+
+        @return: A tuple (pstats_path, collapsed_path, call_count), where
+          both paths are None if no entry points were called.
+        """
+        profile = self._profile
+        self._profile = None
+        if not self._call_count:
+            return (None, None, 0)
+
+        os.makedirs(out_dir, exist_ok=True)
+        base = os.path.join(out_dir, time.strftime('profile_%Y%m%d_%H%M%S'))
+        pstats_path = base + '.pstats'
+        collapsed_path = base + '.collapsed.txt'
+
+        stats = pstats.Stats(profile)
+        stats.dump_stats(pstats_path)
+        write_collapsed_stacks(stats, collapsed_path)
+        return (pstats_path, collapsed_path, self._call_count)
+
+
+# Profiler shared by the whole add-on:
+profiler = AddonProfiler()
+
+
+def profiled(func):
+    """
+    Decorator for hook entry points, which profiles each call while a session
+    is running. An entry point that is called from another one is profiled
+    as part of the outer call.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = profiler._profile
+        if profile is None or profiler._depth:
+            return func(*args, **kwargs)
+
+        profiler._depth += 1
+        profiler._call_count += 1
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            profiler._depth -= 1
+    return wrapper
+
+
+""" Collapsed Stacks """
+
+def _get_frame_name(func):
+    """ FUNC is a (file, line, name) tuple, as used by pstats. """
+    file_name, line, name = func
+    if file_name == '~':
+        frame = name
+    else:
+        frame = '%s (%s:%d)' % (name, os.path.basename(file_name), line)
+    return frame.replace(';', ',')
+
+def write_collapsed_stacks(stats, fname):
+    """
+    Writes the stacks in STATS in the collapsed format used by flame graphs,
+    with one line per stack: the frames separated by semicolons, then the
+    time spent in the innermost frame in microseconds.
+
+    cProfile only records which function called which, rather than whole
+    stacks, so stacks are rebuilt by walking down from each root. When a
+    function is reached along one path, its calls are scaled by the share of
+    its total time that path accounts for. Recursive calls are cut off.
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, edge_tt, edge_ct) in callers.items():
+            callees.setdefault(caller, []).append((func, edge_tt, edge_ct))
+
+    totals = {}
+    def walk(func, stack, self_time, total_time):
+        stack = stack + [_get_frame_name(func)]
+        key = ';'.join(stack)
+        totals[key] = totals.get(key, 0.0) + self_time
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+
+        func_total = stats.stats[func][3]
+        share = total_time / func_total if func_total else 0.0
+        for callee, edge_tt, edge_ct in callees.get(func, []):
+            if (edge_ct * share < MIN_STACK_TIME or callee == func
+                or _get_frame_name(callee) in stack):
+                continue
+            walk(callee, stack, edge_tt * share, edge_ct * share)
+
+    # Profile.disable() is recorded as a root, but it is not add-on code:
+    for func, (_, _, tt, ct, callers) in stats.stats.items():
+        if not callers and not func[2].startswith("<method 'disable'"):
+            walk(func, [], tt, ct)
+
+    with open(fname, 'w') as out_file:
+        for key in sorted(totals):
+            units = int(round(totals[key] * UNITS_PER_SECOND))
+            if units > 0:
+                out_file.write('%s %d\n' % (key, units))
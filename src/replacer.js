@@ -7,16 +7,67 @@
 
 var insert_symbols = new function () {
 
-    const SETUP_TIMEOUT = 500;  // To prevent our code trying to add listeners before HTML is ready
-
     const KEY_SPACE = 32;
     const KEY_ENTER = 13;
+    const KEY_TAB = 9;
+    const KEY_ESCAPE = 27;
+    const KEY_UP = 38;
+    const KEY_DOWN = 40;
+
+    const WHITESPACE = /\s/;
+
+    // Elements that end a line, as in note_converter.py:
+    const BLOCK_TAGS = /^(BR|DIV|P|LI|UL|OL|TABLE|TR|TD|TH|H[1-6]|BLOCKQUOTE|PRE|HR)$/;
+
+    // Elements in pasted HTML that are not part of the pasted content:
+    const NON_CONTENT_TAGS = /^(META|STYLE|SCRIPT|TITLE|LINK)$/;
 
     var matchList = undefined;
+    var matcher = null;
+    var maxKeyLength = 0;
     var shouldCheckOnKeyup = false;
+    var isComposing = false;
+    var pendingFrame = null;
+    var pendingRoot = null;
+
+    // Completions are offered for keys that start with a colon, once at 
+    // least two characters follow the colons:
+    const COMPLETION_PATTERN = /::?[^\s:]{2,}$/;
+    const COMPLETION_TRIGGER = ":";
+    const MAX_COMPLETIONS = 8;
+
+    var completionIndex = null;
+    var completions = [];
+    var completionRoot = null;
+    var selectedCompletion = 0;
+    var isCompletionChosen = false;
+    var popup = null;
+
+    const TRACE_PREFIX = "insert_symbols:trace:";
+    const TRACE_BUFFER_SIZE = 256;
+    const TRACE_FLUSH_INTERVAL = 1000;
+
+    var isTracing = false;
+    var traceBuffer = [];
+    var traceNext = 0;
+    var traceDropped = 0;
+    var traceTimer = null;
+
+    const USAGE_PREFIX = "insert_symbols:usage:";
+    const USAGE_FLUSH_INTERVAL = 5000;
+
+    var isCountingUsage = false;
+    var usageCounts = {};
+    var usageTimer = null;
 
     this.setMatchList = function (str) {
         matchList = JSON.parse(str);
+        matcher = null;
+        completionIndex = null;
+        hideCompletions();
+
+        // The match list is sorted by key length in descending order:
+        maxKeyLength = (matchList.length > 0) ? matchList[0].key.length : 0;
     }
 
     // Keypress Handling:
@@ -37,72 +88,586 @@ var insert_symbols = new function () {
      * defer to keyup for everything else. It works for the most part.
      */
     this.onKeyDown = function (evt) {
+        var editable = getEditable(evt);
+        if (editable === null || isComposing || evt.isComposing) {
+            return;
+        }
+
         // Disable CTRL commands from triggering replacement:
         if (evt.ctrlKey) {
             return;
         }
 
+        if (completions.length > 0 && handleCompletionKey(evt)) {
+            return;
+        }
+
         if (evt.which == KEY_SPACE || evt.which == KEY_ENTER) {
-            checkForReplacement(evt.currentTarget.getRootNode(), true);
+            // Whitespace is checked right away, which also covers any check
+            // that is still pending:
+            cancelPendingCheck();
+            hideCompletions();
+            checkForReplacement(editable.getRootNode(), true);
         } else {
             shouldCheckOnKeyup = true;
         }
     }
 
     this.onKeyUp = function (evt) {
-        if (shouldCheckOnKeyup) {
+        var editable = getEditable(evt);
+        if (shouldCheckOnKeyup && editable !== null) {
             shouldCheckOnKeyup = false;
-            checkForReplacement(evt.currentTarget.getRootNode(), false);
+            scheduleCheck(editable.getRootNode());
         }
     }
 
     /**
-     * Add event handlers to Editor key events. Setup only needs to be 
-     * performed when the editor is first created.
+     * Input method editors (eg. for Chinese or Japanese) insert text that is 
+     * still being composed, so matching is skipped until composition ends.
      */
+    this.onCompositionStart = function (evt) {
+        isComposing = true;
+        cancelPendingCheck();
+        hideCompletions();
+    }
 
-    // For Anki 2.1.41 - 2.1.49
-    this.addListenersV1 =  function() {
-        forEditorField([], (field) => {
-            if (!field.hasAttribute("has-type-symbols")) {
-                field.editingArea.editable.addEventListener("keydown", this.onKeyDown)
-                field.editingArea.editable.addEventListener("keyup", this.onKeyUp)
-                field.setAttribute("has-type-symbols", "")
+    this.onCompositionEnd = function (evt) {
+        isComposing = false;
+    }
+
+    /**
+     * Clicking anywhere but the completion popup closes it. The popup's rows
+     * handle their own clicks.
+     */
+    this.onMouseDown = function (evt) {
+        if (completions.length > 0 && evt.composedPath
+            && evt.composedPath().indexOf(popup) < 0) {
+            hideCompletions();
+        }
+    }
+
+    /**
+     * Checks after other keys are coalesced so that at most one check runs 
+     * per animation frame while typing quickly. The completion popup is 
+     * updated in the same frame.
+     */
+    function scheduleCheck(root) {
+        pendingRoot = root;
+        if (pendingFrame === null) {
+            pendingFrame = requestAnimationFrame(function() {
+                pendingFrame = null;
+                if (!isComposing) {
+                    checkForReplacement(pendingRoot, false);
+                    updateCompletions(pendingRoot);
+                }
+            });
+        }
+    }
+
+    function cancelPendingCheck() {
+        if (pendingFrame !== null) {
+            cancelAnimationFrame(pendingFrame);
+            pendingFrame = null;
+        }
+    }
+
+    /**
+     * Pasted text is converted in a single pass and inserted with one editing
+     * command, so that the paste can be undone in one step. If the clipboard
+     * has HTML, the text nodes of the HTML are converted (see 
+     * convertPastedHTML()), otherwise the plain text is. Pastes that include
+     * files are left to Anki. The handler runs in the capture phase, before
+     * Anki's own paste handler, which is skipped when a replacement is made.
+     */
+    this.onPaste = function (evt) {
+        var editable = getEditable(evt);
+        if (!evt.clipboardData || editable === null 
+            || !matchList || matchList.length == 0) {
+            return;
+        }
+
+        var types = evt.clipboardData.types;
+        if (Array.prototype.indexOf.call(types, "Files") >= 0) {
+            return;
+        }
+
+        var html = null;
+        if (Array.prototype.indexOf.call(types, "text/html") >= 0) {
+            html = convertPastedHTML(evt.clipboardData.getData("text/html"));
+        } else if (Array.prototype.indexOf.call(types, "text/plain") >= 0) {
+            var sel = editable.getRootNode().getSelection();
+            html = convertToHTML(evt.clipboardData.getData("text/plain"), 
+                false, isCaretAfterSpace(sel));
+        }
+        if (html !== null) {
+            evt.preventDefault();
+            evt.stopPropagation();
+            document.execCommand("insertHTML", false, html);
+        }
+    }
+
+    /**
+     * Key and paste events are handled by capture-phase listeners on the 
+     * document. These events are composed, so they reach the document from
+     * inside each field's shadow root. Fields that are created later, such as
+     * those made editable in the reviewer by the "Edit Field During Review" 
+     * add-on, are covered without any further setup.
+     *
+     * If this script is evaluated again in the same page, the listeners from
+     * the previous evaluation are removed first.
+     */
+    var listeners = {
+        "keydown": this.onKeyDown,
+        "keyup": this.onKeyUp,
+        "paste": this.onPaste,
+        "compositionstart": this.onCompositionStart,
+        "compositionend": this.onCompositionEnd,
+        "mousedown": this.onMouseDown
+    };
+
+    if (document.insertSymbolsListeners) {
+        for (var type in document.insertSymbolsListeners) {
+            document.removeEventListener(type, 
+                document.insertSymbolsListeners[type], true);
+        }
+    }
+    for (var type in listeners) {
+        document.addEventListener(type, listeners[type], true);
+    }
+    document.insertSymbolsListeners = listeners;
+
+    /**
+     * Returns the editable element that an event was fired on, or null if 
+     * the event did not come from an editable element.
+     */
+    function getEditable(evt) {
+        var target = evt.composedPath ? evt.composedPath()[0] : evt.target;
+        return (target && target.isContentEditable) ? target : null;
+    }
+
+    // Multi-pattern Matching:
+    //----------------------------------
+
+    /**
+     * Compiles the match list into an Aho-Corasick automaton so that a block 
+     * of text can be checked against every key in one left-to-right pass. 
+     * Matching follows the same rules as SymbolMatcher in matcher.py, which 
+     * treats the text as though it were typed one character at a time.
+     *
+     * Each state stores the longest immediate key and all normal keys 
+     * (longest first) that end at that state, so no output links need to be
+     * followed while scanning.
+     */
+    function SymbolMatcher(list) {
+        var goto = [{}];
+        var terminal = [-1];
+        var idx, state, next, c, i;
+
+        for (idx = 0; idx < list.length; idx++) {
+            var key = list[idx].key;
+            state = 0;
+            for (i = 0; i < key.length; i++) {
+                c = key[i];
+                next = goto[state][c];
+                if (next === undefined) {
+                    next = goto.length;
+                    goto[state][c] = next;
+                    goto.push({});
+                    terminal.push(-1);
+                }
+                state = next;
+            }
+            terminal[state] = idx;
+        }
+
+        var fail = [0];
+        var immediate = [-1];
+        var normal = [[]];
+
+        // Breadth-first traversal guarantees that a state's failure link is
+        // complete before the state itself is processed:
+        var queue = [];
+        for (c in goto[0]) {
+            fail[goto[0][c]] = 0;
+            queue.push(goto[0][c]);
+        }
+
+        for (var head = 0; head < queue.length; head++) {
+            state = queue[head];
+            var f = fail[state];
+            immediate[state] = immediate[f];
+            normal[state] = normal[f];
+
+            idx = terminal[state];
+            if (idx >= 0) {
+                if (list[idx].f == 0) {
+                    normal[state] = [idx].concat(normal[f]);
+                } else {
+                    immediate[state] = idx;
+                }
+            }
+
+            for (c in goto[state]) {
+                next = goto[state][c];
+                var g = f;
+                while (g && goto[g][c] === undefined) {
+                    g = fail[g];
+                }
+                fail[next] = goto[g][c] || 0;
+                queue.push(next);
             }
-        })
+        }
+
+        this.entries = list;
+        this.goto = goto;
+        this.fail = fail;
+        this.immediate = immediate;
+        this.normal = normal;
     }
 
-    // For Anki 2.1.50+
-    this.addListenersV2 =  function() {
-        setTimeout(() => {
-            editorFields = document.getElementsByClassName("rich-text-editable");
+    /**
+     * Finds the keys in TEXT that would be replaced.
+     *
+     * @param atBlockEnd Whether the end of TEXT counts as whitespace, which 
+     *   allows a normal key at the very end to be replaced.
+     * @param atSpace Whether the character before TEXT is whitespace.
+     * @return An array of [start, end, entryIndex] in ascending order.
+     */
+    SymbolMatcher.prototype.findReplacements = function(text, atBlockEnd, 
+        atSpace) {
+        var goto = this.goto, fail = this.fail;
+        var matches = [];
+        var state = 0;
+        var lastEnd = 0;
+
+        for (var i = 0; i < text.length; i++) {
+            var c = text[i];
+            while (state && goto[state][c] === undefined) {
+                state = fail[state];
+            }
+            state = goto[state][c] || 0;
+            if (!state) {
+                continue;
+            }
+            var end = i + 1;
 
-            for (field of editorFields) {
-                if (field.shadowRoot !== undefined) {
-                    if (!field.hasAttribute("has-type-symbols")) {
-                        field.shadowRoot.addEventListener("keydown", this.onKeyDown);
-                        field.shadowRoot.addEventListener("keyup", this.onKeyUp);
-                        field.setAttribute("has-type-symbols", "");
+            var idx = this.immediate[state];
+            var candidates = this.normal[state];
+            if (idx < 0 && candidates.length > 0 && (end < text.length 
+                ? WHITESPACE.test(text[end]) : atBlockEnd)) {
+                for (var j = 0; j < candidates.length; j++) {
+                    var start = end - this.entries[candidates[j]].key.length;
+                    if (this.isPrecededBySpace(text, start, lastEnd, matches, 
+                        atSpace)) {
+                        idx = candidates[j];
+                        break;
                     }
                 }
             }
-        }, SETUP_TIMEOUT);   
+
+            if (idx >= 0) {
+                matches.push([end - this.entries[idx].key.length, end, idx]);
+                lastEnd = end;
+                state = 0;
+            }
+        }
+        return matches;
     }
 
-    if (typeof forEditorField !== 'undefined') {
-        this.addListenersV1();
-    } else {
-        this.addListenersV2();
+    /**
+     * Checks the character before START, which is the end of the previous 
+     * replacement's value if START immediately follows a replacement.
+     */
+    SymbolMatcher.prototype.isPrecededBySpace = function(text, start, lastEnd,
+        matches, atSpace) {
+        if (start == 0) {
+            return atSpace;
+        }
+        if (matches.length > 0 && start == lastEnd) {
+            var val = this.entries[matches[matches.length - 1][2]].val;
+            return val.length == 0 || WHITESPACE.test(val[val.length - 1]);
+        }
+        return WHITESPACE.test(text[start - 1]);
+    }
+
+    function getMatcher() {
+        if (matcher === null) {
+            matcher = new SymbolMatcher(matchList || []);
+        }
+        return matcher;
+    }
+
+    function escapeHTML(text) {
+        return text.replace(/&/g, "&amp;").replace(/</g, "&lt;")
+            .replace(/>/g, "&gt;").replace(/  /g, " &nbsp;")
+            .replace(/\r?\n/g, "<br>");
     }
 
     /**
-     * Add event handlers to Reviewer key events to extend functionality to
-     * "Edit Field During Review" plugin. This needs to be called each time
-     * a question/answer is shown since that is when fields are made editable.
+     * Converts TEXT into HTML with every key replaced by its value. HTML 
+     * values are inserted as-is and everything else is escaped.
+     *
+     * @return The converted HTML, or null if nothing would be replaced.
      */
-    this.setupReviewerKeyEvents = function () {
-        $("[contenteditable]").keydown(this.onKeyDown);
-        $("[contenteditable]").keyup(this.onKeyUp);
+    function convertToHTML(text, atBlockEnd, atSpace) {
+        var m = getMatcher();
+        var matches = m.findReplacements(text, atBlockEnd, atSpace);
+        if (matches.length == 0) {
+            return null;
+        }
+
+        var pieces = [];
+        var lastEnd = 0;
+        for (var i = 0; i < matches.length; i++) {
+            var entry = m.entries[matches[i][2]];
+            pieces.push(escapeHTML(text.substring(lastEnd, matches[i][0])));
+            pieces.push(entry.f == 2 ? entry.val : escapeHTML(entry.val));
+            lastEnd = matches[i][1];
+        }
+        pieces.push(escapeHTML(text.substring(lastEnd)));
+        return pieces.join("");
+    }
+
+    /**
+     * Checks whether the character before the start of the selection is 
+     * whitespace. The start of a block is treated as whitespace.
+     */
+    function isCaretAfterSpace(sel) {
+        if (sel.rangeCount == 0) {
+            return true;
+        }
+        var range = sel.getRangeAt(0);
+        var text = getTextBefore(range.startContainer, range.startOffset, 1)
+            .text;
+        return text.length == 0 || WHITESPACE.test(text);
+    }
+
+    // Replace All in Field:
+    //----------------------------------
+
+    /**
+     * Converts every key in the focused field. The field is converted on a 
+     * copy of its DOM and written back with one editing command, so that it
+     * can be undone in one step.
+     *
+     * @return Whether any keys were replaced.
+     */
+    this.replaceAllInField = function () {
+        var editable = getFocusedEditable();
+        if (editable === null || !matchList || matchList.length == 0) {
+            return false;
+        }
+
+        var copy = editable.cloneNode(true);
+        if (!convertTextNodes(copy, getMatcher())) {
+            return false;
+        }
+
+        var sel = editable.getRootNode().getSelection();
+        var range = document.createRange();
+        range.selectNodeContents(editable);
+        sel.removeAllRanges();
+        sel.addRange(range);
+        document.execCommand("insertHTML", false, copy.innerHTML);
+        return true;
+    }
+
+    /**
+     * Converts every key in the text nodes of pasted HTML, in the same way as
+     * replaceAllInField(). Since Anki's paste handler is skipped when a key
+     * is replaced, the clipboard's own markup is cleaned up here instead: 
+     * elements that are not content (eg. <meta> and <style>), comments, and 
+     * style and class attributes are removed first.
+     *
+     * @return The converted HTML, or null if no keys were replaced.
+     */
+    function convertPastedHTML(html) {
+        var template = document.createElement("template");
+        template.innerHTML = html;
+        var content = template.content;
+
+        var walker = document.createTreeWalker(content, 
+            NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_COMMENT);
+        var removed = [];
+        while (walker.nextNode()) {
+            var node = walker.currentNode;
+            if (node.nodeType == Node.COMMENT_NODE 
+                || NON_CONTENT_TAGS.test(node.nodeName)) {
+                removed.push(node);
+            } else {
+                node.removeAttribute("style");
+                node.removeAttribute("class");
+            }
+        }
+        for (var i = 0; i < removed.length; i++) {
+            removed[i].parentNode.removeChild(removed[i]);
+        }
+
+        if (!convertTextNodes(content, getMatcher())) {
+            return null;
+        }
+        return template.innerHTML;
+    }
+
+    /**
+     * Returns the focused editable element, looking inside shadow roots, or
+     * null if no field has focus.
+     */
+    function getFocusedEditable() {
+        var elem = document.activeElement;
+        while (elem && elem.shadowRoot && elem.shadowRoot.activeElement) {
+            elem = elem.shadowRoot.activeElement;
+        }
+        return (elem && elem.isContentEditable) ? elem : null;
+    }
+
+    /**
+     * A text node ends a block if it is followed by a line break or block 
+     * element, or if it is the last node in a block. This matches how 
+     * note_converter.py treats text before a block tag.
+     */
+    function isBlockEnd(node, root) {
+        var next = node.nextSibling;
+        if (next === null) {
+            var parent = node.parentNode;
+            return parent === root || BLOCK_TAGS.test(parent.nodeName);
+        }
+        return BLOCK_TAGS.test(next.nodeName);
+    }
+
+    /**
+     * Replaces every key in the text nodes under ROOT. Each text node is 
+     * matched separately, in the same way as note_converter.py.
+     *
+     * @return Whether any keys were replaced.
+     */
+    function convertTextNodes(root, m) {
+        var walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+        var nodes = [];
+        while (walker.nextNode()) {
+            nodes.push(walker.currentNode);
+        }
+
+        var isChanged = false;
+        for (var i = 0; i < nodes.length; i++) {
+            var node = nodes[i];
+            var text = node.data;
+            var matches = m.findReplacements(text, isBlockEnd(node, root), 
+                true);
+            if (matches.length == 0) {
+                continue;
+            }
+
+            var fragment = document.createDocumentFragment();
+            var lastEnd = 0;
+            for (var j = 0; j < matches.length; j++) {
+                var entry = m.entries[matches[j][2]];
+                if (matches[j][0] > lastEnd) {
+                    fragment.appendChild(document.createTextNode(
+                        text.substring(lastEnd, matches[j][0])));
+                }
+                if (entry.f == 2) {
+                    var template = document.createElement("template");
+                    template.innerHTML = entry.val;
+                    fragment.appendChild(template.content);
+                } else {
+                    fragment.appendChild(document.createTextNode(entry.val));
+                }
+                lastEnd = matches[j][1];
+            }
+            if (lastEnd < text.length) {
+                fragment.appendChild(document.createTextNode(
+                    text.substring(lastEnd)));
+            }
+            node.parentNode.replaceChild(fragment, node);
+            isChanged = true;
+        }
+        return isChanged;
+    }
+
+    // Look-back:
+    //----------------------------------
+
+    /**
+     * Checks whether NODE ends a run of inline text. Block elements, line 
+     * breaks and the editable element itself are boundaries.
+     */
+    function isBoundary(node) {
+        return node.nodeType != Node.ELEMENT_NODE 
+            || BLOCK_TAGS.test(node.nodeName)
+            || node.hasAttribute("contenteditable");
+    }
+
+    /**
+     * Returns the last text node inside NODE, or null if NODE is a boundary 
+     * or ends with something other than text (eg. an image).
+     */
+    function lastTextNode(node) {
+        while (!isBoundary(node) && node.lastChild !== null) {
+            node = node.lastChild;
+        }
+        return (node.nodeType == Node.TEXT_NODE) ? node : null;
+    }
+
+    /**
+     * Returns the text node before NODE in the same run of inline text, 
+     * moving out of and into inline elements such as <b> or <i>.
+     */
+    function previousTextNode(node) {
+        while (node.previousSibling === null) {
+            node = node.parentNode;
+            if (node === null || isBoundary(node)) {
+                return null;
+            }
+        }
+        return lastTextNode(node.previousSibling);
+    }
+
+    /**
+     * Reads at most LIMIT characters before the given position, walking 
+     * backward across adjacent text nodes until a block boundary. The cost 
+     * depends on LIMIT rather than on the size of the text nodes.
+     *
+     * @return An object where TEXT is the text that was read and PIECES is a
+     *   list of {node, start, length} in document order, which maps TEXT back
+     *   to the text nodes it came from.
+     */
+    function getTextBefore(node, offset, limit) {
+        if (node.nodeType != Node.TEXT_NODE) {
+            if (offset > 0) {
+                node = lastTextNode(node.childNodes[offset - 1]);
+            } else {
+                node = isBoundary(node) ? null : previousTextNode(node);
+            }
+            offset = (node !== null) ? node.data.length : 0;
+        }
+
+        var text = "";
+        var pieces = [];
+        while (node !== null && text.length < limit) {
+            var start = Math.max(0, offset - (limit - text.length));
+            text = node.data.substring(start, offset) + text;
+            pieces.unshift({ "node": node, "start": start, 
+                "length": offset - start });
+
+            node = previousTextNode(node);
+            offset = (node !== null) ? node.data.length : 0;
+        }
+        return { "text": text, "pieces": pieces };
+    }
+
+    /**
+     * Converts an index into the text returned by getTextBefore() to a 
+     * [node, offset] position.
+     */
+    function locate(pieces, index) {
+        for (var i = 0; i < pieces.length - 1; i++) {
+            if (index < pieces[i].length) {
+                break;
+            }
+            index -= pieces[i].length;
+        }
+        return [pieces[i].node, pieces[i].start + index];
     }
 
     // Pattern Matching:
@@ -110,22 +675,30 @@ var insert_symbols = new function () {
 
     /**
      * Checks whether the current text should be replaced by a symbol from the 
-     * symbol list. For simplicity, this function only looks at text within the 
-     * current Node.
+     * symbol list. Only the text before the caret that could be part of a key
+     * is read, which may span several inline nodes (eg. "-" in bold followed
+     * by ">"). One extra character is read to check for whitespace before a
+     * key.
      */
     function checkForReplacement(root, isWhitespacePressed) {
+        var traceStart = isTracing ? performance.now() : 0;
         var sel = root.getSelection();
-        if (sel.isCollapsed) {
-            var text = sel.focusNode.textContent;
-            var cursorPos = sel.focusOffset;
-            //debugDiv(sel.focusNode.textContent);
+        if (sel.isCollapsed && sel.focusNode !== null && matchList) {
+            var before = getTextBefore(sel.focusNode, sel.focusOffset, 
+                maxKeyLength + 1);
+            var text = before.text;
 
-            var result = matchesKeyword(text, cursorPos, isWhitespacePressed);
+            var result = matchesKeyword(text, text.length, isWhitespacePressed);
             if (result.val !== null) {
-                performReplacement(sel.focusNode, cursorPos - result.keylen,
-                    cursorPos, result.val, result.html);
+                var start = locate(before.pieces, text.length - result.keylen);
+                performReplacement(sel, start[0], start[1], sel.focusNode, 
+                    sel.focusOffset, result.val, result.html);
+                countUsage(result.key);
             }
         }
+        if (isTracing) {
+            recordTrace("checkForReplacement", traceStart);
+        }
     }
 
     /**
@@ -138,7 +711,7 @@ var insert_symbols = new function () {
      *
      * @param text A string containing the substring to check.
      * @param endIndex The length of the substring.
-     * @return An object where VAL is value of the matched key-value pair 
+     * @return An object where KEY and VAL are the matched key-value pair 
      *   (or null if no match), KEYLEN is the length of the key in the 
      *   matched key-value pair, and HTML is whether the value should be 
      *   treated as raw HTML.
@@ -165,6 +738,7 @@ var insert_symbols = new function () {
                 }
 
                 return {
+                    "key": key,
                     "val": matchList[i].val,
                     "keylen": key.length,
                     "html": (matchList[i].f == 2)
@@ -172,27 +746,427 @@ var insert_symbols = new function () {
             }
         }
 
-        return { "val": null, "keylen": 0, "html": false };
+        return { "key": null, "val": null, "keylen": 0, "html": false };
     }
 
     /**
-     * Replaces the text in the given node with new text. Assumes that the node
-     * is of type TEXT_NODE.
+     * Replaces the text between two positions with new text. Both positions
+     * are in text nodes, which may be different nodes.
+     *
+     * The key is selected with a single range and overwritten by one insert,
+     * so that the replacement is one DOM mutation and one undo step rather 
+     * than one per deleted character.
      * 
-     * @param node The node to perform replacement on.
-     * @param rangeStart The start index of the range.
-     * @param rangeEnd The end index of the range (should be 1 + the index of 
-     *   the last character to be deleted). 
+     * @param sel The selection of the nodes' root.
+     * @param startNode The node where the range starts.
+     * @param startOffset The start index of the range in START_NODE.
+     * @param endNode The node where the range ends.
+     * @param endOffset The end index of the range in END_NODE (should be 1 + 
+     *   the index of the last character to be deleted). 
      * @param newText Replacement text.
      */
-    function performReplacement(node, rangeStart, rangeEnd, newText, isHTML) {
-        // Delete key:
-        for (var i = rangeStart; i < rangeEnd; i++) {
-            document.execCommand("delete", false, null);
-        }
+    function performReplacement(sel, startNode, startOffset, endNode, 
+        endOffset, newText, isHTML) {
+        var traceStart = isTracing ? performance.now() : 0;
+
+        // Select key:
+        sel.setBaseAndExtent(startNode, startOffset, endNode, endOffset);
 
-        // Insert new symbol:
-        command = isHTML ? "insertHTML" : "insertText";
+        // Replace it with the new symbol:
+        var command = isHTML ? "insertHTML" : "insertText";
         document.execCommand(command, false, newText);
+
+        if (isTracing) {
+            recordTrace("performReplacement", traceStart);
+        }
+    }
+
+    // Autocomplete:
+    //----------------------------------
+
+    /**
+     * Indexes the keys that start with COMPLETION_TRIGGER by sorting their 
+     * entry indices by key, so that the keys with a given prefix are found 
+     * with a binary search. Keys that have been used (ie. have a count N, 
+     * see usage_stats.py) are also kept in a much smaller sorted array, so 
+     * that they can be ranked first without scanning every key with the 
+     * prefix. A lookup takes O(log n + LIMIT) time for n keys.
+     */
+    function PrefixIndex(list) {
+        var all = [];
+        var used = [];
+        for (var i = 0; i < list.length; i++) {
+            if (list[i].key[0] == COMPLETION_TRIGGER) {
+                all.push(i);
+                if (list[i].n) {
+                    used.push(i);
+                }
+            }
+        }
+
+        var byKey = function (a, b) {
+            var keyA = list[a].key, keyB = list[b].key;
+            return (keyA < keyB) ? -1 : (keyA > keyB) ? 1 : 0;
+        };
+        all.sort(byKey);
+        used.sort(byKey);
+
+        this.entries = list;
+        this.all = all;
+        this.used = used;
     }
+
+    /**
+     * Returns the position of the first key in INDICES that is not less than
+     * PREFIX, which is the first key that starts with PREFIX if any does.
+     */
+    PrefixIndex.prototype.lowerBound = function (indices, prefix) {
+        var low = 0, high = indices.length;
+        while (low < high) {
+            var mid = (low + high) >>> 1;
+            if (this.entries[indices[mid]].key < prefix) {
+                low = mid + 1;
+            } else {
+                high = mid;
+            }
+        }
+        return low;
+    }
+
+    /**
+     * @return The entry indices of at most LIMIT keys that start with 
+     *   PREFIX: used keys by count in descending order, then the rest in 
+     *   key order.
+     */
+    PrefixIndex.prototype.find = function (prefix, limit) {
+        var entries = this.entries;
+        var results = [];
+        var i, idx;
+
+        for (i = this.lowerBound(this.used, prefix); i < this.used.length; 
+            i++) {
+            idx = this.used[i];
+            if (!entries[idx].key.startsWith(prefix)) {
+                break;
+            }
+            results.push(idx);
+        }
+        results.sort(function (a, b) { return entries[b].n - entries[a].n; });
+        results.length = Math.min(results.length, limit);
+
+        for (i = this.lowerBound(this.all, prefix); i < this.all.length 
+            && results.length < limit; i++) {
+            idx = this.all[i];
+            if (!entries[idx].key.startsWith(prefix)) {
+                break;
+            }
+            if (!entries[idx].n) {
+                results.push(idx);
+            }
+        }
+        return results;
+    }
+
+    function getCompletionIndex() {
+        if (completionIndex === null) {
+            completionIndex = new PrefixIndex(matchList || []);
+        }
+        return completionIndex;
+    }
+
+    /**
+     * Returns the entries of at most MAX_COMPLETIONS keys that start with 
+     * PREFIX, in the order that the popup shows them.
+     */
+    this.findCompletions = function (prefix) {
+        return getCompletionIndex().find(prefix, MAX_COMPLETIONS)
+            .map(function (idx) { return matchList[idx]; });
+    }
+
+    /**
+     * Returns the start of a key that is being typed before the caret, or 
+     * null if there is none. The result has the same format as 
+     * getTextBefore(), with the key's start in PREFIX.
+     */
+    function getCompletionPrefix(sel) {
+        if (!sel.isCollapsed || sel.focusNode === null) {
+            return null;
+        }
+        var before = getTextBefore(sel.focusNode, sel.focusOffset, 
+            maxKeyLength);
+        var match = COMPLETION_PATTERN.exec(before.text);
+        if (match === null) {
+            return null;
+        }
+        before.prefix = match[0];
+        return before;
+    }
+
+    /**
+     * Shows the keys that start with the text being typed before the caret,
+     * or hides the popup if there are none. Lookups run in the page, so no
+     * message is sent to Python per keystroke.
+     */
+    function updateCompletions(root) {
+        var traceStart = isTracing ? performance.now() : 0;
+        var sel = root.getSelection();
+        var before = matchList ? getCompletionPrefix(sel) : null;
+        completions = (before !== null) 
+            ? getCompletionIndex().find(before.prefix, MAX_COMPLETIONS) : [];
+
+        if (completions.length == 0) {
+            hideCompletions();
+        } else {
+            completionRoot = root;
+            selectedCompletion = 0;
+            isCompletionChosen = false;
+            showCompletions(sel);
+        }
+        if (isTracing) {
+            recordTrace("updateCompletions", traceStart);
+        }
+    }
+
+    /**
+     * While the popup is shown, Up and Down choose a key, Tab inserts the 
+     * chosen key's value, and Escape closes the popup. Enter only inserts a
+     * value once a key has been chosen with Up or Down, so that typing a 
+     * line break is not affected.
+     *
+     * @return Whether the key was handled.
+     */
+    function handleCompletionKey(evt) {
+        if (evt.which == KEY_DOWN || evt.which == KEY_UP) {
+            var step = (evt.which == KEY_DOWN) ? 1 : completions.length - 1;
+            selectedCompletion = (selectedCompletion + step) 
+                % completions.length;
+            isCompletionChosen = true;
+            renderCompletions();
+        } else if (evt.which == KEY_TAB 
+            || (evt.which == KEY_ENTER && isCompletionChosen)) {
+            acceptCompletion(selectedCompletion);
+        } else if (evt.which == KEY_ESCAPE) {
+            hideCompletions();
+        } else {
+            return false;
+        }
+        evt.preventDefault();
+        evt.stopPropagation();
+        return true;
+    }
+
+    /**
+     * Replaces the text being typed with the value of the completion at 
+     * INDEX, which counts as a use of its key.
+     */
+    function acceptCompletion(index) {
+        var entry = matchList[completions[index]];
+        var sel = completionRoot.getSelection();
+        var before = getCompletionPrefix(sel);
+        hideCompletions();
+        if (before === null) {
+            return;
+        }
+
+        var start = locate(before.pieces, 
+            before.text.length - before.prefix.length);
+        performReplacement(sel, start[0], start[1], sel.focusNode, 
+            sel.focusOffset, entry.val, entry.f == 2);
+        countUsage(entry.key);
+    }
+
+    function hideCompletions() {
+        completions = [];
+        if (popup !== null) {
+            popup.style.display = "none";
+        }
+    }
+
+    /**
+     * Hides the popup when the editor loads another note, since the page and
+     * the popup are kept between notes. insert_symbols.py calls this when it
+     * checks whether the page has the script (see CHECK_JS).
+     */
+    this.onNoteLoaded = function () {
+        hideCompletions();
+    }
+
+    /**
+     * Shows the popup below the caret, or above it if there is no room 
+     * below. The popup is added to the top-level document, outside the 
+     * fields' shadow roots, and uses system colors to follow the theme.
+     */
+    function showCompletions(sel) {
+        if (popup === null) {
+            popup = document.createElement("div");
+            popup.className = "insert-symbols-completions";
+            Object.assign(popup.style, {
+                "position": "fixed",
+                "zIndex": "1000",
+                "background": "Canvas",
+                "color": "CanvasText",
+                "border": "1px solid GrayText",
+                "borderRadius": "4px",
+                "padding": "2px 0",
+                "fontSize": "0.9em",
+                "whiteSpace": "nowrap",
+                "boxShadow": "0 2px 6px rgba(0, 0, 0, 0.3)"
+            });
+            document.body.appendChild(popup);
+        }
+
+        renderCompletions();
+        popup.style.display = "block";
+
+        var rect = sel.getRangeAt(0).getBoundingClientRect();
+        var top = rect.bottom + 2;
+        if (top + popup.offsetHeight > window.innerHeight) {
+            top = Math.max(0, rect.top - popup.offsetHeight - 2);
+        }
+        popup.style.left = rect.left + "px";
+        popup.style.top = top + "px";
+    }
+
+    function renderCompletions() {
+        while (popup.firstChild !== null) {
+            popup.removeChild(popup.firstChild);
+        }
+        for (var i = 0; i < completions.length; i++) {
+            popup.appendChild(makeCompletionRow(i));
+        }
+    }
+
+    /**
+     * Each row shows a key and its value. HTML values are shown as a label
+     * rather than rendered. Rows handle mousedown, rather than click, so 
+     * that the field keeps focus.
+     */
+    function makeCompletionRow(index) {
+        var entry = matchList[completions[index]];
+        var row = document.createElement("div");
+        row.style.padding = "1px 8px";
+        row.style.cursor = "pointer";
+        if (index == selectedCompletion) {
+            row.style.background = "Highlight";
+            row.style.color = "HighlightText";
+        }
+
+        var value = document.createElement("span");
+        value.style.marginLeft = "1em";
+        value.style.opacity = "0.8";
+        value.appendChild(document.createTextNode(
+            entry.f == 2 ? "(HTML)" : entry.val));
+        row.appendChild(document.createTextNode(entry.key));
+        row.appendChild(value);
+
+        row.onmousedown = function (evt) {
+            evt.preventDefault();
+            evt.stopPropagation();
+            acceptCompletion(index);
+        };
+        return row;
+    }
+
+    // Latency Tracing:
+    //----------------------------------
+
+    /**
+     * Turns timing of checkForReplacement(), performReplacement() and 
+     * updateCompletions() on or off. insert_symbols.py turns it on while 
+     * performance stats are being recorded (see perf_stats.py).
+     */
+    this.setTracing = function (enabled) {
+        isTracing = enabled;
+    }
+
+    /**
+     * Records how long an operation that started at START (a time from 
+     * performance.now()) took. Samples are kept in a ring buffer, so if more
+     * than TRACE_BUFFER_SIZE are recorded between flushes, the oldest ones 
+     * are overwritten and counted as dropped.
+     */
+    function recordTrace(name, start) {
+        var sample = [name, start, performance.now() - start];
+        if (traceBuffer.length < TRACE_BUFFER_SIZE) {
+            traceBuffer.push(sample);
+        } else {
+            traceBuffer[traceNext] = sample;
+            traceNext = (traceNext + 1) % TRACE_BUFFER_SIZE;
+            traceDropped++;
+        }
+
+        if (traceTimer === null) {
+            traceTimer = setTimeout(flushTrace, TRACE_FLUSH_INTERVAL);
+        }
+    }
+
+    /**
+     * Sends the buffered samples to insert_symbols.py in one message. This 
+     * runs at most once per TRACE_FLUSH_INTERVAL ms, and never while a key
+     * is being handled.
+     */
+    function flushTrace() {
+        var samples = traceBuffer.slice(traceNext)
+            .concat(traceBuffer.slice(0, traceNext));
+        var batch = {
+            "origin": performance.timeOrigin,
+            "listSize": matchList ? matchList.length : 0,
+            "samples": samples,
+            "dropped": traceDropped
+        };
+
+        traceTimer = null;
+        traceBuffer = [];
+        traceNext = 0;
+        traceDropped = 0;
+        pycmd(TRACE_PREFIX + JSON.stringify(batch));
+    }
+
+    // Usage Counting:
+    //----------------------------------
+
+    /**
+     * Turns usage counting on or off. insert_symbols.py turns it on in 
+     * versions of Anki that store the counts (see usage_stats.py); in older
+     * versions, nothing is counted or sent.
+     */
+    this.setUsageCounting = function (enabled) {
+        isCountingUsage = enabled;
+    }
+
+    /**
+     * Counts a key that was replaced while typing, if counting is on. Pastes
+     * and "Replace All" are not counted. Counts are sent to insert_symbols.py
+     * in one message at most once per USAGE_FLUSH_INTERVAL ms, rather than 
+     * once per key (see usage_stats.py).
+     */
+    function countUsage(key) {
+        if (!isCountingUsage) {
+            return;
+        }
+        usageCounts[key] = (usageCounts[key] || 0) + 1;
+        if (usageTimer === null) {
+            usageTimer = setTimeout(flushUsage, USAGE_FLUSH_INTERVAL);
+        }
+    }
+
+    /**
+     * Sends the counts that have not been sent yet. insert_symbols.py also 
+     * calls this when the editor is closed.
+     */
+    function flushUsage() {
+        if (usageTimer !== null) {
+            clearTimeout(usageTimer);
+            usageTimer = null;
+        }
+        if (Object.keys(usageCounts).length == 0) {
+            return;
+        }
+
+        var counts = usageCounts;
+        usageCounts = {};
+        pycmd(USAGE_PREFIX + JSON.stringify(counts));
+    }
+
+    this.flushUsage = flushUsage;
 }
@@ -11,11 +11,32 @@ var insert_symbols = new function() {
     const KEY_SPACE = 32;
     const KEY_ENTER = 13;
 
+    var WHITESPACE = /\s/;
+
+    // Elements that end a line:
+    var BLOCK_TAGS = /^(BR|DIV|P|LI|UL|OL|TABLE|TR|TD|TH|H[1-6]|BLOCKQUOTE|PRE|HR)$/;
+
     var matchList = undefined;
+    var matcher = null;
+    var maxKeyLength = 0;
     var shouldCheckOnKeyup = false;
+    var isComposing = false;
+    var pendingFrame = null;
+
+    // Older WebViews do not support requestAnimationFrame:
+    var requestFrame = window.requestAnimationFrame
+        ? function(callback) { return window.requestAnimationFrame(callback); }
+        : function(callback) { return setTimeout(callback, 16); };
+    var cancelFrame = window.cancelAnimationFrame
+        ? function(id) { window.cancelAnimationFrame(id); }
+        : function(id) { clearTimeout(id); };
 
     this.setMatchList = function(str) {
         matchList = JSON.parse(str);
+        matcher = null;
+
+        // The match list is sorted by key length in descending order:
+        maxKeyLength = (matchList.length > 0) ? matchList[0].key.length : 0;
     }
 
     // Keypress Handling:
@@ -36,12 +57,19 @@ var insert_symbols = new function() {
      * defer to keyup for everything else. It works for the most part.
      */
     this.onKeyDown = function(evt) {
+        if (getEditable(evt) === null || isComposing) {
+            return;
+        }
+
         // Disable CTRL commands from triggering replacement:
         if (evt.ctrlKey) {
             return;
         }
         
         if (evt.which == KEY_SPACE || evt.which == KEY_ENTER) {
+            // Whitespace is checked right away, which also covers any check
+            // that is still pending:
+            cancelPendingCheck();
             checkForReplacement(true);
         } else {
             shouldCheckOnKeyup = true;
@@ -49,27 +77,402 @@ var insert_symbols = new function() {
     }
 
     this.onKeyUp = function(evt) {
-        if (shouldCheckOnKeyup) {
+        if (shouldCheckOnKeyup && getEditable(evt) !== null) {
             shouldCheckOnKeyup = false;
-            checkForReplacement(false);
+            scheduleCheck();
+        }
+    }
+
+    /**
+     * Input method editors (eg. for Chinese or Japanese) insert text that is 
+     * still being composed, so matching is skipped until composition ends.
+     */
+    this.onCompositionStart = function(evt) {
+        isComposing = true;
+        cancelPendingCheck();
+    }
+
+    this.onCompositionEnd = function(evt) {
+        isComposing = false;
+    }
+
+    /**
+     * insert_symbols.py calls this whenever the editor loads a note. This 
+     * version has no autocomplete popup to hide, so there is nothing to do.
+     */
+    this.onNoteLoaded = function() {
+    }
+
+    /**
+     * Checks after other keys are coalesced so that at most one check runs 
+     * per animation frame while typing quickly.
+     */
+    function scheduleCheck() {
+        if (pendingFrame === null) {
+            pendingFrame = requestFrame(function() {
+                pendingFrame = null;
+                if (!isComposing) {
+                    checkForReplacement(false);
+                }
+            });
+        }
+    }
+
+    function cancelPendingCheck() {
+        if (pendingFrame !== null) {
+            cancelFrame(pendingFrame);
+            pendingFrame = null;
+        }
+    }
+
+    /**
+     * Pasted plain text is converted in a single pass and inserted with one 
+     * editing command, so that the paste can be undone in one step. HTML and
+     * image pastes are left to Anki. The handler runs in the capture phase,
+     * before Anki's own paste handler, which is skipped when a replacement is
+     * made.
+     */
+    this.onPaste = function(evt) {
+        if (!evt.clipboardData || getEditable(evt) === null 
+            || !matchList || matchList.length == 0) {
+            return;
+        }
+
+        var types = evt.clipboardData.types;
+        if (Array.prototype.indexOf.call(types, "text/plain") < 0
+            || Array.prototype.indexOf.call(types, "text/html") >= 0
+            || Array.prototype.indexOf.call(types, "Files") >= 0) {
+            return;
+        }
+
+        var sel = window.getSelection();
+        var html = convertToHTML(evt.clipboardData.getData("text/plain"), 
+            false, isCaretAfterSpace(sel));
+        if (html !== null) {
+            evt.preventDefault();
+            evt.stopPropagation();
+            document.execCommand("insertHTML", false, html);
+        }
+    }
+
+    /**
+     * Key and paste events are handled by capture-phase listeners on the 
+     * document, which every field's events propagate through. Fields that 
+     * are created later, such as those made editable in the reviewer by the
+     * "Edit Field During Review" add-on, are covered without any further 
+     * setup.
+     *
+     * This script is evaluated again each time a note is loaded, so the 
+     * listeners from the previous evaluation are removed first.
+     */
+    var listeners = {
+        "keydown": this.onKeyDown,
+        "keyup": this.onKeyUp,
+        "paste": this.onPaste,
+        "compositionstart": this.onCompositionStart,
+        "compositionend": this.onCompositionEnd
+    };
+
+    if (document.insertSymbolsListeners) {
+        for (var type in document.insertSymbolsListeners) {
+            document.removeEventListener(type, 
+                document.insertSymbolsListeners[type], true);
+        }
+    }
+    for (var type in listeners) {
+        document.addEventListener(type, listeners[type], true);
+    }
+    document.insertSymbolsListeners = listeners;
+
+    /**
+     * Returns the editable element that an event was fired on, or null if 
+     * the event did not come from an editable element.
+     */
+    function getEditable(evt) {
+        var target = evt.target;
+        return (target && target.isContentEditable) ? target : null;
+    }
+
+    // Multi-pattern Matching:
+    //----------------------------------
+
+    /**
+     * Compiles the match list into an Aho-Corasick automaton so that a block 
+     * of text can be checked against every key in one left-to-right pass. 
+     * Matching follows the same rules as SymbolMatcher in matcher.py, which 
+     * treats the text as though it were typed one character at a time.
+     *
+     * Each state stores the longest immediate key and all normal keys 
+     * (longest first) that end at that state, so no output links need to be
+     * followed while scanning.
+     */
+    function SymbolMatcher(list) {
+        var goto = [{}];
+        var terminal = [-1];
+        var idx, state, next, c, i;
+
+        for (idx = 0; idx < list.length; idx++) {
+            var key = list[idx].key;
+            state = 0;
+            for (i = 0; i < key.length; i++) {
+                c = key[i];
+                next = goto[state][c];
+                if (next === undefined) {
+                    next = goto.length;
+                    goto[state][c] = next;
+                    goto.push({});
+                    terminal.push(-1);
+                }
+                state = next;
+            }
+            terminal[state] = idx;
+        }
+
+        var fail = [0];
+        var immediate = [-1];
+        var normal = [[]];
+
+        // Breadth-first traversal guarantees that a state's failure link is
+        // complete before the state itself is processed:
+        var queue = [];
+        for (c in goto[0]) {
+            fail[goto[0][c]] = 0;
+            queue.push(goto[0][c]);
+        }
+
+        for (var head = 0; head < queue.length; head++) {
+            state = queue[head];
+            var f = fail[state];
+            immediate[state] = immediate[f];
+            normal[state] = normal[f];
+
+            idx = terminal[state];
+            if (idx >= 0) {
+                if (list[idx].f == 0) {
+                    normal[state] = [idx].concat(normal[f]);
+                } else {
+                    immediate[state] = idx;
+                }
+            }
+
+            for (c in goto[state]) {
+                next = goto[state][c];
+                var g = f;
+                while (g && goto[g][c] === undefined) {
+                    g = fail[g];
+                }
+                fail[next] = goto[g][c] || 0;
+                queue.push(next);
+            }
+        }
+
+        this.entries = list;
+        this.goto = goto;
+        this.fail = fail;
+        this.immediate = immediate;
+        this.normal = normal;
+    }
+
+    /**
+     * Finds the keys in TEXT that would be replaced.
+     *
+     * @param atBlockEnd Whether the end of TEXT counts as whitespace, which 
+     *   allows a normal key at the very end to be replaced.
+     * @param atSpace Whether the character before TEXT is whitespace.
+     * @return An array of [start, end, entryIndex] in ascending order.
+     */
+    SymbolMatcher.prototype.findReplacements = function(text, atBlockEnd, 
+        atSpace) {
+        var goto = this.goto, fail = this.fail;
+        var matches = [];
+        var state = 0;
+        var lastEnd = 0;
+
+        for (var i = 0; i < text.length; i++) {
+            var c = text[i];
+            while (state && goto[state][c] === undefined) {
+                state = fail[state];
+            }
+            state = goto[state][c] || 0;
+            if (!state) {
+                continue;
+            }
+            var end = i + 1;
+
+            var idx = this.immediate[state];
+            var candidates = this.normal[state];
+            if (idx < 0 && candidates.length > 0 && (end < text.length 
+                ? WHITESPACE.test(text[end]) : atBlockEnd)) {
+                for (var j = 0; j < candidates.length; j++) {
+                    var start = end - this.entries[candidates[j]].key.length;
+                    if (this.isPrecededBySpace(text, start, lastEnd, matches, 
+                        atSpace)) {
+                        idx = candidates[j];
+                        break;
+                    }
+                }
+            }
+
+            if (idx >= 0) {
+                matches.push([end - this.entries[idx].key.length, end, idx]);
+                lastEnd = end;
+                state = 0;
+            }
+        }
+        return matches;
+    }
+
+    /**
+     * Checks the character before START, which is the end of the previous 
+     * replacement's value if START immediately follows a replacement.
+     */
+    SymbolMatcher.prototype.isPrecededBySpace = function(text, start, lastEnd,
+        matches, atSpace) {
+        if (start == 0) {
+            return atSpace;
+        }
+        if (matches.length > 0 && start == lastEnd) {
+            var val = this.entries[matches[matches.length - 1][2]].val;
+            return val.length == 0 || WHITESPACE.test(val[val.length - 1]);
+        }
+        return WHITESPACE.test(text[start - 1]);
+    }
+
+    function getMatcher() {
+        if (matcher === null) {
+            matcher = new SymbolMatcher(matchList || []);
+        }
+        return matcher;
+    }
+
+    function escapeHTML(text) {
+        return text.replace(/&/g, "&amp;").replace(/</g, "&lt;")
+            .replace(/>/g, "&gt;").replace(/  /g, " &nbsp;")
+            .replace(/\r?\n/g, "<br>");
+    }
+
+    /**
+     * Converts TEXT into HTML with every key replaced by its value. HTML 
+     * values are inserted as-is and everything else is escaped.
+     *
+     * @return The converted HTML, or null if nothing would be replaced.
+     */
+    function convertToHTML(text, atBlockEnd, atSpace) {
+        var m = getMatcher();
+        var matches = m.findReplacements(text, atBlockEnd, atSpace);
+        if (matches.length == 0) {
+            return null;
         }
+
+        var pieces = [];
+        var lastEnd = 0;
+        for (var i = 0; i < matches.length; i++) {
+            var entry = m.entries[matches[i][2]];
+            pieces.push(escapeHTML(text.substring(lastEnd, matches[i][0])));
+            pieces.push(entry.f == 2 ? entry.val : escapeHTML(entry.val));
+            lastEnd = matches[i][1];
+        }
+        pieces.push(escapeHTML(text.substring(lastEnd)));
+        return pieces.join("");
+    }
+
+    /**
+     * Checks whether the character before the start of the selection is 
+     * whitespace. The start of a block is treated as whitespace.
+     */
+    function isCaretAfterSpace(sel) {
+        if (sel.rangeCount == 0) {
+            return true;
+        }
+        var range = sel.getRangeAt(0);
+        var text = getTextBefore(range.startContainer, range.startOffset, 1)
+            .text;
+        return text.length == 0 || WHITESPACE.test(text);
+    }
+
+    // Look-back:
+    //----------------------------------
+
+    /**
+     * Checks whether NODE ends a run of inline text. Block elements, line 
+     * breaks and the editable element itself are boundaries.
+     */
+    function isBoundary(node) {
+        return node.nodeType != Node.ELEMENT_NODE 
+            || BLOCK_TAGS.test(node.nodeName)
+            || node.hasAttribute("contenteditable");
     }
 
     /**
-     * Add event handlers to Editor key events. Setup only needs to be 
-     * performed when the editor is first created.
+     * Returns the last text node inside NODE, or null if NODE is a boundary 
+     * or ends with something other than text (eg. an image).
      */
-    $(".field").keydown(this.onKeyDown);
-    $(".field").keyup(this.onKeyUp);
+    function lastTextNode(node) {
+        while (!isBoundary(node) && node.lastChild !== null) {
+            node = node.lastChild;
+        }
+        return (node.nodeType == Node.TEXT_NODE) ? node : null;
+    }
 
     /**
-     * Add event handlers to Reviewer key events to extend functionality to
-     * "Edit Field During Review" plugin. This needs to be called each time
-     * a question/answer is shown since that is when fields are made editable.
+     * Returns the text node before NODE in the same run of inline text, 
+     * moving out of and into inline elements such as <b> or <i>.
      */
-    this.setupReviewerKeyEvents = function() {
-        $("[contenteditable=true]").keydown(this.onKeyDown);
-        $("[contenteditable=true]").keyup(this.onKeyUp);
+    function previousTextNode(node) {
+        while (node.previousSibling === null) {
+            node = node.parentNode;
+            if (node === null || isBoundary(node)) {
+                return null;
+            }
+        }
+        return lastTextNode(node.previousSibling);
+    }
+
+    /**
+     * Reads at most LIMIT characters before the given position, walking 
+     * backward across adjacent text nodes until a block boundary. The cost 
+     * depends on LIMIT rather than on the size of the text nodes.
+     *
+     * @return An object where TEXT is the text that was read and PIECES is a
+     *   list of {node, start, length} in document order, which maps TEXT back
+     *   to the text nodes it came from.
+     */
+    function getTextBefore(node, offset, limit) {
+        if (node.nodeType != Node.TEXT_NODE) {
+            if (offset > 0) {
+                node = lastTextNode(node.childNodes[offset - 1]);
+            } else {
+                node = isBoundary(node) ? null : previousTextNode(node);
+            }
+            offset = (node !== null) ? node.data.length : 0;
+        }
+
+        var text = "";
+        var pieces = [];
+        while (node !== null && text.length < limit) {
+            var start = Math.max(0, offset - (limit - text.length));
+            text = node.data.substring(start, offset) + text;
+            pieces.unshift({ "node": node, "start": start, 
+                "length": offset - start });
+
+            node = previousTextNode(node);
+            offset = (node !== null) ? node.data.length : 0;
+        }
+        return { "text": text, "pieces": pieces };
+    }
+
+    /**
+     * Converts an index into the text returned by getTextBefore() to a 
+     * [node, offset] position.
+     */
+    function locate(pieces, index) {
+        for (var i = 0; i < pieces.length - 1; i++) {
+            if (index < pieces[i].length) {
+                break;
+            }
+            index -= pieces[i].length;
+        }
+        return [pieces[i].node, pieces[i].start + index];
     }
 
     // Pattern Matching:
@@ -77,20 +480,23 @@ var insert_symbols = new function() {
 
     /**
      * Checks whether the current text should be replaced by a symbol from the 
-     * symbol list. For simplicity, this function only looks at text within the 
-     * current Node.
+     * symbol list. Only the text before the caret that could be part of a key
+     * is read, which may span several inline nodes (eg. "-" in bold followed
+     * by ">"). One extra character is read to check for whitespace before a
+     * key.
      */
     function checkForReplacement(isWhitespacePressed) {
         var sel = window.getSelection();
-        if (sel.isCollapsed) {
-            var text = sel.focusNode.textContent;
-            var cursorPos = sel.focusOffset;
-            //debugDiv(sel.focusNode.textContent);
+        if (sel.isCollapsed && sel.focusNode !== null && matchList) {
+            var before = getTextBefore(sel.focusNode, sel.focusOffset, 
+                maxKeyLength + 1);
+            var text = before.text;
 
-            var result = matchesKeyword(text, cursorPos, isWhitespacePressed);
+            var result = matchesKeyword(text, text.length, isWhitespacePressed);
             if (result.val !== null) {
-                performReplacement(sel.focusNode, cursorPos - result.keylen, 
-                    cursorPos, result.val, result.html);
+                var start = locate(before.pieces, text.length - result.keylen);
+                performReplacement(sel, start[0], start[1], sel.focusNode, 
+                    sel.focusOffset, result.val, result.html);
             }
         }
     }
@@ -143,23 +549,28 @@ var insert_symbols = new function() {
     }
 
     /**
-     * Replaces the text in the given node with new text. Assumes that the node
-     * is of type TEXT_NODE.
+     * Replaces the text between two positions with new text. Both positions
+     * are in text nodes, which may be different nodes.
+     *
+     * The key is selected with a single range and overwritten by one insert,
+     * so that the replacement is one DOM mutation and one undo step rather 
+     * than one per deleted character.
      * 
-     * @param node The node to perform replacement on.
-     * @param rangeStart The start index of the range.
-     * @param rangeEnd The end index of the range (should be 1 + the index of 
-     *   the last character to be deleted). 
+     * @param sel The selection of the nodes' root.
+     * @param startNode The node where the range starts.
+     * @param startOffset The start index of the range in START_NODE.
+     * @param endNode The node where the range ends.
+     * @param endOffset The end index of the range in END_NODE (should be 1 + 
+     *   the index of the last character to be deleted). 
      * @param newText Replacement text.
      */
-    function performReplacement(node, rangeStart, rangeEnd, newText, isHTML) {
-        // Delete key:
-        for (var i = rangeStart; i < rangeEnd; i++) {
-            document.execCommand("delete", false, null);
-        }
+    function performReplacement(sel, startNode, startOffset, endNode, 
+        endOffset, newText, isHTML) {
+        // Select key:
+        sel.setBaseAndExtent(startNode, startOffset, endNode, endOffset);
 
-        // Insert new symbol:
-        command = isHTML ? "insertHTML" : "insertText";
+        // Replace it with the new symbol:
+        var command = isHTML ? "insertHTML" : "insertText";
         document.execCommand(command, false, newText);
     }
 
@@ -0,0 +1,77 @@
+""" 
+This file contains ScanReportWindow, which shows the result of a dry run of 
+note conversion and asks whether the conversion should go ahead.
+"""
+
+from aqt.qt import *
+
+from .get_version import *
+
+PYQT_VER = get_pyqt_version()
+
+
+class ScanReportWindow(QDialog):
+    """
+    Displays the number of replacements and affected notes for each key, 
+    sorted by number of replacements, along with sample snippets showing the
+    text before and after conversion.
+    """
+
+    def __init__(self, parent_widget, scan_result, values):
+        """ 
+        @param values: A dict mapping each key to its value. 
+        """
+        super(ScanReportWindow, self).__init__(parent_widget)
+        self.setWindowTitle("Convert Symbols in Notes")
+        self.resize(600, 500)
+        layout = QVBoxLayout(self)
+
+        summary = ("%d of %d notes would be changed. Please check the samples"
+            " below before converting.") % (scan_result.notes_affected, 
+            scan_result.notes_scanned)
+        layout.addWidget(QLabel(summary))
+        layout.addWidget(self._make_hits_table(scan_result, values))
+
+        samples = QPlainTextEdit(self)
+        samples.setReadOnly(True)
+        samples.setPlainText(self._make_samples_text(scan_result))
+        layout.addWidget(samples)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Cancel)
+        convert_button = button_box.addButton("Convert", 
+            QDialogButtonBox.ButtonRole.AcceptRole)
+        convert_button.setDefault(True)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def _make_hits_table(self, scan_result, values):
+        hits = scan_result.hits.most_common()
+        table = QTableWidget(len(hits), 4, self)
+        table.setHorizontalHeaderLabels(
+            ["Key", "Value", "Replacements", "Notes"])
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+
+        h_header = table.horizontalHeader()
+        if PYQT_VER == PYQT_VER_4:
+            h_header.setResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        else:
+            h_header.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+
+        for row, (key, count) in enumerate(hits):
+            table.setItem(row, 0, QTableWidgetItem(key))
+            table.setItem(row, 1, QTableWidgetItem(values.get(key, '')))
+            table.setItem(row, 2, QTableWidgetItem(str(count)))
+            table.setItem(row, 3, 
+                QTableWidgetItem(str(scan_result.note_hits[key])))
+        return table
+
+    def _make_samples_text(self, scan_result):
+        lines = []
+        for nid, before, after in scan_result.samples:
+            lines.append("Note %d:" % nid)
+            lines.append("  Before: %s" % before)
+            lines.append("  After:  %s" % after)
+            lines.append("")
+        return "\n".join(lines)
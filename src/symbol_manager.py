@@ -10,16 +10,17 @@ Anki uses to store user profiles (mw.pm.db).
 import sys
 import string
 import json
-import aqt
 
 from .get_version import *
 from .default_symbols import DEFAULT_MATCHES, SPECIAL_KEYS
+from .perf_stats import timed
+from .profiler import profiled
 
 class SymbolManager(object):
     """ 
     SymbolManager takes in a callback function so that when the symbol list
     is updated, each Anki editor window can be reloaded with the updated
-    symbol list.
+    symbol list. If given a UsageStats, its counts order the match list.
     """
 
     TBL_NAME = 'ins_symbols'
@@ -29,12 +30,19 @@ class SymbolManager(object):
     ERR_INVALID_FORMAT = -2
     ERR_KEY_CONFLICT = -3
 
-    def __init__(self, main_window, update_callback):
+    # Match list flags:
+    FLAG_NORMAL = 0
+    FLAG_IMMEDIATE = 1
+    FLAG_HTML = 2
+
+    def __init__(self, main_window, update_callback, usage_stats=None):
         self._mw = main_window
         self._symbols = None
         self._defaults = None
         self._update_callback = update_callback
+        self._usage_stats = usage_stats
 
+    @timed('SymbolManager.on_profile_loaded')
     def on_profile_loaded(self):
         """ 
         Called when a new profile is loaded. First tries to load the symbol 
@@ -62,28 +70,20 @@ class SymbolManager(object):
     def get_match_list(self):
         """
         Converts the symbol list into a match list sorted by key length in
-        descending order. Each entry contains the key/value plus a flag 
-        indicating the type of entry.
+        descending order, then by usage count. Each entry contains the 
+        key/value plus a flag indicating the type of entry. Keys that have
+        been used also have their count, which ranks them first in 
+        replacer.js's autocomplete popup.
 
         Flag: 2 = HTML block, 1 = immediate, 0 = normal
         """
         if not self._symbols:
             return None
+        usage_counts = (self._usage_stats.get_counts() 
+            if self._usage_stats else None)
+        return SymbolManager.make_match_list(self._symbols, usage_counts)
 
-        symbols = sorted(self._symbols, key=lambda x: len(x[0]), reverse=True)
-        output = []
-        for key, val in symbols:
-            if key.startswith('::') and key.endswith('::'):
-                flag = 2
-            elif (key.startswith(':') and key.endswith(':') 
-                or key in SPECIAL_KEYS):
-                flag = 1
-            else:
-                flag = 0
-
-            output.append({"key": key,"val": val, "f": flag})
-        return output
-
+    @timed('SymbolManager.get_JSON')
     def get_JSON(self):
         """ 
         Returns a JSON version of the match list
@@ -129,9 +129,11 @@ class SymbolManager(object):
         if errors:
             return (self.ERR_KEY_CONFLICT, errors)
 
-        self._symbols = new_list
+        # Rows loaded from the database are lists, whereas edits make tuples:
+        self._symbols = [tuple(x) for x in new_list]
         return None
 
+    @profiled
     def update_and_save_symbol_list(self, new_list):
         """ 
         Attempts to update the symbol list, and if successful, saves the symbol 
@@ -147,6 +149,42 @@ class SymbolManager(object):
 
     """ Validation Static Functions """
 
+    @staticmethod
+    def make_match_list(kv_list, usage_counts=None):
+        """ 
+        Converts a key-value list into a match list (see get_match_list). 
+
+        replacer.js and BrowserReplacer check keys in match list order and 
+        stop at the first match. Only one key of a given length can match at
+        a given position, so keys of the same length are ordered by 
+        USAGE_COUNTS, a dict mapping keys to counts, without changing which
+        key matches. The most used keys are then found soonest.
+        """
+        if usage_counts:
+            symbols = sorted(kv_list, reverse=True, key=lambda x: 
+                (len(x[0]), usage_counts.get(x[0], 0)))
+        else:
+            symbols = sorted(kv_list, key=lambda x: len(x[0]), reverse=True)
+        output = []
+        for key, val in symbols:
+            flag = SymbolManager.get_match_flag(key)
+            entry = {"key": key,"val": val, "f": flag}
+            if usage_counts and usage_counts.get(key):
+                entry["n"] = usage_counts[key]
+            output.append(entry)
+        return output
+
+    @staticmethod
+    def get_match_flag(key):
+        """ Returns the match list flag for the given key. """
+        if key.startswith('::') and key.endswith('::'):
+            return SymbolManager.FLAG_HTML
+        elif (key.startswith(':') and key.endswith(':') 
+            or key in SPECIAL_KEYS):
+            return SymbolManager.FLAG_IMMEDIATE
+        else:
+            return SymbolManager.FLAG_NORMAL
+
     @staticmethod
     def check_format(kv_list, ignore_empty=False):
         """ 
@@ -190,33 +228,33 @@ class SymbolManager(object):
         return None
 
     @staticmethod
-    def check_for_duplicates(kv_list):
+    def check_for_duplicates(kv_list, seen_keys=None):
         """
         Checks for duplicate keys within the key-value list and returns a list
         of duplicate keys. This function accepts empty lines within the key-
         value list, empty list.
 
+        @param seen_keys: An optional set of keys that have already been seen. 
+          It is updated in place, which allows a large list to be checked in 
+          several chunks.
         @return: Returns a set of duplicate keys, or None if there are no 
           duplicates.
         """
-        has_duplicate = False
+        if seen_keys is None:
+            seen_keys = set()
         duplicates = set()
 
-        for i in range(len(kv_list)):
-            if len(kv_list[i]) == 0:
+        for item in kv_list:
+            if len(item) == 0:
                 continue
 
-            for j in range(i):
-                if len(kv_list[j]) == 0:
-                    continue
-                k1 = kv_list[i][0]
-                k2 = kv_list[j][0]
-
-                if k1 == k2:
-                    has_duplicate = True
-                    duplicates.add(k1)
+            key = item[0]
+            if key in seen_keys:
+                duplicates.add(key)
+            else:
+                seen_keys.add(key)
 
-        return duplicates if has_duplicate else None
+        return duplicates if duplicates else None
 
 
     """ 
@@ -246,14 +284,15 @@ class SymbolManager(object):
 
         return errors[0] if errors else self.SUCCESS
 
+    @timed('SymbolManager._save_to_db')
     def _save_to_db(self):
         """ 
         Deletes all old values, then writes the symbol list into the database. 
         """
         self._mw.col.db.execute("delete from %s" % self.TBL_NAME)
-        for (k, v) in self._symbols:
-            query = "INSERT INTO %s VALUES (?, ?)"
-            self._mw.col.db.execute(query % self.TBL_NAME, k, v)
+        query = "INSERT INTO %s VALUES (?, ?)"
+        self._mw.col.db.executemany(query % self.TBL_NAME, 
+            [(k, v) for k, v in self._symbols])
 
         # Anki no longer requires (or supports) committing in 23.10 or later
         if get_anki_version() <= ANKI_VER_PRE_23_10:
@@ -0,0 +1,231 @@
+"""
+This file contains the reader and writer for symbol packs, a compact binary 
+format for symbol lists. Unlike CSV files, symbol packs are validated when 
+they are written, and are checked against a hash when read, so entries are not
+parsed or validated again on import.
+
+Importing a pack still decodes every entry (see read_symbol_pack()), since the
+working list and SymbolManager, which stores the list in the collection 
+database, both need a plain list. Imports skip CSV parsing and validation, but
+are not otherwise faster than CSV.
+
+All integers are little-endian. A symbol pack consists of a header followed by
+these sections, each of which starts on a 4-byte boundary:
+
+ Section:          Contents:
+-----------       ----------------------
+Key offsets       (count + 1) uint32 offsets into the key pool.
+Value offsets     (count + 1) uint32 offsets into the value pool.
+Key pool          UTF-8 keys, sorted in alphabetical order.
+Value pool        UTF-8 values, in the same order as the keys.
+
+The header contains a SHA-256 hash of everything that follows it, and a 
+reserved field that is always 0.
+"""
+
+import array
+import hashlib
+import io
+import mmap
+import struct
+import sys
+
+from .list_io import ImportResult
+from .symbol_manager import SymbolManager
+
+PACK_EXTENSION = '.sympack'
+
+MAGIC = b'ISYP'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHHIII32s')
+
+
+class SymbolPackError(Exception):
+    pass
+
+
+def _pad(size):
+    """ Returns the number of padding bytes needed for 4-byte alignment. """
+    return -size % 4
+
+def _u32_bytes(values):
+    arr = array.array('I', values)
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    return arr.tobytes()
+
+def _u32_view(buf, offset, count):
+    """ Returns a read-only sequence of COUNT uint32 values at OFFSET. """
+    view = buf[offset:offset + 4 * count]
+    if sys.byteorder == 'little':
+        return view.cast('I')
+    arr = array.array('I', view.tobytes())
+    arr.byteswap()
+    return arr
+
+
+""" Writing """
+
+def write_symbol_pack(fname, symbols, progress_callback=None, 
+    is_cancelled=None):
+    """
+    Validates SYMBOLS and writes them to a symbol pack.
+
+    @return: The number of entries written, or None if cancelled.
+    @raise SymbolPackError: If SYMBOLS is not a valid symbol list.
+    """
+    if SymbolManager.check_format(symbols):
+        raise SymbolPackError("Invalid key-value list.")
+    if SymbolManager.check_for_duplicates(symbols):
+        raise SymbolPackError("Duplicate keys found.")
+
+    symbols = sorted(symbols, key=lambda x: x[0])
+
+    key_offsets, value_offsets = [0], [0]
+    key_pool, value_pool = [], []
+    for k, v in symbols:
+        key_pool.append(k.encode('utf8'))
+        value_pool.append(v.encode('utf8'))
+        key_offsets.append(key_offsets[-1] + len(key_pool[-1]))
+        value_offsets.append(value_offsets[-1] + len(value_pool[-1]))
+
+    if is_cancelled and is_cancelled():
+        return None
+    if progress_callback:
+        progress_callback(50)
+
+    key_pool = b''.join(key_pool)
+    value_pool = b''.join(value_pool)
+
+    sections = [
+        _u32_bytes(key_offsets),
+        _u32_bytes(value_offsets),
+        key_pool,
+        value_pool + b'\0' * _pad(len(key_pool) + len(value_pool)),
+    ]
+    body = b''.join(sections)
+    header = HEADER.pack(MAGIC, VERSION, 0, len(symbols), len(key_pool), 
+        len(value_pool), hashlib.sha256(body).digest())
+
+    with io.open(fname, 'wb') as file:
+        file.write(header)
+        file.write(body)
+
+    if progress_callback:
+        progress_callback(100)
+    return len(symbols)
+
+
+""" Reading """
+
+class SymbolPack(object):
+    """
+    A memory-mapped, read-only symbol pack. Entries are decoded as they are 
+    iterated over.
+    """
+
+    def __init__(self, fname):
+        # mmap raises ValueError for an empty file:
+        with io.open(fname, 'rb') as file:
+            try:
+                self._mmap = mmap.mmap(file.fileno(), 0, 
+                    access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SymbolPackError("%s is not a valid symbol pack." % fname)
+        self._buf = memoryview(self._mmap)
+
+        # A truncated file can leave sections that are too short to cast. The
+        # map is closed after the except block, since the traceback holds 
+        # views into it until then:
+        is_valid = False
+        try:
+            self._read_header()
+            is_valid = True
+        except (struct.error, TypeError, ValueError, SymbolPackError):
+            pass
+        if not is_valid:
+            self.close()
+            raise SymbolPackError("%s is not a valid symbol pack." % fname)
+
+    def _read_header(self):
+        (magic, version, reserved, count, key_pool_size, value_pool_size, 
+            self.content_hash) = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version > VERSION or reserved != 0:
+            raise SymbolPackError()
+
+        offset = HEADER.size
+        self._key_offsets = _u32_view(self._buf, offset, count + 1)
+        offset += 4 * (count + 1)
+        self._value_offsets = _u32_view(self._buf, offset, count + 1)
+        offset += 4 * (count + 1)
+        self._key_pool = offset
+        offset += key_pool_size
+        self._value_pool = offset
+        offset += value_pool_size + _pad(key_pool_size + value_pool_size)
+
+        self._count = count
+        self._body = HEADER.size
+        if offset > len(self._buf):
+            raise SymbolPackError()
+        self._end = offset
+
+    def close(self):
+        """ Releases the memory map. No entries can be accessed afterwards. """
+        for attr in ('_key_offsets', '_value_offsets'):
+            view = getattr(self, attr, None)
+            if isinstance(view, memoryview):
+                view.release()
+        self._buf.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def verify(self):
+        """ Returns whether the content matches the hash in the header. """
+        body = self._buf[self._body:self._end]
+        return hashlib.sha256(body).digest() == self.content_hash
+
+    """ Entry Access """
+
+    def __len__(self):
+        return self._count
+
+    def get_key(self, i):
+        start = self._key_pool + self._key_offsets[i]
+        end = self._key_pool + self._key_offsets[i + 1]
+        return self._mmap[start:end].decode('utf8')
+
+    def get_value(self, i):
+        start = self._value_pool + self._value_offsets[i]
+        end = self._value_pool + self._value_offsets[i + 1]
+        return self._mmap[start:end].decode('utf8')
+
+    def __iter__(self):
+        """ Yields (key, value) tuples in alphabetical order by key. """
+        for i in range(self._count):
+            yield (self.get_key(i), self.get_value(i))
+
+
+def read_symbol_pack(fname, progress_callback=None, is_cancelled=None):
+    """
+    Loads a symbol pack into an ImportResult so that it can be imported in 
+    the same way as a CSV file. Entries do not need to be validated again, 
+    but every entry is decoded, so this takes time in proportion to the size
+    of the pack.
+
+    @raise SymbolPackError: If the file is not a valid symbol pack.
+    """
+    result = ImportResult()
+    with SymbolPack(fname) as pack:
+        if not pack.verify():
+            raise SymbolPackError("%s is corrupted." % fname)
+        result.symbols = list(pack)
+
+    if progress_callback:
+        progress_callback(100)
+    return result
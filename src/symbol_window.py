@@ -9,16 +9,33 @@ internally triggers a call to SymbolWindow.accept().
 """
 
 import aqt
-import io
-import csv
 
 from aqt.qt import *
 
+from .background_task import start_background_task
+from .bulk_edit import delete_rows, replace_text, BulkEditError
 from .get_version import *
+from .default_symbols import CATEGORY_TITLES
+from .list_io import (read_symbol_csv, write_symbol_csv, filter_symbols, 
+    join_symbol_lists, apply_merge, GZIP_EXTENSION)
+from .symbol_pack import read_symbol_pack, write_symbol_pack, PACK_EXTENSION
+from .undo_log import (UndoLog, make_batch, apply_batch, OP_INSERT, OP_DELETE, 
+    OP_REPLACE)
+from .find_replace_window import FindReplaceWindow
+from .merge_window import MergeWindow
 from .symbol_manager import SymbolManager
+from .usage_stats_window import UsageStatsWindow
 
 PYQT_VER = get_pyqt_version()
 
+IMPORT_FILTER = "Symbol lists (*.csv *.csv%s *%s)" % (GZIP_EXTENSION, 
+    PACK_EXTENSION)
+GZIP_CSV_FILTER = "Compressed CSV (*.csv%s)" % GZIP_EXTENSION
+PACK_FILTER = "Symbol pack (*%s)" % PACK_EXTENSION
+
+EXPORT_ALL = "All symbols"
+EXPORT_FILTERED = "Symbols containing text..."
+
 if PYQT_VER == PYQT_VER_4:
     from .Ui_SymbolWindow_4 import Ui_SymbolWindow
 elif PYQT_VER == PYQT_VER_5:
@@ -37,11 +54,16 @@ class SymbolWindow(QDialog):
       substrings of one another).
     """
 
-    def __init__(self, parent_widget, symbol_manager):
+    def __init__(self, parent_widget, symbol_manager, usage_stats=None):
         super(SymbolWindow, self).__init__(parent_widget)
         self._sym_manager = symbol_manager
+        self._usage_stats = usage_stats
         self._working_list = None
         self._selected_row = -1
+        self._undo_log = UndoLog()
+        self._task = None
+        self._is_merge_import = False
+        self._export_fname = None
 
         self.ui = Ui_SymbolWindow()
         self.ui.setupUi(self)
@@ -64,6 +86,12 @@ class SymbolWindow(QDialog):
         self.ui.valueLineEdit.returnPressed.connect(self.on_kv_return_pressed)
 
         self.ui.tableWidget.cellClicked.connect(self.on_cell_clicked)
+        self.ui.tableWidget.setSelectionMode(
+            QAbstractItemView.SelectionMode.ExtendedSelection)
+        self._setup_bulk_edit_buttons()
+        self._setup_undo_buttons()
+        if self._usage_stats:
+            self._setup_usage_button()
         h_header = self.ui.tableWidget.horizontalHeader()
         if PYQT_VER == PYQT_VER_4:
             h_header.setResizeMode(0, QHeaderView.ResizeMode.Stretch)
@@ -73,6 +101,53 @@ class SymbolWindow(QDialog):
             h_header.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
 
 
+    def _setup_bulk_edit_buttons(self):
+        """ 
+        Adds buttons for bulk edits below the delete button. These act on 
+        all rows selected in the tableWidget.
+        """
+        self.deleteSelectedButton = QPushButton("Delete Selected", self)
+        self.deleteSelectedButton.clicked.connect(self.delete_selected_pairs)
+        self.findReplaceButton = QPushButton("Find && Replace...", self)
+        self.findReplaceButton.clicked.connect(self.find_and_replace)
+
+        layout = self.ui.verticalLayout_2
+        delete_idx = layout.indexOf(self.ui.deleteButton)
+        layout.insertWidget(delete_idx + 1, self.deleteSelectedButton)
+        layout.insertWidget(delete_idx + 2, self.findReplaceButton)
+
+
+    def _setup_undo_buttons(self):
+        """ Adds Undo and Redo buttons after the Export button. """
+        self.undoButton = QPushButton("Undo", self)
+        self.undoButton.clicked.connect(self.undo)
+        self.redoButton = QPushButton("Redo", self)
+        self.redoButton.clicked.connect(self.redo)
+
+        layout = self.ui.horizontalLayout_2
+        export_idx = layout.indexOf(self.ui.exportButton)
+        layout.insertWidget(export_idx + 1, self.undoButton)
+        layout.insertWidget(export_idx + 2, self.redoButton)
+
+        self.undoShortcut = QShortcut(
+            QKeySequence(QKeySequence.StandardKey.Undo), self)
+        self.undoShortcut.activated.connect(self.undo)
+        self.redoShortcut = QShortcut(
+            QKeySequence(QKeySequence.StandardKey.Redo), self)
+        self.redoShortcut.activated.connect(self.redo)
+        self._update_undo_buttons()
+
+
+    def _setup_usage_button(self):
+        """ Adds a button that shows the most used keys after Redo. """
+        self.mostUsedButton = QPushButton("Most Used...", self)
+        self.mostUsedButton.clicked.connect(self.show_most_used)
+
+        layout = self.ui.horizontalLayout_2
+        layout.insertWidget(layout.indexOf(self.redoButton) + 1, 
+            self.mostUsedButton)
+
+
     """ Editor State Getters """
 
     def _get_key_text(self):
@@ -85,6 +160,11 @@ class SymbolWindow(QDialog):
         """ Returns true if a row in the tableWidget is selected. """
         return self._selected_row >= 0
 
+    def get_selected_rows(self):
+        """ Returns the sorted indices of all rows selected in tableWidget. """
+        selection_model = self.ui.tableWidget.selectionModel()
+        return sorted(index.row() for index in selection_model.selectedRows())
+
     def is_key_valid(self):
         text = self._get_key_text()
         return bool(text) and SymbolManager.check_if_key_valid(text)
@@ -167,10 +247,16 @@ class SymbolWindow(QDialog):
         """
         self.ui.keyLineEdit.setText("")
         self.ui.valueLineEdit.setText("")
+        self.ui.tableWidget.clearSelection()
 
         self._on_row_deselected(False)
+        self._update_undo_buttons()
         self._check_table_widget_integrity()
 
+    def _update_undo_buttons(self):
+        self.undoButton.setEnabled(self._undo_log.can_undo())
+        self.redoButton.setEnabled(self._undo_log.can_redo())
+
     def _scroll_to_index(self, index):
         if len(self._working_list) <= 0:
             return
@@ -243,18 +329,19 @@ class SymbolWindow(QDialog):
 
     def _reload_view(self):
         """ 
-        Reloads the entire editor and populates it with the working list.
+        Reloads the entire editor and populates it with the working list. The
+        table is resized once and repainted once, rather than once per row.
         """
-        self.ui.tableWidget.clear()
+        table = self.ui.tableWidget
+        table.setUpdatesEnabled(False)
+        table.clear()
+        table.setRowCount(len(self._working_list))
 
-        count = 0
-        for k, v in self._working_list:
-            self.ui.tableWidget.insertRow(count)
-            self.ui.tableWidget.setItem(count, 0, QTableWidgetItem(k))
-            self.ui.tableWidget.setItem(count, 1, QTableWidgetItem(v))
-            count += 1
+        for count, (k, v) in enumerate(self._working_list):
+            table.setItem(count, 0, QTableWidgetItem(k))
+            table.setItem(count, 1, QTableWidgetItem(v))
 
-        self.ui.tableWidget.setRowCount(count)  
+        table.setUpdatesEnabled(True)
         self._on_working_list_updated()
 
     def _save(self):
@@ -285,6 +372,7 @@ class SymbolWindow(QDialog):
         """ Opens the editor and sets up the UI. """
         super(SymbolWindow, self).open()
         self._working_list = self._sym_manager.get_list()
+        self._undo_log.clear()
         self._reload_view()
 
     def accept(self):
@@ -306,6 +394,11 @@ class SymbolWindow(QDialog):
             super(SymbolWindow, self).reject()
 
 
+    def show_most_used(self):
+        UsageStatsWindow(self, self._usage_stats, 
+            dict(self._working_list)).exec()
+
+
     """ 
     Working List Update Actions 
 
@@ -358,12 +451,7 @@ class SymbolWindow(QDialog):
             return
 
         (_, idx) = self._find_prospective_index(new_key)
-        self._working_list.insert(idx, (new_key, new_val))
-
-        self.ui.tableWidget.insertRow(idx)
-        self.ui.tableWidget.setItem(idx, 0, QTableWidgetItem(new_key))
-        self.ui.tableWidget.setItem(idx, 1, QTableWidgetItem(new_val))
-        self._on_working_list_updated()
+        self._record_edit((OP_INSERT, idx, (new_key, new_val)))
 
     def replace_pair_in_list(self):
         """ Replaces an existing key-value pair from the working list. """
@@ -374,12 +462,8 @@ class SymbolWindow(QDialog):
 
         new_val = self._get_val_text()
         old_pair = self._working_list[self._selected_row]
-
-        self._working_list[self._selected_row] = (old_pair[0], new_val)
-
-        widget_item = self.ui.tableWidget.item(self._selected_row, 1)
-        widget_item.setText(new_val)
-        self._on_working_list_updated()
+        self._record_edit((OP_REPLACE, self._selected_row, old_pair, 
+            (old_pair[0], new_val)))
 
     def delete_pair_from_list(self):
         """ Deletes an existing key-value pair from the working list. """
@@ -388,84 +472,246 @@ class SymbolWindow(QDialog):
                 "row is selected.")
             return
 
-        del self._working_list[self._selected_row]
+        self._record_edit((OP_DELETE, self._selected_row, 
+            self._working_list[self._selected_row]))
 
-        self.ui.tableWidget.removeRow(self._selected_row)
-        self._on_working_list_updated()
+    def delete_selected_pairs(self):
+        """ 
+        Deletes every selected key-value pair from the working list in a 
+        single pass, then reloads the view once.
+        """
+        rows = self.get_selected_rows()
+        if not rows:
+            aqt.utils.showInfo("Error: Cannot delete when no rows are "
+                "selected.")
+            return
+
+        confirm_msg = "Delete %d selected entries?" % len(rows)
+        reply = QMessageBox.question(self, 'Message', confirm_msg, 
+            QMessageBox.StandardButton.Yes, QMessageBox.StandardButton.No)
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+
+        self._replace_working_list(delete_rows(self._working_list, rows))
+
+    def find_and_replace(self):
+        """ 
+        Replaces text in the keys or values of either the selected rows or 
+        the entire working list, then reloads the view once.
+        """
+        rows = self.get_selected_rows()
+        window = FindReplaceWindow(self, len(rows) > 0)
+        if not window.exec():
+            return
+
+        if not window.is_selection_only():
+            rows = None
+        try:
+            new_list, change_count = replace_text(self._working_list, rows, 
+                window.get_find_text(), window.get_replace_text(), 
+                window.is_key_target(), window.is_regex())
+        except BulkEditError as e:
+            aqt.utils.showInfo("Error: %s" % e)
+            return
+
+        if change_count:
+            self._replace_working_list(new_list)
+        aqt.utils.showInfo("%d entries were changed." % change_count)
 
     def reset_working_list(self):
-        """ Resets the working list to the default symbol list. """
-        confirm_msg = ("Load default symbols? This will delete any "
-            "unsaved changes!")
+        """ 
+        Resets the working list to the default symbol list. This can be 
+        undone.
+        """
+        confirm_msg = ("Load default symbols? This will replace any "
+            "unsaved changes.")
         reply = QMessageBox.question(self, 'Message', confirm_msg, 
             QMessageBox.StandardButton.Yes, QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            self._working_list = self._sym_manager.get_default_list()
+            self._replace_working_list(self._sym_manager.get_default_list())
+
+
+    """ Undo & Redo Actions """
+
+    def _apply_edit(self, record):
+        """ 
+        Applies an edit record (see undo_log.py) to the working list and 
+        updates the UI. Single-entry edits only touch one row of the 
+        tableWidget, whereas batch edits reload the view once.
+        """
+        op = record[0]
+        table = self.ui.tableWidget
+
+        if op == OP_INSERT:
+            _, idx, (k, v) = record
+            self._working_list.insert(idx, (k, v))
+            table.insertRow(idx)
+            table.setItem(idx, 0, QTableWidgetItem(k))
+            table.setItem(idx, 1, QTableWidgetItem(v))
+        elif op == OP_DELETE:
+            idx = record[1]
+            del self._working_list[idx]
+            table.removeRow(idx)
+        elif op == OP_REPLACE:
+            _, idx, _, (k, v) = record
+            self._working_list[idx] = (k, v)
+            table.item(idx, 0).setText(k)
+            table.item(idx, 1).setText(v)
+        else:
+            self._working_list = apply_batch(self._working_list, record)
             self._reload_view()
+            return
+
+        self._on_working_list_updated()
+
+    def _record_edit(self, record):
+        """ Applies an edit record and adds it to the undo log. """
+        self._undo_log.push(record)
+        self._apply_edit(record)
+
+    def _replace_working_list(self, new_list):
+        """ 
+        Replaces the working list, which must be sorted by key. Only the 
+        entries that differ are recorded in the undo log.
+        """
+        self._record_edit(make_batch(self._working_list, new_list))
+
+    def undo(self):
+        record = self._undo_log.undo()
+        if record:
+            self._apply_edit(record)
+
+    def redo(self):
+        record = self._undo_log.redo()
+        if record:
+            self._apply_edit(record)
 
 
     """ Import and Export Actions """
 
     def import_list(self):
         """ 
-        Imports key-value pairs from a .txt file into the editor. The import 
-        procedure is successful only if each and every entry in the .txt file 
-        is valid; otherwise, an error will be displayed and the operation
-        will abort.
+        Imports key-value pairs from a .csv file into the editor. The file is 
+        parsed and validated on a worker thread. The import procedure is 
+        successful only if each and every entry in the file is valid; 
+        otherwise, an error will be displayed and the operation will abort.
+
+        The imported list can either replace the working list or be merged 
+        into it.
         """
+        if self._task:
+            return
+
         if PYQT_VER == PYQT_VER_4:
             fname = QFileDialog.getOpenFileName(self, 'Open file', '', 
-                "CSV (*.csv)")
+                IMPORT_FILTER)
         else:
             fname, _ = QFileDialog.getOpenFileName(self, 'Open file', '',
-                "CSV (*.csv)")
+                IMPORT_FILTER)
         if not fname:
             return
 
-        with io.open(fname, 'r', encoding='utf8') as file:
-            reader = csv.reader(file)
-            new_list = []
+        mode = self._ask_import_mode()
+        if mode is None:
+            return
+        self._is_merge_import = mode
+
+        # Symbol packs are validated when written, so they are not parsed or
+        # validated again:
+        if fname.endswith(PACK_EXTENSION):
+            reader = read_symbol_pack
+        else:
+            reader = read_symbol_csv
+
+        self._task = start_background_task(self, "Importing symbols...", 
+            self._on_import_finished, self._on_task_failed, reader, fname)
+
+    def _on_import_finished(self, result):
+        """ 
+        Called on the GUI thread once the worker thread is done. The working
+        list is replaced in a single update.
+        """
+        self._task = None
+        if result.is_cancelled or not self._validate_import_result(result):
+            return
+
+        if self._is_merge_import:
+            self._merge_imported_list(result.symbols)
+        else:
+            self._replace_working_list(result.symbols)
+
+    def _ask_import_mode(self):
+        """ 
+        Asks whether the imported list should be merged into the working 
+        list. Returns None if the import was cancelled.
+        """
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle('Message')
+        msg_box.setText("Replace the working list with the imported symbols, "
+            "or merge the imported symbols into the working list?")
+        replace_button = msg_box.addButton("Replace", 
+            QMessageBox.ButtonRole.AcceptRole)
+        merge_button = msg_box.addButton("Merge", 
+            QMessageBox.ButtonRole.AcceptRole)
+        msg_box.addButton(QMessageBox.StandardButton.Cancel)
+        msg_box.exec()
+
+        clicked = msg_box.clickedButton()
+        if clicked == merge_button:
+            return True
+        elif clicked == replace_button:
+            return False
+        return None
+
+    def _merge_imported_list(self, imported):
+        """ 
+        Joins the imported list against the working list, then lets the user
+        resolve conflicts before the merged list is applied.
+        """
+        merge_result = join_symbol_lists(self._working_list, imported)
+        if not merge_result.new and not merge_result.conflicts:
+            aqt.utils.showInfo("All %d imported symbols are already in the "
+                "list." % len(merge_result.identical))
+            return
 
-            for row in reader:
-                new_list.append(row)
+        merge_window = MergeWindow(self, merge_result)
+        if not merge_window.exec():
+            return
 
-            if self._validate_imported_list(new_list):
-                # Filter out empty lines before updating the list, but do so 
-                # AFTER error checking so that accurate line numbers will be 
-                # shown during error checking.
-                new_list = [x for x in new_list if len(x) > 0]
+        self._replace_working_list(apply_merge(self._working_list, 
+            merge_result, merge_window.get_take_theirs()))
 
-                new_list = sorted(new_list, key=lambda x: x[0])
-                self._working_list = new_list
-                self._reload_view()
+    def _on_task_failed(self, err_str):
+        self._task = None
+        aqt.utils.showInfo("Error: " + err_str)
 
-    def _validate_imported_list(self, new_list):
+    def _validate_import_result(self, result):
         """ 
         Checks that the imported file is valid, and displays an error message 
-        if not. This function takes in a list that DOES contain empty lines 
-        (which will be an empty list) so that accurate line numbers will be 
-        displayed.
+        if not. Line numbers in the error message include empty lines so that
+        they match the lines in the file.
         """
-        errors = SymbolManager.check_format(new_list, ignore_empty=True)
-        if errors:
-            aqt.utils.showInfo(self._make_err_str_format(errors, 
+        if result.format_errors:
+            aqt.utils.showInfo(self._make_err_str_format(result.format_errors,
                 'Unable to import', 'Line'))
             return False
 
-        errors = SymbolManager.check_for_duplicates(new_list)
-        if errors:
-            aqt.utils.showInfo(self._make_err_str_duplicate(errors, 
-                'Unable to import'))
+        if result.duplicates:
+            aqt.utils.showInfo(self._make_err_str_duplicate(
+                sorted(result.duplicates), 'Unable to import'))
             return False
 
         return True
 
     def export_list(self):
         """ 
-        Exports the current symbol list into a .txt file. Before exporting, 
-        the list displayed in the editor must match the symbol list stored 
-        in the system. 
+        Exports the stored symbol list, or a subset of it, into a .csv file on 
+        a worker thread. Before exporting, the list displayed in the editor 
+        must match the symbol list stored in the system. 
         """
+        if self._task:
+            return
+
         old_list = self._sym_manager.get_list()
 
         if old_list != self._working_list:
@@ -481,20 +727,64 @@ class SymbolWindow(QDialog):
             else:
                 return
 
+        symbols = self._ask_export_subset(self._sym_manager.get_list())
+        if symbols is None:
+            return
+
+        file_filters = ";;".join(["CSV (*.csv)", GZIP_CSV_FILTER, PACK_FILTER])
         if PYQT_VER == PYQT_VER_4:
-            fname = QFileDialog.getSaveFileName(self, 'Save file', '', 
-                "CSV (*.csv)")
+            fname, selected_filter = QFileDialog.getSaveFileNameAndFilter(
+                self, 'Save file', '', file_filters)
         else:
-             fname, _ = QFileDialog.getSaveFileName(self, 'Save file', '', 
-                "CSV (*.csv)")
+            fname, selected_filter = QFileDialog.getSaveFileName(self, 
+                'Save file', '', file_filters)
         if not fname:
             return
 
-        with io.open(fname, 'w', newline='\n', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            for k, v in self._working_list:
-                writer.writerow([k, v])
-            aqt.utils.showInfo("Symbol list written to: " + fname)
+        if (selected_filter == GZIP_CSV_FILTER 
+            and not fname.endswith(GZIP_EXTENSION)):
+            fname += GZIP_EXTENSION
+        elif (selected_filter == PACK_FILTER 
+            and not fname.endswith(PACK_EXTENSION)):
+            fname += PACK_EXTENSION
+
+        if fname.endswith(PACK_EXTENSION):
+            writer = write_symbol_pack
+        else:
+            writer = write_symbol_csv
+
+        self._export_fname = fname
+        self._task = start_background_task(self, "Exporting symbols...", 
+            self._on_export_finished, self._on_task_failed, writer, fname, 
+            symbols)
+
+    def _ask_export_subset(self, symbols):
+        """ 
+        Asks whether to export all symbols, symbols containing some text, or 
+        symbols from a single category. Returns None if cancelled.
+        """
+        choices = [EXPORT_ALL, EXPORT_FILTERED] + CATEGORY_TITLES
+        choice, ok = QInputDialog.getItem(self, 'Export', 
+            'Symbols to export:', choices, 0, False)
+        if not ok:
+            return None
+
+        if choice == EXPORT_ALL:
+            return symbols
+        elif choice == EXPORT_FILTERED:
+            text, ok = QInputDialog.getText(self, 'Export', 
+                'Export symbols whose key or value contains:')
+            if not ok:
+                return None
+            return filter_symbols(symbols, text=text)
+        else:
+            return filter_symbols(symbols, category=choice)
+
+    def _on_export_finished(self, row_count):
+        self._task = None
+        if row_count is not None:
+            aqt.utils.showInfo("%d symbols written to: %s" % (row_count, 
+                self._export_fname))
 
 
     """ Error Strings """
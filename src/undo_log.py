@@ -0,0 +1,128 @@
+"""
+This file contains UndoLog, which records edits to the working list so that 
+they can be undone and redone.
+
+Edits are stored as compact records rather than copies of the working list:
+
+ Record:                                  Edit:
+---------                                ------
+(OP_INSERT, index, pair)                 PAIR was inserted at INDEX.
+(OP_DELETE, index, pair)                 PAIR was deleted from INDEX.
+(OP_REPLACE, index, old_pair, new_pair)  OLD_PAIR at INDEX became NEW_PAIR.
+(OP_BATCH, deletes, inserts)             Many entries changed at once. 
+                                         DELETES is a list of (index, pair) 
+                                         in the old list and INSERTS is a list
+                                         of (index, pair) in the new list.
+
+Pairs are shared with the working list rather than copied, so memory use is 
+proportional to the number of entries edited, not to the size of the list.
+"""
+
+OP_INSERT = 0
+OP_DELETE = 1
+OP_REPLACE = 2
+OP_BATCH = 3
+
+MAX_DEPTH = 200
+
+
+def make_batch(old_list, new_list):
+    """
+    Creates a batch record from two lists that are sorted by key, by walking
+    both lists once. Only entries that differ are recorded. Entries are 
+    compared as tuples, since lists loaded from the database or a file may
+    contain lists instead.
+    """
+    deletes, inserts = [], []
+    i, j = 0, 0
+
+    while i < len(old_list) or j < len(new_list):
+        if j >= len(new_list) or (i < len(old_list) 
+            and old_list[i][0] < new_list[j][0]):
+            deletes.append((i, old_list[i]))
+            i += 1
+        elif i >= len(old_list) or new_list[j][0] < old_list[i][0]:
+            inserts.append((j, new_list[j]))
+            j += 1
+        else:
+            if tuple(old_list[i]) != tuple(new_list[j]):
+                deletes.append((i, old_list[i]))
+                inserts.append((j, new_list[j]))
+            i += 1
+            j += 1
+    return (OP_BATCH, deletes, inserts)
+
+def invert(record):
+    """ Returns a record that reverses the given record. """
+    op = record[0]
+    if op == OP_INSERT:
+        return (OP_DELETE, record[1], record[2])
+    elif op == OP_DELETE:
+        return (OP_INSERT, record[1], record[2])
+    elif op == OP_REPLACE:
+        return (OP_REPLACE, record[1], record[3], record[2])
+    else:
+        return (OP_BATCH, record[2], record[1])
+
+def apply_batch(kv_list, record):
+    """ Returns a new list with a batch record applied to KV_LIST. """
+    _, deletes, inserts = record
+    deleted = set(i for i, _ in deletes)
+    kept = (x for i, x in enumerate(kv_list) if i not in deleted)
+
+    output = []
+    for j, pair in inserts:
+        while len(output) < j:
+            output.append(next(kept))
+        output.append(pair)
+    output.extend(kept)
+    return output
+
+def is_empty(record):
+    return record[0] == OP_BATCH and not record[1] and not record[2]
+
+
+class UndoLog(object):
+    """
+    Keeps undo and redo stacks of edit records. Recording a new edit clears
+    the redo stack. At most MAX_DEPTH edits can be undone.
+    """
+
+    def __init__(self):
+        self._undo_stack = []
+        self._redo_stack = []
+
+    def clear(self):
+        self._undo_stack = []
+        self._redo_stack = []
+
+    def can_undo(self):
+        return bool(self._undo_stack)
+
+    def can_redo(self):
+        return bool(self._redo_stack)
+
+    def push(self, record):
+        """ Records an edit that has just been applied. """
+        if is_empty(record):
+            return
+        self._undo_stack.append(record)
+        if len(self._undo_stack) > MAX_DEPTH:
+            del self._undo_stack[0]
+        self._redo_stack = []
+
+    def undo(self):
+        """ Returns the record that undoes the last edit, or None. """
+        if not self._undo_stack:
+            return None
+        record = self._undo_stack.pop()
+        self._redo_stack.append(record)
+        return invert(record)
+
+    def redo(self):
+        """ Returns the record that redoes the last undone edit, or None. """
+        if not self._redo_stack:
+            return None
+        record = self._redo_stack.pop()
+        self._undo_stack.append(record)
+        return record
@@ -0,0 +1,122 @@
+"""
+This file contains UsageStats, which counts how often each key is replaced
+while typing, in both the editor (replacer.js) and the Browser search bar
+(BrowserReplacer). The counts are shown in the options window's "Most Used"
+view, can be exported to tune shared symbol packs, and order keys of the same
+length in the match list so that the most used keys are checked first (see
+SymbolManager.make_match_list()).
+
+Like the symbol list, counts are stored per profile in the collection
+database. They are kept in memory as keys are replaced, and written to the
+database in one batch by flush(), which insert_symbols.py calls a while after
+the first unsaved count and when the profile is closed.
+"""
+
+import csv
+import io
+
+from .get_version import *
+
+
+class UsageStats(object):
+
+    TBL_NAME = 'ins_symbols_usage'
+
+    def __init__(self, main_window):
+        self._mw = main_window
+        self._counts = {}
+        self._unsaved_keys = set()
+
+    def on_profile_loaded(self):
+        """ Loads the counts, creating their table if it does not exist. """
+        if self._check_db_exists():
+            self._load_from_db()
+        else:
+            self._create_db()
+
+
+    """ Counting """
+
+    def add_counts(self, counts):
+        """
+        Adds COUNTS, a dict mapping each key to the number of times it was
+        replaced, to the counts in memory.
+
+        @return: Whether these are the first counts since the last flush, in
+          which case the caller should schedule a flush.
+        """
+        was_saved = not self._unsaved_keys
+        for key, count in counts.items():
+            self._counts[key] = self._counts.get(key, 0) + count
+            self._unsaved_keys.add(key)
+        return was_saved and bool(self._unsaved_keys)
+
+    def get_counts(self):
+        """
+        Returns a dict mapping each key to its count, including unsaved 
+        counts. The dict is not a copy, so it should not be modified.
+        """
+        return self._counts
+
+    def get_most_used(self):
+        """ Returns a list of (key, count) sorted by count, then by key. """
+        return sorted(self._counts.items(), key=lambda x: (-x[1], x[0]))
+
+    def clear(self):
+        """ Deletes every count, including those in the database. """
+        self._counts = {}
+        self._unsaved_keys = set()
+        self._mw.col.db.execute("delete from %s" % self.TBL_NAME)
+        self._commit()
+
+
+    """ Database Access Functions """
+
+    def _check_db_exists(self):
+        query = "SELECT * FROM sqlite_master WHERE type='table' AND name='%s'"
+        return self._mw.col.db.first(query % self.TBL_NAME)
+
+    def _create_db(self):
+        query = "CREATE TABLE %s (key varchar(255) PRIMARY KEY, count integer)"
+        self._mw.col.db.execute(query % self.TBL_NAME)
+
+    def _load_from_db(self):
+        query = "SELECT key, count FROM %s"
+        rows = self._mw.col.db.all(query % self.TBL_NAME)
+        self._counts = dict((key, count) for key, count in rows)
+        self._unsaved_keys = set()
+
+    def flush(self):
+        """
+        Writes the total count of every key counted since the last flush in a
+        single statement. Does nothing if there are no unsaved counts.
+        """
+        if not self._unsaved_keys:
+            return
+        query = "INSERT OR REPLACE INTO %s VALUES (?, ?)"
+        self._mw.col.db.executemany(query % self.TBL_NAME,
+            [(key, self._counts[key]) for key in self._unsaved_keys])
+        self._unsaved_keys = set()
+        self._commit()
+
+    def _commit(self):
+        # Anki no longer requires (or supports) committing in 23.10 or later
+        if get_anki_version() <= ANKI_VER_PRE_23_10:
+            self._mw.col.db.commit()
+
+
+""" Export """
+
+def write_usage_csv(fname, most_used, values):
+    """
+    Writes a CSV file with a header row, then one row of key, value and count
+    for each key in MOST_USED (see UsageStats.get_most_used()). Keys that are
+    no longer in the symbol list have an empty value.
+
+    @param values: A dict mapping each key to its value.
+    """
+    with io.open(fname, 'w', encoding='utf-8', newline='') as out_file:
+        writer = csv.writer(out_file, lineterminator='\n')
+        writer.writerow(['key', 'value', 'count'])
+        for key, count in most_used:
+            writer.writerow([key, values.get(key, ''), count])
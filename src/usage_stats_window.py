@@ -0,0 +1,95 @@
+"""
+This file contains UsageStatsWindow, which shows how often each key has been
+replaced and lets the counts be exported or reset.
+"""
+
+import aqt
+from aqt.qt import *
+
+from .get_version import *
+from .usage_stats import write_usage_csv
+
+PYQT_VER = get_pyqt_version()
+
+
+class UsageStatsWindow(QDialog):
+    """
+    Displays every key that has been replaced while typing in the editor or
+    the Browser search bar, sorted by count, with its value from the working
+    list of the options window.
+    """
+
+    def __init__(self, parent_widget, usage_stats, values):
+        """
+        @param values: A dict mapping each key to its value.
+        """
+        super(UsageStatsWindow, self).__init__(parent_widget)
+        self._usage_stats = usage_stats
+        self._values = values
+        self.setWindowTitle("Most Used Symbols")
+        self.resize(500, 500)
+        layout = QVBoxLayout(self)
+
+        self.summaryLabel = QLabel(self)
+        layout.addWidget(self.summaryLabel)
+
+        self.table = QTableWidget(0, 3, self)
+        self.table.setHorizontalHeaderLabels(["Key", "Value", "Count"])
+        self.table.setEditTriggers(
+            QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        h_header = self.table.horizontalHeader()
+        if PYQT_VER == PYQT_VER_4:
+            h_header.setResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        else:
+            h_header.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        self.exportButton = button_box.addButton("Export CSV...",
+            QDialogButtonBox.ButtonRole.ActionRole)
+        self.exportButton.clicked.connect(self.export_csv)
+        self.resetButton = button_box.addButton("Reset Counts",
+            QDialogButtonBox.ButtonRole.ResetRole)
+        self.resetButton.clicked.connect(self.reset_counts)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+        self.refresh()
+
+    def refresh(self):
+        most_used = self._usage_stats.get_most_used()
+        self.summaryLabel.setText("%d keys replaced %d times in total." % (
+            len(most_used), sum(count for _, count in most_used)))
+
+        self.table.setRowCount(len(most_used))
+        for row, (key, count) in enumerate(most_used):
+            self.table.setItem(row, 0, QTableWidgetItem(key))
+            self.table.setItem(row, 1,
+                QTableWidgetItem(self._values.get(key, '')))
+            self.table.setItem(row, 2, QTableWidgetItem(str(count)))
+
+        self.exportButton.setEnabled(bool(most_used))
+        self.resetButton.setEnabled(bool(most_used))
+
+    def export_csv(self):
+        if PYQT_VER == PYQT_VER_4:
+            fname = QFileDialog.getSaveFileName(self, 'Save file',
+                'symbol_usage.csv', "CSV (*.csv)")
+        else:
+            fname, _ = QFileDialog.getSaveFileName(self, 'Save file',
+                'symbol_usage.csv', "CSV (*.csv)")
+        if not fname:
+            return
+
+        write_usage_csv(fname, self._usage_stats.get_most_used(),
+            self._values)
+        aqt.utils.tooltip("Usage counts saved to: %s" % fname, parent=self)
+
+    def reset_counts(self):
+        reply = QMessageBox.question(self, 'Message',
+            "Reset the usage count of every key?",
+            QMessageBox.StandardButton.Yes, QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            self._usage_stats.clear()
+            self.refresh()